@@ -1,16 +1,26 @@
 import numpy as np
-from scipy.io import wavfile
+import os
 import json
+from audio_writer import StemWriter, open_writer, output_path
+from beat_renderer import BLOCK_SIZE, DEFAULT_DTYPE, bar_starts, render_blocks, render_events
+from drum_patterns import VOICES, bar_events, resolve_genre, voice_durations
+from noise_bank import NoiseBank, get_default_noise_bank
 from prompt_processor import PromptProcessor
+from voice_cache import VoiceCache, get_default_cache
 
 class SmartDrumMachine:
-    def __init__(self, sample_rate=44100):
+    def __init__(self, sample_rate=44100, voice_cache=None, seed=None, dtype=DEFAULT_DTYPE):
         self.sample_rate = sample_rate
+        # Sample type of every voice and mix buffer; float32 halves memory over float64
+        self.dtype = np.dtype(dtype)
         self.processor = PromptProcessor()
+        self.voice_cache = voice_cache if voice_cache is not None else get_default_cache()
+        # Same seed, same noise - a seeded machine reproduces its renders exactly
+        self.noise = NoiseBank(seed) if seed is not None else get_default_noise_bank()
 
     def generate_kick(self, duration=0.5, kick_type='standard', bass_boost=1.0):
         """Generate kick drum based on style"""
-        t = np.linspace(0, duration, int(self.sample_rate * duration))
+        t = np.linspace(0, duration, int(self.sample_rate * duration), dtype=self.dtype)
         
         if kick_type == 'heavy':
             # Heavy 808-style kick
@@ -31,10 +41,10 @@ class SmartDrumMachine:
 
     def generate_snare(self, duration=0.3, mood='neutral', distortion=0.3):
         """Generate snare with mood variations"""
-        t = np.linspace(0, duration, int(self.sample_rate * duration))
+        t = np.linspace(0, duration, int(self.sample_rate * duration), dtype=self.dtype)
         
         # Base snare
-        noise = np.random.normal(0, 0.1, len(t))
+        noise = self.noise.normal(len(t), 0.1, key=('snare', mood, len(t)), dtype=self.dtype)
         tone = np.sin(2 * np.pi * 200 * t) * np.exp(-t * 15)
         snare = (noise + tone) * np.exp(-t * 10)
         
@@ -54,27 +64,47 @@ class SmartDrumMachine:
 
     def generate_hihat(self, duration=0.1, hihat_style='standard'):
         """Generate hi-hat based on style"""
-        t = np.linspace(0, duration, int(self.sample_rate * duration))
+        t = np.linspace(0, duration, int(self.sample_rate * duration), dtype=self.dtype)
+        key = ('hihat', hihat_style, len(t))
         
         if hihat_style == 'rapid':
             # Sharp, quick hi-hats
-            hihat = np.random.normal(0, 0.08, len(t)) * np.exp(-t * 80)
+            hihat = self.noise.normal(len(t), 0.08, key=key, dtype=self.dtype) * np.exp(-t * 80)
         elif hihat_style == 'vinyl':
             # Lo-fi vinyl texture
-            hihat = np.random.normal(0, 0.04, len(t)) * np.exp(-t * 30)
+            hihat = self.noise.normal(len(t), 0.04, key=key, dtype=self.dtype) * np.exp(-t * 30)
             # Add some vinyl crackle
-            crackle = np.random.normal(0, 0.01, len(t))
+            crackle = self.noise.normal(len(t), 0.01, key=key + ('crackle',), dtype=self.dtype)
             hihat += crackle
         elif hihat_style == 'sparse':
             # Drill style - less frequent, more space
-            hihat = np.random.normal(0, 0.06, len(t)) * np.exp(-t * 60)
+            hihat = self.noise.normal(len(t), 0.06, key=key, dtype=self.dtype) * np.exp(-t * 60)
         else:  # simple/standard
-            hihat = np.random.normal(0, 0.05, len(t)) * np.exp(-t * 50)
+            hihat = self.noise.normal(len(t), 0.05, key=key, dtype=self.dtype) * np.exp(-t * 50)
         
         return hihat
 
-    def create_beat_from_prompt(self, prompt):
-        """Main function: Create beat from natural language prompt"""
+    def get_voice(self, voice, style, duration, bass_boost=1.0, distortion=0.3):
+        """Return a cached one-shot voice, synthesizing it on first use"""
+        key = VoiceCache.make_key(voice, style, duration, bass_boost, distortion, self.sample_rate,
+                                  self.noise.seed, self.dtype)
+        
+        if voice == 'kick':
+            factory = lambda: self.generate_kick(duration=duration, kick_type=style, bass_boost=bass_boost)
+        elif voice == 'snare':
+            factory = lambda: self.generate_snare(duration=duration, mood=style, distortion=distortion)
+        else:
+            factory = lambda: self.generate_hihat(duration=duration, hihat_style=style)
+        
+        return self.voice_cache.get(key, lambda: factory().astype(self.dtype, copy=False))
+
+    def create_beat_from_prompt(self, prompt, output_dir=None, basename=None, output_format='wav', stems=None):
+        """Main function: Create beat from natural language prompt, as a wav, flac or opus file.
+
+        ``stems`` ('multichannel' or 'files') also writes kick, snare and
+        hi-hat stems, rendered in the same pass as the mix, and makes the
+        result ``(filename, params, stem_files)``.
+        """
         print(f"🎵 Processing prompt: '{prompt}'")
         
         # Parse the prompt
@@ -82,235 +112,60 @@ class SmartDrumMachine:
         description = self.processor.generate_description(params)
         print(f"📝 {description}")
         
-        # Generate the beat
-        beat = self.create_parametric_beat(params)
-        
-        # Save the beat
-        filename = f"ai_beat_{params['genre']}_{params['bpm']}bpm.wav"
+        # Stream the beat straight into the file block by block, so
+        # memory stays flat no matter how many bars were asked for
+        basename = basename or f"ai_beat_{params['genre']}_{params['bpm']}bpm"
+        stem = os.path.join(output_dir or '', basename)
+        filename = output_path(stem, output_format)
         volume_scale = params.get('volume', 1.0)
-        wavfile.write(filename, self.sample_rate, (beat * 16383 * volume_scale).astype(np.int16))
-        
-        print(f"✅ Generated: {filename}")
-        return filename, params
-
-    def create_parametric_beat(self, params):
-        """Create beat based on parsed parameters"""
-        bpm = params['bpm']
-        bars = params['bars']
-        genre = params['genre']
-        
-        # Generate pattern based on genre
-        if genre == 'trap':
-            pattern = self.create_trap_pattern_advanced(params)
-        elif genre == 'boom bap':
-            pattern = self.create_boom_bap_pattern(params)
-        elif genre == 'drill':
-            pattern = self.create_drill_pattern(params)
-        elif genre == 'lo-fi':
-            pattern = self.create_lofi_pattern(params)
-        else:
-            pattern = self.create_trap_pattern_advanced(params)
-        
-        return pattern
-
-    def create_trap_pattern_advanced(self, params):
-        """Advanced trap pattern with parameters - FIXED VERSION"""
-        bpm = params['bpm']
-        bars = params['bars']
-        
-        beat_duration = 60.0 / bpm
-        bar_duration = beat_duration * 4
-        total_duration = bar_duration * bars
-        total_samples = int(self.sample_rate * total_duration)
-        pattern = np.zeros(total_samples)
-        
-        for bar in range(bars):
-            bar_start = int(bar * bar_duration * self.sample_rate)
-            beat_samples = int(beat_duration * self.sample_rate)
-            
-            # Generate sounds with shorter durations to fit the beat
-            kick = self.generate_kick(duration=0.3, kick_type=params['kick_pattern'], bass_boost=params['bass_boost'])
-            snare = self.generate_snare(duration=0.2, mood=params['mood'], distortion=params['distortion'])
-            hihat = self.generate_hihat(duration=0.1, hihat_style=params['hihat_style'])
-            
-            # Kick pattern: 1, 2.5, 4 (trap style) - FIXED
-            # Kick on beat 1
-            kick_pos1 = bar_start
-            if kick_pos1 + len(kick) < len(pattern):
-                pattern[kick_pos1:kick_pos1 + len(kick)] += kick
-            
-            # Kick on beat 2.5
-            kick_pos2 = bar_start + int(beat_samples * 1.5)
-            if kick_pos2 + len(kick) < len(pattern):
-                pattern[kick_pos2:kick_pos2 + len(kick)] += kick * 0.8
-            
-            # Kick on beat 4
-            kick_pos3 = bar_start + beat_samples * 3
-            if kick_pos3 + len(kick) < len(pattern):
-                pattern[kick_pos3:kick_pos3 + len(kick)] += kick
-            
-            # Snare on 2 and 4 - FIXED
-            snare_pos1 = bar_start + beat_samples
-            if snare_pos1 + len(snare) < len(pattern):
-                pattern[snare_pos1:snare_pos1 + len(snare)] += snare
-            
-            snare_pos2 = bar_start + beat_samples * 3
-            if snare_pos2 + len(snare) < len(pattern):
-                pattern[snare_pos2:snare_pos2 + len(snare)] += snare
-            
-            # Hi-hats - FIXED
-            if params['hihat_style'] == 'rapid':
-                # Rapid trap hi-hats (16th notes)
-                for sixteenth in range(16):
-                    hihat_pos = bar_start + int(sixteenth * beat_samples / 4)
-                    if hihat_pos + len(hihat) < len(pattern):
-                        pattern[hihat_pos:hihat_pos + len(hihat)] += hihat * 0.4
+        with open_writer(filename, self.sample_rate, output_format=output_format,
+                         scale=16383 * volume_scale) as wav:
+            if stems is None:
+                for block in self.stream_parametric_beat(params):
+                    wav.write(block)
             else:
-                # Standard 8th notes
-                for eighth in range(8):
-                    hihat_pos = bar_start + int(eighth * beat_samples / 2)
-                    if hihat_pos + len(hihat) < len(pattern):
-                        pattern[hihat_pos:hihat_pos + len(hihat)] += hihat * 0.3
+                with StemWriter(stem, self.sample_rate, VOICES, stems, output_format,
+                                scale=16383 * volume_scale) as stem_writer:
+                    for block, stem_block in self.stream_parametric_beat(params, stems=True):
+                        wav.write(block)
+                        stem_writer.write(stem_block)
         
-        return pattern
+        print(f"✅ Generated: {filename}")
+        if stems is None:
+            return filename, params
+        print(f"🎚️ Stems: {', '.join(stem_writer.paths)}")
+        return filename, params, stem_writer.paths
 
-    def create_boom_bap_pattern(self, params):
-        """Classic boom bap pattern - FIXED VERSION"""
-        bpm = params['bpm']
-        bars = params['bars']
-        
-        beat_duration = 60.0 / bpm
-        bar_duration = beat_duration * 4
-        total_duration = bar_duration * bars
-        total_samples = int(self.sample_rate * total_duration)
-        pattern = np.zeros(total_samples)
-        
-        for bar in range(bars):
-            bar_start = int(bar * bar_duration * self.sample_rate)
-            beat_samples = int(beat_duration * self.sample_rate)
-            
-            # Generate sounds with appropriate durations
-            kick = self.generate_kick(duration=0.4, kick_type=params['kick_pattern'], bass_boost=params['bass_boost'])
-            snare = self.generate_snare(duration=0.3, mood=params['mood'])
-            hihat = self.generate_hihat(duration=0.2, hihat_style=params['hihat_style'])
-            
-            # Classic boom bap: kick on 1 and 3 - FIXED
-            kick_pos1 = bar_start
-            if kick_pos1 + len(kick) < len(pattern):
-                pattern[kick_pos1:kick_pos1 + len(kick)] += kick
-            
-            kick_pos2 = bar_start + beat_samples * 2
-            if kick_pos2 + len(kick) < len(pattern):
-                pattern[kick_pos2:kick_pos2 + len(kick)] += kick
-            
-            # Snare on 2 and 4 (the "bap") - FIXED
-            snare_pos1 = bar_start + beat_samples
-            if snare_pos1 + len(snare) < len(pattern):
-                pattern[snare_pos1:snare_pos1 + len(snare)] += snare
-            
-            snare_pos2 = bar_start + beat_samples * 3
-            if snare_pos2 + len(snare) < len(pattern):
-                pattern[snare_pos2:snare_pos2 + len(snare)] += snare
-            
-            # Simple hi-hat pattern - FIXED
-            for quarter in range(4):
-                hihat_pos = bar_start + int(quarter * beat_samples)
-                if hihat_pos + len(hihat) < len(pattern):
-                    pattern[hihat_pos:hihat_pos + len(hihat)] += hihat * 0.2
-        
-        return pattern
+    def create_parametric_beat(self, params, stems=False):
+        """Create beat based on parsed parameters; with ``stems``, ``(mix, stems)`` as from ``render_events``"""
+        return render_events(*self._beat_plan(params), stems=stems)
 
-    def create_drill_pattern(self, params):
-        """UK Drill pattern - similar to trap but with sliding 808s"""
-        bpm = params['bpm']
-        bars = params['bars']
-        
-        beat_duration = 60.0 / bpm
-        bar_duration = beat_duration * 4
-        total_duration = bar_duration * bars
-        total_samples = int(self.sample_rate * total_duration)
-        pattern = np.zeros(total_samples)
-        
-        for bar in range(bars):
-            bar_start = int(bar * bar_duration * self.sample_rate)
-            beat_samples = int(beat_duration * self.sample_rate)
-            
-            # Generate sounds
-            kick = self.generate_kick(duration=0.4, kick_type=params['kick_pattern'], bass_boost=params['bass_boost'])
-            snare = self.generate_snare(duration=0.25, mood=params['mood'], distortion=params['distortion'])
-            hihat = self.generate_hihat(duration=0.08, hihat_style=params['hihat_style'])
-            
-            # Drill pattern: sparse kicks with emphasis
-            kick_pos1 = bar_start
-            if kick_pos1 + len(kick) < len(pattern):
-                pattern[kick_pos1:kick_pos1 + len(kick)] += kick
-            
-            kick_pos2 = bar_start + int(beat_samples * 2.75)  # Slightly off-beat
-            if kick_pos2 + len(kick) < len(pattern):
-                pattern[kick_pos2:kick_pos2 + len(kick)] += kick * 0.9
-            
-            # Snare on 2 and 4
-            snare_pos1 = bar_start + beat_samples
-            if snare_pos1 + len(snare) < len(pattern):
-                pattern[snare_pos1:snare_pos1 + len(snare)] += snare
-            
-            snare_pos2 = bar_start + beat_samples * 3
-            if snare_pos2 + len(snare) < len(pattern):
-                pattern[snare_pos2:snare_pos2 + len(snare)] += snare
-            
-            # Sparse hi-hats
-            for quarter in range(0, 8, 3):  # Every 3rd eighth note
-                hihat_pos = bar_start + int(quarter * beat_samples / 2)
-                if hihat_pos + len(hihat) < len(pattern):
-                    pattern[hihat_pos:hihat_pos + len(hihat)] += hihat * 0.3
-        
-        return pattern
+    def stream_parametric_beat(self, params, block_size=BLOCK_SIZE, stems=False):
+        """Yield the beat as consecutive blocks of at most ``block_size`` samples, or (mix, stems) block pairs"""
+        return render_blocks(*self._beat_plan(params), block_size=block_size, stems=stems)
 
-    def create_lofi_pattern(self, params):
-        """Lo-fi hip hop pattern - laid back and chill"""
+    def _beat_plan(self, params):
+        """Events, voices, length and bar starts for a parsed prompt"""
         bpm = params['bpm']
         bars = params['bars']
+        genre = resolve_genre(params['genre'])
         
         beat_duration = 60.0 / bpm
         bar_duration = beat_duration * 4
-        total_duration = bar_duration * bars
-        total_samples = int(self.sample_rate * total_duration)
-        pattern = np.zeros(total_samples)
-        
-        for bar in range(bars):
-            bar_start = int(bar * bar_duration * self.sample_rate)
-            beat_samples = int(beat_duration * self.sample_rate)
-            
-            # Generate sounds with lo-fi character
-            kick = self.generate_kick(duration=0.5, kick_type=params['kick_pattern'], bass_boost=params['bass_boost'])
-            snare = self.generate_snare(duration=0.4, mood=params['mood'], distortion=params['distortion'])
-            hihat = self.generate_hihat(duration=0.15, hihat_style=params['hihat_style'])
-            
-            # Lo-fi pattern: simple and laid back
-            kick_pos1 = bar_start
-            if kick_pos1 + len(kick) < len(pattern):
-                pattern[kick_pos1:kick_pos1 + len(kick)] += kick
-            
-            kick_pos2 = bar_start + beat_samples * 2
-            if kick_pos2 + len(kick) < len(pattern):
-                pattern[kick_pos2:kick_pos2 + len(kick)] += kick * 0.8
-            
-            # Snare on 2 and 4
-            snare_pos1 = bar_start + beat_samples
-            if snare_pos1 + len(snare) < len(pattern):
-                pattern[snare_pos1:snare_pos1 + len(snare)] += snare
-            
-            snare_pos2 = bar_start + beat_samples * 3
-            if snare_pos2 + len(snare) < len(pattern):
-                pattern[snare_pos2:snare_pos2 + len(snare)] += snare
-            
-            # Subtle hi-hats with vinyl texture
-            for eighth in range(0, 8, 2):  # Every other eighth note
-                hihat_pos = bar_start + int(eighth * beat_samples / 2)
-                if hihat_pos + len(hihat) < len(pattern):
-                    pattern[hihat_pos:hihat_pos + len(hihat)] += hihat * 0.25
-        
-        return pattern
+        total_samples = int(self.sample_rate * bar_duration * bars)
+        
+        # Voices never change between bars, so fetch them once from the cache
+        kick_duration, snare_duration, hihat_duration = voice_durations(genre)
+        voices = [
+            self.get_voice('kick', params['kick_pattern'], kick_duration, bass_boost=params['bass_boost']),
+            self.get_voice('snare', params['mood'], snare_duration, distortion=params['distortion']),
+            self.get_voice('hihat', params['hihat_style'], hihat_duration)
+        ]
+        
+        # One bar of the genre's step grid, repeated at every bar start
+        events = bar_events(genre, params['hihat_style'], bpm, self.sample_rate)
+        starts = bar_starts(bpm, bars, self.sample_rate)
+        return events, voices, total_samples, starts
 
 # Test the smart drum machine
 if __name__ == "__main__":
@@ -1,7 +1,6 @@
-import torch
 import numpy as np
-from scipy.io import wavfile
 import json
+from audio_writer import write_wav
 import os
 from datetime import datetime
 
@@ -24,7 +23,7 @@ class AIProducerDAW:
         t = np.linspace(0, duration, int(self.sample_rate * duration))
         beat = np.sin(2 * np.pi * 60 * t) * np.exp(-t * 3)
         filename = f"beat_{len(self.projects[self.current_project]['tracks'])}.wav"
-        wavfile.write(filename, self.sample_rate, (beat * 32767).astype(np.int16))
+        write_wav(filename, beat, self.sample_rate)
         self.projects[self.current_project]['tracks'].append(filename)
         print(f"? Generated: {filename}")
         return filename
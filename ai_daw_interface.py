@@ -1,6 +1,7 @@
 import os
 import sys
 from ai_beat_generator import SmartDrumMachine
+from batch_render import render_prompts
 import json
 from datetime import datetime
 
@@ -56,7 +57,7 @@ class AIDAWInterface:
                 beat_info = {
                     'prompt': prompt,
                     'filename': filename,
-                    'params': params,
+                    'params': params.to_dict(),
                     'timestamp': datetime.now().isoformat()
                 }
                 self.session_beats.append(beat_info)
@@ -88,27 +89,28 @@ class AIDAWInterface:
             print("No prompts entered!")
             return
             
-        print(f"\n🚀 Generating {len(prompts)} beats...")
-        
-        for i, prompt in enumerate(prompts, 1):
-            try:
-                print(f"\n[{i}/{len(prompts)}] Processing: '{prompt}'")
-                filename, params = self.drum_machine.create_beat_from_prompt(prompt)
-                
-                beat_info = {
-                    'prompt': prompt,
-                    'filename': filename,
-                    'params': params,
-                    'timestamp': datetime.now().isoformat()
-                }
-                self.session_beats.append(beat_info)
-                
-                print(f"✅ Generated: {filename}")
+        print(f"\n🚀 Generating {len(prompts)} beats across all CPU cores...")
+        print(f"📁 Output folder: {self.session_name}/")
+        
+        generated = 0
+        start_index = len(self.session_beats) + 1
+        for done, entry in enumerate(render_prompts(prompts, self.session_name, start_index=start_index, quiet=True), 1):
+            if entry['status'] != 'done':
+                print(f"❌ [{done}/{len(prompts)}] Error with prompt '{entry['prompt']}': {entry['error']}")
+                continue
                 
-            except Exception as e:
-                print(f"❌ Error with prompt '{prompt}': {e}")
+            beat_info = {
+                'prompt': entry['prompt'],
+                'filename': entry['files'][0],
+                'params': entry['params'],
+                'timestamp': datetime.now().isoformat()
+            }
+            self.session_beats.append(beat_info)
+            generated += 1
+            
+            print(f"✅ [{done}/{len(prompts)}] Generated: {entry['files'][0]}")
                 
-        print(f"\n🎉 Batch complete! Generated {len([b for b in self.session_beats if any(p == b['prompt'] for p in prompts)])} beats")
+        print(f"\n🎉 Batch complete! Generated {generated} beats")
         
     def view_generated_beats(self):
         if not self.session_beats:
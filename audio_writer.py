@@ -0,0 +1,543 @@
+import math
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+import metrics
+from metrics import timed
+
+# sample format -> (WAV format tag, bytes per sample, full-scale value)
+SAMPLE_FORMATS = {
+    'int16': (1, 2, 32767),
+    'int24': (1, 3, 8388607),
+    'float32': (3, 4, 1.0),
+}
+
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Tail of the KSDATAFORMAT_SUBTYPE GUIDs; the format tag goes in front
+SUBFORMAT_GUID_TAIL = struct.pack('<HH', 0x0000, 0x0010) + bytes([0x80, 0x00, 0x00, 0xAA, 0x00, 0x38, 0x9B, 0x71])
+
+# Speaker positions for mono and stereo; more channels (e.g. stems) are left unassigned
+CHANNEL_MASKS = {1: 0x4, 2: 0x3}
+
+# RIFF sizes are 32-bit, so a WAV file can't hold more than this
+MAX_RIFF_SIZE = 0xFFFFFFFF
+
+# output format -> (file extension, libsndfile container, libsndfile subtype, MIME type)
+OUTPUT_FORMATS = {
+    'wav': ('.wav', 'WAV', 'PCM_16', 'audio/wav'),
+    'flac': ('.flac', 'FLAC', 'PCM_16', 'audio/flac'),
+    'opus': ('.opus', 'OGG', 'OPUS', 'audio/ogg'),
+}
+
+# How StemWriter lays out stems: channels of one file, or a file per voice
+STEM_LAYOUTS = ('multichannel', 'files')
+
+# Opus only encodes at these rates; anything else is resampled to 48 kHz
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+class WavWriter:
+    """Writes a WAV file chunk by chunk without holding the whole song in memory.
+
+    Float samples are scaled by ``scale`` (the format's full-scale value by
+    default), clipped and converted to ``sample_format`` one chunk at a
+    time. Chunks are appended in order with ``write``. When the length is
+    known up front, pass ``frames`` to pre-size the file: chunks then go
+    straight into a memory-mapped view of the data region, which is also
+    exposed as ``data`` for callers that want to fill it themselves.
+
+    The file is written under a temporary name next to ``path`` and only
+    renamed into place by ``close``, so readers never see a half-written
+    file. Use it as a context manager; an exception discards the file.
+    24-bit and multichannel files get a WAVE_FORMAT_EXTENSIBLE fmt chunk.
+    Writes that would take the file past the 4 GiB RIFF limit raise.
+    """
+
+    def __init__(self, path, sample_rate, channels=1, sample_format='int16', scale=None, frames=None):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unknown sample format {sample_format!r}, expected one of {tuple(SAMPLE_FORMATS)}")
+
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_format = sample_format
+        self.format_tag, self.sample_width, full_scale = SAMPLE_FORMATS[sample_format]
+        self.scale = full_scale if scale is None else scale
+        self.frames_written = 0
+        self.data = None
+        self._scratch = None
+        self._closed = False
+
+        self._check_size(frames or 0)
+
+        directory, name = os.path.split(path)
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=f".{name}.", suffix='.tmp')
+        self._file = os.fdopen(fd, 'w+b')
+        self._write_header(frames or 0)
+        self.data_offset = self._file.tell()
+
+        if frames is not None:
+            self._file.truncate(self.data_offset + self._padded(frames * self.frame_width))
+            self.data = np.memmap(self._file, dtype=self._map_dtype(), mode='r+',
+                                  offset=self.data_offset, shape=self._map_shape(frames))
+
+    @property
+    def frame_width(self):
+        return self.channels * self.sample_width
+
+    def write(self, samples):
+        """Convert and append a chunk of float samples, shape (frames,) or (frames, channels)"""
+        samples = np.asarray(samples)
+        frames = len(samples)
+        if frames == 0:
+            return
+
+        self._check_size(self.frames_written + frames)
+        with timed('file_write'):
+            if self.data is not None:
+                if self.frames_written + frames > len(self.data):
+                    raise ValueError("Chunk runs past the pre-sized length of the file")
+                self._convert(samples, self.data[self.frames_written:self.frames_written + frames])
+            else:
+                self._file.write(self._convert(samples).tobytes())
+        self.frames_written += frames
+        if metrics.is_enabled():
+            metrics.BYTES_WRITTEN.inc(frames * self.frame_width)
+
+    def flush(self):
+        """Point the header at everything written so far and flush it to disk"""
+        if self.data is not None:
+            self.data.flush()
+        self._update_header()
+        self._file.flush()
+
+    def close(self, path=None):
+        """Finish the file and move it into place, at ``path`` instead if given"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self.data is not None:
+            # Pre-sized but cut short - drop the unused tail
+            self.data.flush()
+            self.data = None
+            self._file.truncate(self.data_offset + self._padded(self.frames_written * self.frame_width))
+        elif self.frames_written * self.frame_width % 2:
+            # RIFF chunks are word aligned
+            self._file.write(b'\0')
+
+        self._update_header()
+        self._file.close()
+        # mkstemp files are private to the owner; exports should be readable like any other file
+        os.chmod(self.tmp_path, 0o644)
+        os.replace(self.tmp_path, path or self.path)
+
+    def abort(self):
+        """Throw the partial file away"""
+        if self._closed:
+            return
+        self._closed = True
+        self.data = None
+        self._file.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _convert(self, samples, out=None):
+        """Scale, clip and convert ``samples`` to the output format, into ``out`` if given"""
+        samples = samples.reshape(len(samples), self.channels)
+
+        # Scale into a reused float buffer so no chunk-sized temporaries pile up
+        dtype = np.result_type(samples.dtype, np.float32)
+        if self._scratch is None or len(self._scratch) < len(samples) or self._scratch.dtype != dtype:
+            self._scratch = np.empty((len(samples), self.channels), dtype=dtype)
+        scaled = self._scratch[:len(samples)]
+        np.multiply(samples, float(self.scale), out=scaled)
+
+        if self.sample_format == 'float32':
+            if out is None:
+                return scaled.astype('<f4')
+            out[...] = scaled
+            return out
+
+        limit = SAMPLE_FORMATS[self.sample_format][2]
+        np.clip(scaled, -limit - 1, limit, out=scaled)
+
+        if self.sample_format == 'int16':
+            if out is None:
+                return scaled.astype('<i2')
+            np.copyto(out, scaled, casting='unsafe')
+            return out
+
+        # 24-bit: the low three bytes of each little-endian int32
+        packed = scaled.astype('<i4').view(np.uint8).reshape(len(samples), self.channels, 4)[..., :3]
+        if out is None:
+            return np.ascontiguousarray(packed)
+        out[...] = packed
+        return out
+
+    def _map_dtype(self):
+        return {'int16': '<i2', 'int24': np.uint8, 'float32': '<f4'}[self.sample_format]
+
+    def _map_shape(self, frames):
+        if self.sample_format == 'int24':
+            return (frames, self.channels, 3)
+        return (frames, self.channels)
+
+    @staticmethod
+    def _padded(size):
+        return size + size % 2
+
+    def _check_size(self, frames):
+        """Refuse to grow past what the 32-bit RIFF and data sizes can describe"""
+        if len(self._header(0)) - 8 + self._padded(frames * self.frame_width) > MAX_RIFF_SIZE:
+            raise ValueError(f"{frames} frames don't fit in a WAV file (4 GiB limit); write FLAC instead")
+
+    def _write_header(self, frames):
+        self._file.seek(0)
+        self._file.write(self._header(frames))
+
+    def _update_header(self):
+        position = self._file.tell()
+        self._write_header(self.frames_written)
+        self._file.seek(position)
+
+    def _header(self, frames):
+        data_size = frames * self.frame_width
+        bits = self.sample_width * 8
+        # Samples wider than 16-bit PCM and more than two channels need the extensible fmt chunk
+        extensible = self.sample_format == 'int24' or self.channels > 2
+        fmt = struct.pack('<HHIIHH', WAVE_FORMAT_EXTENSIBLE if extensible else self.format_tag, self.channels,
+                          self.sample_rate, self.sample_rate * self.frame_width, self.frame_width, bits)
+        if extensible:
+            fmt += struct.pack('<HHI', 22, bits, CHANNEL_MASKS.get(self.channels, 0))
+            fmt += struct.pack('<I', self.format_tag) + SUBFORMAT_GUID_TAIL
+        elif self.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            fmt += struct.pack('<H', 0)
+
+        chunks = [b'fmt ' + struct.pack('<I', len(fmt)) + fmt]
+        if self.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            # Non-PCM formats carry a fact chunk with the frame count
+            chunks.append(b'fact' + struct.pack('<II', 4, frames))
+        chunks.append(b'data' + struct.pack('<I', data_size))
+
+        body = b'WAVE' + b''.join(chunks)
+        return b'RIFF' + struct.pack('<I', len(body) + self._padded(data_size)) + body
+
+
+class SegmentStitcher:
+    """Joins overlapping segments into a WavWriter with a crossfade at each seam.
+
+    Every segment after the first starts with ``fade_frames`` frames that
+    cover the same stretch of time as the end of the previous segment; the
+    two are crossfaded linearly. Each segment is written and flushed as soon
+    as it is added, except for the tail held back for the next seam, so the
+    file on disk is always a playable prefix of the song. Output stops at
+    ``total_frames``. ``transform``, if given, is applied to frames just
+    before they are written.
+    """
+
+    def __init__(self, writer, total_frames, fade_frames, transform=None):
+        self.writer = writer
+        self.total_frames = total_frames
+        self.fade_frames = fade_frames
+        self.transform = transform
+        self._pending = None
+
+    @property
+    def remaining(self):
+        """Frames still needed after the ones written or held for the next seam"""
+        held = 0 if self._pending is None else len(self._pending)
+        return self.total_frames - self.writer.frames_written - held
+
+    def add(self, segment):
+        """Crossfade ``segment``, shape (frames, channels), onto the song and write what is final"""
+        segment = np.asarray(segment, dtype=np.float32)
+        if self._pending is not None:
+            held = self._pending
+            ramp = ((np.arange(len(held), dtype=np.float32) + 0.5) / len(held))[:, None]
+            seam = held + (segment[:len(held)] - held) * ramp
+            segment = np.concatenate([seam, segment[len(held):]])
+            self._pending = None
+
+        segment = segment[:self.total_frames - self.writer.frames_written]
+        final = self.writer.frames_written + len(segment) >= self.total_frames
+        keep = 0 if final else min(self.fade_frames, len(segment))
+        if keep:
+            self._pending = segment[len(segment) - keep:]
+            segment = segment[:len(segment) - keep]
+
+        self.writer.write(segment if self.transform is None else self.transform(segment))
+        self.writer.flush()
+
+    def finish(self):
+        """Write the held tail, for a song that ends before ``total_frames``"""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            self.writer.write(pending if self.transform is None else self.transform(pending))
+            self.writer.flush()
+
+
+class StreamingResampler:
+    """Polyphase resampling of a stream, chunk by chunk.
+
+    The output matches ``scipy.signal.resample_poly`` over the whole signal:
+    each chunk is resampled together with enough history and lookahead to
+    cover the filter, so the seams between chunks are exact. Output lags
+    input by that lookahead; ``flush`` returns the rest at the end.
+    """
+
+    def __init__(self, rate_in, rate_out):
+        common = math.gcd(rate_in, rate_out)
+        self.up = rate_out // common
+        self.down = rate_in // common
+        # resample_poly's filter reaches 10 * max(up, down) taps either side at the upsampled
+        # rate; context is that many input frames, rounded to whole output frames
+        reach = math.ceil(10 * max(self.up, self.down) / self.up) + 1
+        self.context = math.ceil(reach / self.down) * self.down
+        self._buffer = None
+        self._frames_in = 0
+        self._frames_out = 0
+
+    def process(self, block):
+        """Resample the next chunk, shape (frames, channels); returns what is ready so far"""
+        block = np.asarray(block, dtype=np.float32)
+        if self._buffer is None:
+            # Silence before the start, as resample_poly assumes
+            self._buffer = np.zeros((self.context, block.shape[1]), dtype=np.float32)
+        self._buffer = np.concatenate([self._buffer, block])
+        self._frames_in += len(block)
+        return self._drain()
+
+    def flush(self):
+        """Everything still held back, with silence after the end"""
+        if self._buffer is None:
+            return np.zeros((0, 1), dtype=np.float32)
+        pending = len(self._buffer) - self.context
+        padding = self.context + (-pending % self.down)
+        self._buffer = np.concatenate([self._buffer, np.zeros((padding, self._buffer.shape[1]), np.float32)])
+        out = self._drain()
+        # resample_poly produces ceil(frames * up / down) frames
+        total = -(-self._frames_in * self.up // self.down)
+        return out[:max(0, total - (self._frames_out - len(out)))]
+
+    def _drain(self):
+        from scipy.signal import resample_poly
+
+        ready = (len(self._buffer) - 2 * self.context) // self.down * self.down
+        if ready <= 0:
+            return np.zeros((0, self._buffer.shape[1]), dtype=np.float32)
+        resampled = resample_poly(self._buffer[:ready + 2 * self.context], self.up, self.down, axis=0)
+        skip = self.context * self.up // self.down
+        out = resampled[skip:skip + ready * self.up // self.down].astype(np.float32, copy=False)
+        # Keep the history the next chunk needs
+        self._buffer = self._buffer[ready:]
+        self._frames_out += len(out)
+        return out
+
+
+class EncodedWriter:
+    """Streams a compressed file (FLAC or Ogg/Opus) through libsndfile, chunk by chunk.
+
+    It works like ``WavWriter``: chunks go in with ``write``, and the file
+    is written under a temporary name and renamed into place by ``close``.
+    ``scale`` has the int16 meaning it has for WavWriter (32767 is full
+    scale), so callers can switch formats without touching levels. Opus
+    input at a rate the codec lacks is resampled to 48 kHz on the way in.
+    """
+
+    def __init__(self, path, sample_rate, channels=1, output_format='flac', scale=None):
+        import soundfile as sf
+
+        if output_format not in OUTPUT_FORMATS or output_format == 'wav':
+            raise ValueError(f"Unknown compressed format {output_format!r}, expected 'flac' or 'opus'")
+
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.output_format = output_format
+        self.gain = (32767 if scale is None else scale) / 32767
+        self.frames_written = 0
+        self._resampler = None
+        self._closed = False
+
+        file_rate = sample_rate
+        if output_format == 'opus' and sample_rate not in OPUS_SAMPLE_RATES:
+            file_rate = 48000
+            self._resampler = StreamingResampler(sample_rate, file_rate)
+
+        _, container, subtype, _ = OUTPUT_FORMATS[output_format]
+        directory, name = os.path.split(path)
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=f".{name}.", suffix='.tmp')
+        os.close(fd)
+        self._file = sf.SoundFile(self.tmp_path, 'w', file_rate, channels, subtype, format=container)
+
+    def write(self, samples):
+        """Encode and append a chunk of float samples, shape (frames,) or (frames, channels)"""
+        samples = np.asarray(samples, dtype=np.float32)
+        frames = len(samples)
+        if frames == 0:
+            return
+
+        with timed('file_write'):
+            block = np.clip(samples.reshape(frames, self.channels) * self.gain, -1.0, 1.0)
+            if self._resampler is not None:
+                block = self._resampler.process(block)
+            if len(block):
+                self._file.write(block)
+        self.frames_written += frames
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self, path=None):
+        """Finish the file and move it into place, at ``path`` instead if given"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._resampler is not None:
+            self._file.write(self._resampler.flush())
+        self._file.close()
+        os.chmod(self.tmp_path, 0o644)
+        os.replace(self.tmp_path, path or self.path)
+        if metrics.is_enabled():
+            metrics.BYTES_WRITTEN.inc(os.path.getsize(path or self.path))
+
+    def abort(self):
+        """Throw the partial file away"""
+        if self._closed:
+            return
+        self._closed = True
+        self._file.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class StemWriter:
+    """Streams per-voice stems into one multichannel file or one file per voice.
+
+    ``write`` takes a chunk of shape (voices, frames), like the stems from
+    ``render_blocks``. With the ``multichannel`` layout channel i of
+    ``<stem>_stems`` holds voice i; with ``files`` voice i goes to
+    ``<stem>_<names[i]>``. ``paths`` lists the files either way. Every file
+    is written atomically, and an exception discards them all.
+    """
+
+    def __init__(self, stem, sample_rate, names, layout='multichannel', output_format='wav', scale=None):
+        if layout not in STEM_LAYOUTS:
+            raise ValueError(f"Unknown stem layout {layout!r}, expected one of {STEM_LAYOUTS}")
+        self.layout = layout
+        if layout == 'multichannel':
+            self.paths = [output_path(f"{stem}_stems", output_format)]
+            self._writers = [open_writer(self.paths[0], sample_rate, len(names), output_format, scale)]
+        else:
+            self.paths = [output_path(f"{stem}_{name}", output_format) for name in names]
+            self._writers = []
+            try:
+                for path in self.paths:
+                    self._writers.append(open_writer(path, sample_rate, 1, output_format, scale))
+            except BaseException:
+                self.abort()
+                raise
+
+    def write(self, stems):
+        if self.layout == 'multichannel':
+            self._writers[0].write(stems.T)
+        else:
+            for writer, samples in zip(self._writers, stems):
+                writer.write(samples)
+
+    def close(self):
+        for writer in self._writers:
+            writer.close()
+
+    def abort(self):
+        for writer in self._writers:
+            writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def output_path(stem, output_format='wav'):
+    """``stem`` with the extension for ``output_format``"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {tuple(OUTPUT_FORMATS)}")
+    return stem + OUTPUT_FORMATS[output_format][0]
+
+
+def open_writer(path, sample_rate, channels=1, output_format='wav', scale=None):
+    """A streaming writer for ``output_format``: ``WavWriter`` for 16-bit WAV, ``EncodedWriter`` otherwise"""
+    if output_format == 'wav':
+        return WavWriter(path, sample_rate, channels, scale=scale)
+    return EncodedWriter(path, sample_rate, channels, output_format, scale)
+
+
+def write_wav(path, samples, sample_rate, sample_format='int16', scale=None, chunk_size=65536):
+    """Write a whole float array to ``path`` chunk by chunk, atomically"""
+    samples = np.asarray(samples)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    with WavWriter(path, sample_rate, channels, sample_format, scale, frames=len(samples)) as wav:
+        for start in range(0, len(samples), chunk_size):
+            wav.write(samples[start:start + chunk_size])
+    return path
+
+
+def write_audio(path, samples, sample_rate, output_format='wav', scale=None, chunk_size=65536):
+    """Write a whole float array in ``output_format``, chunk by chunk, atomically"""
+    if output_format == 'wav':
+        return write_wav(path, samples, sample_rate, scale=scale, chunk_size=chunk_size)
+
+    samples = np.asarray(samples)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    with EncodedWriter(path, sample_rate, channels, output_format, scale) as writer:
+        for start in range(0, len(samples), chunk_size):
+            writer.write(samples[start:start + chunk_size])
+    return path
+
+
+def write_stems(stem, stems, sample_rate, names, layout='multichannel', output_format='wav', scale=None,
+                chunk_size=65536):
+    """Write whole (voices, frames) stems with ``StemWriter``, chunk by chunk; returns their paths"""
+    with StemWriter(stem, sample_rate, names, layout, output_format, scale) as writer:
+        for start in range(0, stems.shape[1], chunk_size):
+            writer.write(stems[:, start:start + chunk_size])
+    return writer.paths
+
+
+def transcode(source, destination, output_format, chunk_size=65536):
+    """Re-encode any file libsndfile reads into ``output_format``, chunk by chunk, atomically"""
+    import soundfile as sf
+
+    with sf.SoundFile(source) as src:
+        with open_writer(destination, src.samplerate, src.channels, output_format) as writer:
+            for block in src.blocks(blocksize=chunk_size, dtype='float32', always_2d=True):
+                writer.write(block)
+    return destination
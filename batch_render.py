@@ -0,0 +1,154 @@
+"""Render many prompts to audio files in parallel, without the interactive menu.
+
+Usage:
+    python batch_render.py prompts.txt --out-dir renders
+    cat prompts.txt | python batch_render.py - --out-dir renders --engine enhanced --workers 8
+    python batch_render.py prompts.txt --out-dir renders --format opus
+
+One prompt per line; blank lines and lines starting with ``#`` are skipped.
+Every beat gets a line in the manifest (``manifest.jsonl`` in the output
+directory by default) with its prompt, parsed params, output files and
+render time. A manifest ending in ``.json`` is written as one JSON list
+instead.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+ENGINES = ('smart', 'enhanced')
+FORMATS = ('wav', 'flac', 'opus')
+
+# The drum machine owned by this worker process
+_machine = None
+_engine = None
+
+
+def _init_worker(engine, sample_rate, seed, quiet):
+    global _machine, _engine
+    # Forked workers inherit the parent's random state - reseed so prompts
+    # without an explicit BPM don't all get the same one
+    random.seed()
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+
+    _engine = engine
+    if engine == 'enhanced':
+        from enhanced_ai_daw import EnhancedAIDaw
+        _machine = EnhancedAIDaw(sample_rate, seed=seed)
+    else:
+        from ai_beat_generator import SmartDrumMachine
+        _machine = SmartDrumMachine(sample_rate, seed=seed)
+
+
+def _render_one(index, prompt, out_dir, basename, output_format='wav'):
+    """Render one prompt in a worker and describe the result for the manifest"""
+    entry = {'index': index, 'prompt': prompt}
+    start = time.perf_counter()
+    try:
+        if _engine == 'enhanced':
+            audio_file, midi_file, params = _machine.create_enhanced_beat(
+                prompt, output_dir=out_dir, basename=basename, output_format=output_format)
+            entry['files'] = [audio_file, midi_file]
+        else:
+            audio_file, params = _machine.create_beat_from_prompt(
+                prompt, output_dir=out_dir, basename=basename, output_format=output_format)
+            entry['files'] = [audio_file]
+        entry['status'] = 'done'
+        entry['params'] = params.to_dict()
+    except Exception as e:
+        entry['status'] = 'failed'
+        entry['error'] = str(e)
+    entry['seconds'] = round(time.perf_counter() - start, 4)
+    return entry
+
+
+def render_prompts(prompts, out_dir, workers=None, engine='smart', sample_rate=44100, seed=None,
+                   name_prefix='beat', start_index=0, quiet=False, output_format='wav'):
+    """Render ``prompts`` across a process pool, yielding manifest entries as beats finish.
+
+    Output files are named ``{name_prefix}_{index:05d}`` so beats with the
+    same genre and tempo never overwrite each other.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown format {output_format!r}, expected one of {FORMATS}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(engine, sample_rate, seed, quiet)) as pool:
+        futures = [
+            pool.submit(_render_one, index, prompt, out_dir, f"{name_prefix}_{index:05d}", output_format)
+            for index, prompt in enumerate(prompts, start_index)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def read_prompts(source):
+    """Prompts from a file path, or stdin for ``-``"""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith('#')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a file of prompts to beats in parallel")
+    parser.add_argument('prompts', help="prompt file, one prompt per line ('-' for stdin)")
+    parser.add_argument('--out-dir', required=True, help="directory for the rendered files")
+    parser.add_argument('--manifest', help="manifest path (.jsonl or .json, default: OUT_DIR/manifest.jsonl)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--engine', choices=ENGINES, default='smart', help="drum machine to render with")
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--format', choices=FORMATS, default='wav', help="audio file format (default: wav)")
+    parser.add_argument('--seed', type=int, default=None, help="noise seed, for reproducible renders")
+    parser.add_argument('--verbose', action='store_true', help="show each worker's progress output")
+    args = parser.parse_args(argv)
+
+    prompts = read_prompts(args.prompts)
+    if not prompts:
+        print("No prompts to render!")
+        return 1
+
+    manifest_path = args.manifest or os.path.join(args.out_dir, 'manifest.jsonl')
+    as_list = manifest_path.endswith('.json')
+    entries = []
+    failed = 0
+    start = time.perf_counter()
+
+    print(f"🚀 Rendering {len(prompts)} beats with the {args.engine} engine...")
+    os.makedirs(args.out_dir, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as manifest:
+        for done, entry in enumerate(render_prompts(prompts, args.out_dir, args.workers, args.engine,
+                                                    args.sample_rate, args.seed, quiet=not args.verbose,
+                                                    output_format=args.format), 1):
+            if entry['status'] == 'done':
+                print(f"[{done}/{len(prompts)}] ✅ {entry['files'][0]} ({entry['seconds']:.2f}s)")
+            else:
+                failed += 1
+                print(f"[{done}/{len(prompts)}] ❌ '{entry['prompt']}': {entry['error']}")
+
+            if as_list:
+                entries.append(entry)
+            else:
+                # One line per beat, flushed as it lands, so a killed run keeps its progress
+                manifest.write(json.dumps(entry) + '\n')
+                manifest.flush()
+
+        if as_list:
+            json.dump(sorted(entries, key=lambda entry: entry['index']), manifest, indent=2)
+
+    print(f"\n🎉 Rendered {len(prompts) - failed}/{len(prompts)} beats in {time.perf_counter() - start:.1f}s")
+    print(f"📋 Manifest: {manifest_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
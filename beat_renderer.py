@@ -0,0 +1,263 @@
+import numpy as np
+
+from metrics import timed
+
+# Samples per streamed block; 32k float32 samples (128 KB) stays cache friendly
+BLOCK_SIZE = 32768
+
+# Hits closer than this share one stretch of a stem's loop; longer silences are skipped
+SPAN_MIN_GAP = 2048
+
+# Sample type of voices and mix buffers unless a caller asks for another
+DEFAULT_DTYPE = np.float32
+
+# One drum hit: where it starts, which one-shot it plays and how loud
+EVENT_DTYPE = np.dtype([('onset', np.int64), ('voice', np.int32), ('gain', np.float64)])
+
+
+def make_events(onsets, voices, gains):
+    """Pack parallel onset/voice/gain arrays into an event array"""
+    onsets = np.asarray(onsets, dtype=np.int64)
+    events = np.empty(len(onsets), dtype=EVENT_DTYPE)
+    events['onset'] = onsets
+    events['voice'] = voices
+    events['gain'] = gains
+    return events
+
+
+def hits_to_events(hits):
+    """Convert a list of (voice_id, onset, gain) tuples to an event array"""
+    if not hits:
+        return make_events([], [], [])
+    voice_ids, onsets, gains = zip(*hits)
+    return make_events(onsets, voice_ids, gains)
+
+
+def bar_starts(bpm, bars, sample_rate):
+    """Sample index of the first sample of every bar in 4/4"""
+    bar_duration = 60.0 / bpm * 4
+    return (np.arange(bars) * bar_duration * sample_rate).astype(np.int64)
+
+
+def tile_events(events, loop_starts):
+    """Repeat a loop of events at every loop start, loop-major"""
+    loop_starts = np.asarray(loop_starts, dtype=np.int64)
+    tiled = np.tile(events, len(loop_starts))
+    tiled['onset'] += np.repeat(loop_starts, len(events))
+    return tiled
+
+
+def float_to_int16(samples, scale=1.0, out=None):
+    """Scale float samples to 16-bit PCM, clipping instead of wrapping around.
+
+    The scaled copy is made in ``out`` (pass ``out=samples`` to reuse the
+    input buffer), so the only new full-size array is the int16 result.
+    """
+    scaled = np.multiply(samples, float(scale), out=out)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype(np.int16)
+
+
+def render_events(events, voices, total_samples, loop_starts=None, dtype=None, stems=False):
+    """Mix an event array into a mono buffer of ``total_samples``.
+
+    Without ``loop_starts`` every event onset is absolute. With
+    ``loop_starts`` the events describe one loop (onsets relative to the
+    loop start): the loop is mixed once into a small buffer and that buffer
+    is scatter-added at every start, so a pattern of N bars costs N adds
+    instead of one per hit. Where a loop's tail rings into the next loop,
+    the next loop's hits are added one by one on top of it, so the result
+    is identical sample for sample to mixing every hit in turn. Like the
+    old per-bar loops, hits that would run past the end of the buffer are
+    skipped.
+
+    The buffer has the voices' dtype unless ``dtype`` says otherwise. With
+    ``stems`` the result is ``(mix, stems)``: ``stems`` has shape
+    ``(len(voices), total_samples)`` and row i holds voice i alone. The
+    loop is rendered once per voice as well as mixed, and each stem row
+    only receives the stretches of its loop where the voice sounds, so the
+    stems add no more than their own samples to the cost of the mix. The
+    mix is exactly the one rendered without stems.
+    """
+    with timed('pattern_mix'):
+        plan = _MixPlan(events, voices, total_samples, loop_starts, dtype, stems)
+        pattern = np.zeros(total_samples, dtype=plan.dtype)
+        stem_rows = plan.stem_buffer(total_samples)
+        plan.mix_into(pattern, 0, stem_rows)
+    return (pattern, stem_rows) if stems else pattern
+
+
+def render_blocks(events, voices, total_samples, loop_starts=None, block_size=BLOCK_SIZE, dtype=None,
+                  stems=False):
+    """Yield the same mix as ``render_events`` in blocks of ``block_size``.
+
+    Voice tails that cross a block boundary are carried into the following
+    blocks, so concatenating the blocks gives exactly ``render_events``.
+    Only one block and one loop are ever held in memory, however long the
+    beat is. With ``stems`` every block is a ``(mix, stems)`` pair.
+    """
+    with timed('pattern_mix'):
+        plan = _MixPlan(events, voices, total_samples, loop_starts, dtype, stems)
+    for block_start in range(0, total_samples, block_size):
+        # Timed per block so the consumer's work between blocks isn't counted
+        with timed('pattern_mix'):
+            frames = min(block_size, total_samples - block_start)
+            block = np.zeros(frames, dtype=plan.dtype)
+            stem_block = plan.stem_buffer(frames)
+            plan.mix_into(block, block_start, stem_block)
+        yield (block, stem_block) if stems else block
+
+
+class _MixPlan:
+    """Pre-scaled voices, rendered loop and leftover hits for one mix.
+
+    With ``stems`` the loop is also rendered with one row per voice, kept
+    as the stretches of each row where the voice sounds, and every hit
+    lands in the mix and in its voice's row.
+    """
+
+    def __init__(self, events, voices, total_samples, loop_starts=None, dtype=None, stems=False):
+        if dtype is None:
+            dtype = np.result_type(*voices) if len(voices) else DEFAULT_DTYPE
+        self.dtype = np.dtype(dtype)
+        self.stems = stems
+        self.voice_count = len(voices)
+        voices = [np.asarray(voice, dtype=self.dtype) for voice in voices]
+        lengths = np.array([len(voice) for voice in voices], dtype=np.int64)
+        self.stem_spans = []
+
+        if loop_starts is None:
+            self.loop = np.zeros(0, dtype=self.dtype)
+            self.loop_starts = self.overlaps = np.zeros(0, dtype=np.int64)
+            self.head_hits = []
+            hits = events
+        else:
+            loop_starts = np.asarray(loop_starts, dtype=np.int64)
+            loop_length = _loop_length(events, voices)
+            self.loop = np.zeros(loop_length, dtype=self.dtype)
+            _mix_hits(self.loop, events, voices)
+            if stems:
+                stem_loop = np.zeros((len(voices), loop_length), dtype=self.dtype)
+                _mix_hits(stem_loop, events, voices)
+                self.stem_spans = _sounding_spans(stem_loop, events, lengths)
+
+            # Loops running off the end are mixed hit by hit so overrunning hits are dropped
+            fits = loop_starts + loop_length < total_samples
+            self.loop_starts = loop_starts[fits]
+            hits = tile_events(events, loop_starts[~fits])
+
+            # How far each loop overlaps the tail of the one before it. Those
+            # samples already hold a sum, so the loop's hits there are added
+            # one at a time, in the same order a hit-by-hit mix adds them
+            overlaps = self.loop_starts[:-1] + loop_length - self.loop_starts[1:]
+            self.overlaps = np.clip(np.concatenate(([0], overlaps)), 0, loop_length)
+            heads = events[events['onset'] < (self.overlaps.max() if len(self.overlaps) else 0)]
+            self.head_hits = list(zip(heads['onset'].tolist(), heads['voice'].tolist(),
+                                      _scaled_voices(heads, voices)))
+
+        hits = hits[hits['onset'] + lengths[hits['voice']] < total_samples]
+        self.hit_onsets = hits['onset']
+        self.hit_ends = hits['onset'] + lengths[hits['voice']]
+        self.hit_rows = hits['voice'].tolist()
+        self.hit_voices = _scaled_voices(hits, voices)
+
+    def stem_buffer(self, frames):
+        """Zeroed stems for ``frames`` samples, one row per voice, or None without stems"""
+        return np.zeros((self.voice_count, frames), dtype=self.dtype) if self.stems else None
+
+    def mix_into(self, buffer, offset, stems=None):
+        """Add every loop and hit overlapping ``buffer``, which starts at sample ``offset``"""
+        end = offset + len(buffer)
+        loop_length = len(self.loop)
+
+        if loop_length:
+            first = np.searchsorted(self.loop_starts, offset - loop_length, side='right')
+            last = np.searchsorted(self.loop_starts, end, side='left')
+            for start, overlap in zip(self.loop_starts[first:last].tolist(), self.overlaps[first:last].tolist()):
+                if overlap and start < end and start + overlap > offset:
+                    for onset, row, voice in self.head_hits:
+                        if onset < overlap:
+                            self._add_hit(buffer, stems, offset, start + onset, row, voice[:overlap - onset])
+                _add_clipped(buffer, offset, start + overlap, self.loop[overlap:])
+                if stems is not None:
+                    for row, span_start, span in self.stem_spans:
+                        skip = max(overlap - span_start, 0)
+                        _add_clipped(stems[row], offset, start + span_start + skip, span[skip:])
+
+        overlapping = np.nonzero((self.hit_onsets < end) & (self.hit_ends > offset))[0]
+        for i in overlapping.tolist():
+            self._add_hit(buffer, stems, offset, int(self.hit_onsets[i]), self.hit_rows[i], self.hit_voices[i])
+
+    @staticmethod
+    def _add_hit(buffer, stems, offset, start, row, voice):
+        _add_clipped(buffer, offset, start, voice)
+        if stems is not None:
+            _add_clipped(stems[row], offset, start, voice)
+
+
+def _add_clipped(buffer, offset, start, source):
+    """Add the part of ``source`` (placed at ``start``) that overlaps ``buffer``"""
+    src_start = max(offset - start, 0)
+    src_end = min(offset + len(buffer) - start, len(source))
+    if src_end > src_start:
+        dst_start = start + src_start - offset
+        buffer[dst_start:dst_start + src_end - src_start] += source[src_start:src_end]
+
+
+def _sounding_spans(stem_loop, events, lengths, min_gap=SPAN_MIN_GAP):
+    """``(row, start, samples)`` for the stretches of each stem row its hits cover.
+
+    Hits closer than ``min_gap`` samples share a stretch, so a row breaks
+    into a few long stretches rather than one per hit.
+    """
+    spans = []
+    for row, samples in enumerate(stem_loop):
+        hits = events[events['voice'] == row]
+        if len(hits) == 0:
+            continue
+        starts = np.sort(hits['onset'])
+        ends = np.maximum.accumulate(starts + lengths[row])
+        breaks = np.flatnonzero(starts[1:] - ends[:-1] > min_gap)
+        span_starts = starts[np.concatenate(([0], breaks + 1))].tolist()
+        span_ends = ends[np.concatenate((breaks, [len(ends) - 1]))].tolist()
+        spans.extend((row, start, samples[start:end]) for start, end in zip(span_starts, span_ends))
+    return spans
+
+
+def _loop_length(events, voices):
+    if len(events) == 0:
+        return 0
+    lengths = np.array([len(voice) for voice in voices], dtype=np.int64)
+    # One spare sample so every hit passes the strict bounds check in _mix_hits
+    return int((events['onset'] + lengths[events['voice']]).max()) + 1
+
+
+def _scaled_voices(events, voices):
+    """Gain-scaled voice for every event, scaling each (voice, gain) pair once"""
+    keys = list(zip(events['voice'].tolist(), events['gain'].tolist()))
+    scaled = {}
+    for key in set(keys):
+        voice = voices[key[0]]
+        scaled[key] = voice if key[1] == 1.0 else voice * key[1]
+    return [scaled[key] for key in keys]
+
+
+def _mix_hits(pattern, events, voices):
+    """Add every hit that fits into ``pattern``, in event order.
+
+    A 2-D ``pattern`` holds one stem per voice; every hit is added to its
+    voice's row.
+    """
+    if len(events) == 0:
+        return
+
+    lengths = np.array([len(voice) for voice in voices], dtype=np.int64)
+    events = events[events['onset'] + lengths[events['voice']] < pattern.shape[-1]]
+
+    hits = zip(events['onset'].tolist(), events['voice'].tolist(), _scaled_voices(events, voices))
+    if pattern.ndim == 1:
+        for onset, _, voice in hits:
+            pattern[onset:onset + len(voice)] += voice
+    else:
+        for onset, voice_id, voice in hits:
+            pattern[voice_id, onset:onset + len(voice)] += voice
@@ -0,0 +1,93 @@
+"""Float effects chain vs. the pydub round trip it replaced.
+
+Both chains run compression, the 8 kHz low-pass and peak normalization on
+the same rendered beat. Besides timing, the benchmark compares the
+outputs' RMS level and their spectra in third-octave bands to check the
+new chain sounds equivalent. The beat is scaled into range first, since
+the int16 conversion would otherwise hard-clip it before pydub sees it.
+pydub's compressor never releases while the signal is below threshold,
+so it compresses a little harder than the float chain's attack/release
+envelope and the RMS levels differ by a dB or two.
+
+Run from the repository root:
+
+    python -m benchmarks.effects
+"""
+import timeit
+import warnings
+
+import numpy as np
+
+from beat_renderer import float_to_int16
+from enhanced_ai_daw import EnhancedAIDaw
+from voice_cache import VoiceCache
+
+BAR_COUNTS = [1, 4, 16]
+EFFECTS = ['compression', 'eq', 'normalize']
+
+
+def pydub_chain(audio_data, sample_rate, effects):
+    """Reference chain: int16 AudioSegment through pydub's pure-Python effects"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # pydub warns when ffmpeg is missing
+        from pydub import AudioSegment
+        from pydub.effects import normalize, compress_dynamic_range
+
+    audio_segment = AudioSegment(float_to_int16(audio_data, 32767).tobytes(), frame_rate=sample_rate,
+                                 sample_width=2, channels=1)
+    if 'compression' in effects:
+        audio_segment = compress_dynamic_range(audio_segment, threshold=-20, ratio=4)
+    if 'eq' in effects:
+        audio_segment = audio_segment.low_pass_filter(8000)
+    if 'normalize' in effects:
+        audio_segment = normalize(audio_segment)
+    return np.frombuffer(audio_segment.raw_data, dtype=np.int16).astype(np.float32) / 32767
+
+
+def rms_db(audio):
+    return 20 * np.log10(np.sqrt(np.mean(np.square(audio, dtype=np.float64))))
+
+
+def band_levels_db(audio, sample_rate):
+    """Energy in third-octave bands from 31.5 Hz up, in dB"""
+    power = np.abs(np.fft.rfft(audio)) ** 2
+    freqs = np.fft.rfftfreq(len(audio), 1 / sample_rate)
+    centers = 31.5 * 2 ** (np.arange(28) / 3)
+    levels = []
+    for center in centers[centers * 2 ** (1 / 6) < sample_rate / 2]:
+        band = (freqs >= center * 2 ** (-1 / 6)) & (freqs < center * 2 ** (1 / 6))
+        levels.append(10 * np.log10(power[band].sum() + 1e-20))
+    return np.array(levels)
+
+
+def best_of(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    daw = EnhancedAIDaw(voice_cache=VoiceCache(), seed=0)
+    params = daw.processor.parse_prompt("boom bap beat with punchy kicks at 90 BPM")
+    print(f"{'bars':>5} {'seconds':>8} {'pydub':>10} {'float':>10} {'speedup':>8} "
+          f"{'rms diff':>9} {'max band diff':>14}")
+
+    for bars in BAR_COUNTS:
+        beat = daw.generate_enhanced_pattern(dict(params, bars=bars))
+        beat *= np.float32(0.9 / np.abs(beat).max())
+        repeat = 3 if bars < 16 else 1
+
+        reference = pydub_chain(beat, daw.sample_rate, EFFECTS)
+        processed = daw.add_audio_effects(beat, EFFECTS)
+        rms_diff = abs(rms_db(reference) - rms_db(processed))
+        # Bands that carry the beat; the very top and bottom are mostly rounding noise
+        reference_bands = band_levels_db(reference, daw.sample_rate)
+        bands = reference_bands > reference_bands.max() - 40
+        band_diff = np.abs(reference_bands - band_levels_db(processed, daw.sample_rate))[bands].max()
+
+        pydub_time = best_of(lambda: pydub_chain(beat, daw.sample_rate, EFFECTS), repeat)
+        float_time = best_of(lambda: daw.add_audio_effects(beat, EFFECTS), repeat)
+        print(f"{bars:>5} {len(beat) / daw.sample_rate:>7.1f}s {pydub_time * 1000:>8.1f}ms "
+              f"{float_time * 1000:>8.1f}ms {pydub_time / float_time:>7.1f}x {rms_diff:>7.2f}dB {band_diff:>12.2f}dB")
+
+
+if __name__ == "__main__":
+    main()
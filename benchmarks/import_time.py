@@ -0,0 +1,108 @@
+"""Cold-start cost of every entry point, measured with ``python -X importtime``.
+
+Each module is imported in a fresh interpreter so nothing is cached. The
+report lists the cumulative import time, the slowest imports it pulled
+in, and any heavy dependency that should have been deferred to first use.
+``test_cold_start.py`` runs the same measurements against the budgets
+below.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import budget per entry point, in milliseconds
+IMPORT_BUDGETS_MS = {
+    'web_daw': 600,
+    'ai_daw_interface': 500,
+    'ai_beat_generator': 500,
+    'batch_render': 200,
+    'enhanced_ai_daw': 500,
+    'advanced_beats': 500,
+    'ai_daw': 500,
+}
+
+# Time from a fresh interpreter to the web app answering / and /status
+WEB_FIRST_RESPONSE_BUDGET_MS = 800
+
+# Dependencies that take seconds to load and must only be imported on first use
+HEAVY_MODULES = ('torch', 'audiocraft', 'transformers', 'librosa', 'matplotlib', 'scipy.signal', 'pretty_midi')
+
+# Writes its timing to the file named by argv[1]: the generator starts
+# loading in the background, and its prints and tracebacks share stdout
+# and stderr with the probe
+WEB_PROBE = """
+import sys, time
+start = time.perf_counter()
+import web_daw
+client = web_daw.app.test_client()
+for path in ('/', '/status'):
+    assert client.get(path).status_code == 200, path
+elapsed = time.perf_counter() - start
+with open(sys.argv[1], 'w') as timing:
+    timing.write(repr(elapsed))
+"""
+
+
+def import_profile(module):
+    """{imported module: (self ms, cumulative ms)} for importing ``module`` in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header row
+        name = fields[2].strip()
+        profile[name] = (int(fields[0]) / 1000, int(fields[1]) / 1000)
+    return profile
+
+
+def import_time_ms(module, repeat=3):
+    """Best cumulative import time of ``module`` over ``repeat`` cold starts"""
+    return min(import_profile(module)[module][1] for _ in range(repeat))
+
+
+def heavy_imports(profile):
+    return sorted(name for name in profile if name.split('.')[0] in HEAVY_MODULES or name in HEAVY_MODULES)
+
+
+def web_first_response_ms(repeat=3):
+    """Best time from interpreter start-up to the web app serving / and /status"""
+    timings = []
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, 'first_response')
+        for _ in range(repeat):
+            subprocess.run([sys.executable, '-c', WEB_PROBE, path], cwd=ROOT, capture_output=True, check=True)
+            with open(path) as timing:
+                timings.append(float(timing.read()) * 1000)
+    return min(timings)
+
+
+def main():
+    print(f"{'entry point':<20} {'import':>10} {'budget':>8}  slowest imports")
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        profile = import_profile(module)
+        total = import_time_ms(module)
+        slowest = sorted(((own, name) for name, (own, _) in profile.items()), reverse=True)[:3]
+        print(f"{module:<20} {total:>8.0f}ms {budget:>6}ms  "
+              + ", ".join(f"{name} {own:.0f}ms" for own, name in slowest))
+
+        heavy = heavy_imports(profile)
+        if heavy:
+            print(f"{'':<20} ⚠️  heavy imports: {', '.join(heavy)}")
+
+    print(f"\nweb first response: {web_first_response_ms():.0f}ms (budget {WEB_FIRST_RESPONSE_BUDGET_MS}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""MusicGen real-time factor on CPU for each performance mode.
+
+Modes:
+- eager: plain autograd-tracking generation, as before the CPU fast path
+- inference_mode: generation under ``torch.inference_mode``
+- int8: inference mode plus dynamic int8 Linear layers in the language model
+
+The real-time factor is generation time over seconds of audio produced;
+below 1.0 is faster than real time. By default the model is a tiny,
+randomly initialized MusicGen, so nothing is downloaded and the numbers
+show relative overheads only. Pass ``--model facebook/musicgen-small`` for
+real ones.
+
+Run from the repository root:
+
+    python -m benchmarks.musicgen_cpu
+    python -m benchmarks.musicgen_cpu --model facebook/musicgen-small --duration 5 --threads 8
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'eager': {'inference_mode': False},
+    'inference_mode': {},
+    'int8': {'quantize': True},
+}
+
+PROMPTS = ["dark drill beat with heavy 808s", "melodic hip hop with soft piano"]
+
+
+def tiny_musicgen(sample_rate=32000, dim=64, num_layers=2, seed=0):
+    """Randomly initialized MusicGen small enough for tests: no download, fast on any CPU"""
+    import torch
+    from audiocraft.models import MusicGen
+    from audiocraft.models.builders import get_debug_compression_model
+    from audiocraft.models.lm import LMModel
+    from audiocraft.modules.codebooks_patterns import DelayedPatternProvider
+    from audiocraft.modules.conditioners import ConditionFuser, ConditioningProvider, LUTConditioner
+
+    torch.manual_seed(seed)
+    compression_model = get_debug_compression_model('cpu', sample_rate)
+    n_q, card = compression_model.num_codebooks, compression_model.cardinality
+    # The 'noop' tokenizer hashes words, so unlike the spaCy one it needs no language model
+    conditioner = LUTConditioner(n_bins=128, dim=dim, output_dim=dim, tokenizer='noop')
+    fuser = ConditionFuser({'cross': ['description'], 'prepend': [], 'sum': [], 'input_interpolate': []})
+    lm = LMModel(DelayedPatternProvider(n_q=n_q), ConditioningProvider({'description': conditioner}), fuser,
+                 n_q=n_q, card=card, dim=dim, num_heads=4, num_layers=num_layers,
+                 custom=True, causal=True, cross_attention=True)
+    return MusicGen('tiny', compression_model, lm.eval(), max_duration=30)
+
+
+def load_generator(model_name, **mode):
+    from full_song_generator import FullSongGenerator
+
+    if model_name == 'tiny':
+        return FullSongGenerator(max_batch_size=1, model_name='tiny', model=tiny_musicgen(), **mode)
+    return FullSongGenerator(max_batch_size=1, model_name=model_name, **mode)
+
+
+def measure_mode(model_name, mode, duration, runs):
+    """Best and mean real-time factor over ``runs`` generations, after one warm-up"""
+    generator = load_generator(model_name, **mode)
+    settings = (duration, 250, 0.0, 1.0, 3.0)
+    generator._generate_batch(settings, PROMPTS, seed=0)
+
+    factors = []
+    for run in range(runs):
+        generator._generate_batch(settings, PROMPTS, seed=run)
+        factors.append(generator.last_realtime_factor)
+    generator.batcher.close()
+    return min(factors), sum(factors) / len(factors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--model', default='tiny', help="'tiny' (default) or a MusicGen name from the hub")
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds of audio per run (default 2)')
+    parser.add_argument('--runs', type=int, default=3, help='timed runs per mode (default 3)')
+    parser.add_argument('--threads', type=int, help='intra-op threads (default: torch decides)')
+    parser.add_argument('--interop-threads', type=int, help='inter-op threads (default: torch decides)')
+    parser.add_argument('--modes', default=','.join(MODES), help=f"comma-separated, out of {', '.join(MODES)}")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from full_song_generator import configure_cpu_threads
+
+    import torch
+    configure_cpu_threads(args.threads, args.interop_threads)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(open(os.devnull, 'w')):
+        # The generator writes its output and cache directories under the working directory
+        os.chdir(workdir)
+        for name in args.modes.split(','):
+            results[name] = measure_mode(args.model, MODES[name], args.duration, args.runs)
+        os.chdir(ROOT)
+
+    print(f"🎛️ {args.model}, {len(PROMPTS)} prompts x {args.duration}s, "
+          f"{torch.get_num_threads()} intra-op / {torch.get_num_interop_threads()} inter-op threads")
+    print(f"{'mode':<16} {'best RTF':>9} {'mean RTF':>9} {'vs eager':>9}")
+    baseline = results.get('eager', (None,))[0]
+    for name, (best, mean) in results.items():
+        speedup = f"{baseline / best:>8.2f}x" if baseline else f"{'':>9}"
+        print(f"{name:<16} {best:>9.3f} {mean:>9.3f} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
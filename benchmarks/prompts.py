@@ -0,0 +1,105 @@
+"""Prompt parsing throughput: compiled matcher vs. the substring scans it replaced.
+
+Every prompt is also parsed by the reference parser under the same random
+seed, and the results must be identical.
+
+Run from the repository root:
+
+    python -m benchmarks.prompts
+"""
+import itertools
+import random
+import re
+import time
+
+from prompt_processor import DEFAULT_PARAMS, PromptProcessor
+
+PROMPT_COUNT = 20000
+
+GENRES = ['trap', 'drill', 'boom bap', 'lo-fi', 'jazz']
+MOODS = ['dark', 'bright', 'aggressive', 'soft', 'heavy', 'melodic', 'chill', '']
+EXTRAS = ['with heavy 808s', 'with rapid hi-hats', 'with punchy kicks', 'fast tempo', 'slow and upbeat',
+          'heavy bass', '']
+LENGTHS = ['at 140 BPM', '8 bars', 'at 92bpm, 16 bars', '']
+
+
+def reference_parse(processor, prompt):
+    """The original parser: one substring scan per keyword, two regex searches"""
+    prompt_lower = prompt.lower()
+    params = dict(DEFAULT_PARAMS)
+
+    for genre, characteristics in processor.genre_patterns.items():
+        if genre in prompt_lower:
+            params['genre'] = genre
+            params['bpm'] = random.randint(*characteristics['bpm_range'])
+            params['kick_pattern'] = characteristics['kick_pattern']
+            params['hihat_style'] = characteristics['hihat_style']
+            params['mood'] = characteristics['mood']
+            break
+
+    bpm_match = re.search(r'(\d+)\s*bpm', prompt_lower)
+    if bpm_match:
+        params['bpm'] = int(bpm_match.group(1))
+    else:
+        for tempo_word, (min_bpm, max_bpm) in processor.tempo_keywords.items():
+            if tempo_word in prompt_lower:
+                params['bpm'] = random.randint(min_bpm, max_bpm)
+                break
+
+    for mood, characteristics in processor.mood_keywords.items():
+        if mood in prompt_lower:
+            params['mood'] = mood
+            params.update(characteristics)
+
+    if 'heavy 808' in prompt_lower or 'heavy bass' in prompt_lower:
+        params['bass_boost'] = 1.8
+    if 'fast hi-hat' in prompt_lower or 'rapid hi-hat' in prompt_lower:
+        params['hihat_style'] = 'rapid'
+    if 'punchy kick' in prompt_lower:
+        params['kick_pattern'] = 'punchy'
+
+    bars_match = re.search(r'(\d+)\s*bar', prompt_lower)
+    if bars_match:
+        params['bars'] = int(bars_match.group(1))
+    return params
+
+
+def prompt_corpus():
+    """Every combination of the keyword lists, as a user might type them"""
+    prompts = []
+    for mood, genre, extra, length in itertools.product(MOODS, GENRES, EXTRAS, LENGTHS):
+        words = ' '.join(part for part in (mood, genre, 'beat', extra) if part)
+        prompts.append(f"{words}, {length}".strip(', ').capitalize())
+    return prompts
+
+
+def prompts_per_second(parse, prompts):
+    start = time.perf_counter()
+    parse(prompts)
+    return len(prompts) / (time.perf_counter() - start)
+
+
+def main():
+    processor = PromptProcessor()
+    corpus = prompt_corpus()
+    rng = random.Random(0)
+    unique = [rng.choice(corpus) + f" #{i}" for i in range(PROMPT_COUNT)]
+    repeated = [rng.choice(corpus) for _ in range(PROMPT_COUNT)]
+
+    for prompt in corpus + unique[:2000]:
+        random.seed(prompt)
+        expected = reference_parse(processor, prompt)
+        random.seed(prompt)
+        assert processor.parse_prompt(prompt).to_dict() == expected, f"parsers disagree on {prompt!r}"
+    print(f"✅ {len(corpus) + 2000} prompts parse identically")
+
+    print(f"{'workload':<22} {'reference':>14} {'compiled':>14} {'speedup':>8}")
+    for name, prompts in (('unique prompts', unique), ('repeated prompts', repeated)):
+        fresh = PromptProcessor()
+        reference = prompts_per_second(lambda batch: [reference_parse(processor, p) for p in batch], prompts)
+        compiled = prompts_per_second(fresh.parse_many, prompts)
+        print(f"{name:<22} {reference:>10.0f}/s {compiled:>10.0f}/s {compiled / reference:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
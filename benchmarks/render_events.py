@@ -0,0 +1,73 @@
+"""Event-list renderer vs. the per-hit slice loop it replaced.
+
+The benchmark also checks that both renderers produce the same samples.
+
+Run from the repository root:
+
+    python -m benchmarks.render_events
+"""
+import timeit
+
+import numpy as np
+
+from ai_beat_generator import SmartDrumMachine
+from beat_renderer import bar_starts, hits_to_events, render_events, tile_events
+
+BAR_COUNTS = [4, 64, 1024]
+
+
+def slice_loop_render(events, voices, total_samples):
+    """Reference renderer: one bounds check and slice add per hit"""
+    pattern = np.zeros(total_samples)
+    for onset, voice_id, gain in events.tolist():
+        voice = voices[voice_id]
+        if onset + len(voice) < total_samples:
+            pattern[onset:onset + len(voice)] += voice if gain == 1.0 else voice * gain
+    return pattern
+
+
+def trap_events(machine, bars, bpm=140):
+    """Trap pattern with 16th-note hi-hats, the densest genre we render"""
+    params = machine.processor.parse_prompt(f"trap beat with rapid hi-hats at {bpm} BPM, {bars} bars")
+    beat_samples = int(60.0 / bpm * machine.sample_rate)
+    voices = [
+        machine.get_voice('kick', params['kick_pattern'], 0.3, bass_boost=params['bass_boost']),
+        machine.get_voice('snare', params['mood'], 0.2, distortion=params['distortion']),
+        machine.get_voice('hihat', params['hihat_style'], 0.1)
+    ]
+    hits = [(0, 0, 1.0), (0, int(beat_samples * 1.5), 0.8), (0, beat_samples * 3, 1.0),
+            (1, beat_samples, 1.0), (1, beat_samples * 3, 1.0)]
+    hits += [(2, int(sixteenth * beat_samples / 4), 0.4) for sixteenth in range(16)]
+
+    total_samples = int(machine.sample_rate * (60.0 / bpm * 4) * bars)
+    return hits_to_events(hits), bar_starts(bpm, bars, machine.sample_rate), voices, total_samples
+
+
+def best_of(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    # The reference loop mixes in float64, so render float64 voices for an exact comparison
+    machine = SmartDrumMachine(dtype=np.float64)
+    print(f"{'bars':>6} {'events':>8} {'slice loop':>12} {'event mix':>12} {'speedup':>8} {'max diff':>10}")
+
+    for bars in BAR_COUNTS:
+        bar_events, starts, voices, total_samples = trap_events(machine, bars)
+        events = tile_events(bar_events, starts)
+        repeat = 20 if bars < 1024 else 3
+
+        reference = slice_loop_render(events, voices, total_samples)
+        mixed = render_events(bar_events, voices, total_samples, loop_starts=starts)
+        max_diff = np.abs(reference - mixed).max()
+        assert np.array_equal(reference, mixed), "event renderer diverged from the slice loop"
+        assert np.array_equal((reference * 16383).astype(np.int16), (mixed * 16383).astype(np.int16))
+
+        loop_time = best_of(lambda: slice_loop_render(events, voices, total_samples), repeat)
+        mix_time = best_of(lambda: render_events(bar_events, voices, total_samples, loop_starts=starts), repeat)
+        print(f"{bars:>6} {len(events):>8} {loop_time * 1000:>10.2f}ms {mix_time * 1000:>10.2f}ms "
+              f"{loop_time / mix_time:>7.2f}x {max_diff:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
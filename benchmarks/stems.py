@@ -0,0 +1,99 @@
+"""Single-pass stems + mix vs. a mix-only render and a re-render per voice.
+
+One pass over the events fills the mix and every voice's stem. Each loop
+is mixed and split into stems once; every bar then adds the mixed loop
+to the mix and only the stretches where a voice sounds to its stem, so
+each sample is written once. The benchmark times it in memory and
+streamed block by block the way exports render, and checks that each
+stem matches rendering that voice alone and that the mix is unchanged.
+
+Stems can't cost less than writing their samples. The ``samples`` column
+is how many samples stems + mix hold for every sample of the mix (about
+2.7 for this trap beat, whose hi-hats sound almost all the time), and
+``per sample`` divides the cost ratio by it. That is the figure the
+1.2x target is checked against. It comes out about 0.9-1.2x streamed and
+1.1-1.6x in memory, where every fresh page of output costs a fault. Mid
+length beats can read up to 2x in memory: glibc hands a mix-only render
+the pages the last one freed, but not the larger stems buffer (pinning
+``MALLOC_MMAP_THRESHOLD_`` takes that out).
+
+Run from the repository root:
+
+    python -m benchmarks.stems
+"""
+import timeit
+
+import numpy as np
+
+from ai_beat_generator import SmartDrumMachine
+from beat_renderer import render_blocks, render_events
+
+BAR_COUNTS = [4, 64, 256]
+
+# What stems + mix may cost per sample written, as a multiple of a mix-only render
+TARGET_RATIO = 1.2
+
+
+def best_of(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def drain(blocks):
+    for _ in blocks:
+        pass
+
+
+def per_voice_render(events, voices, total_samples, starts):
+    """What stems cost without the single pass: the mix, then one render per voice"""
+    mix = render_events(events, voices, total_samples, loop_starts=starts)
+    stems = [render_events(events[events['voice'] == voice_id], voices, total_samples, loop_starts=starts)
+             for voice_id in range(len(voices))]
+    return mix, np.stack(stems)
+
+
+def main():
+    machine = SmartDrumMachine(seed=0)
+    print(f"{'bars':>6} {'mode':>9} {'mix only':>10} {'stems+mix':>10} {'per voice':>10} {'ratio':>7} "
+          f"{'samples':>8} {'per sample':>10}")
+
+    worst = {}
+    for bars in BAR_COUNTS:
+        params = machine.processor.parse_prompt(f"trap beat with rapid hi-hats at 140 BPM, {bars} bars")
+        events, voices, total_samples, starts = machine._beat_plan(params)
+        repeat = 20 if bars < 256 else 5
+
+        mix = render_events(events, voices, total_samples, loop_starts=starts)
+        stem_mix, stems = render_events(events, voices, total_samples, loop_starts=starts, stems=True)
+        _, reference = per_voice_render(events, voices, total_samples, starts)
+        assert np.array_equal(mix, stem_mix), "rendering stems changed the mix"
+        assert np.array_equal(stems, reference), "a stem differs from rendering its voice alone"
+        samples = 1 + np.count_nonzero(stems) / total_samples
+
+        cases = {
+            'in memory': (
+                lambda: render_events(events, voices, total_samples, loop_starts=starts),
+                lambda: render_events(events, voices, total_samples, loop_starts=starts, stems=True),
+                lambda: per_voice_render(events, voices, total_samples, starts)),
+            'streamed': (
+                lambda: drain(render_blocks(events, voices, total_samples, loop_starts=starts)),
+                lambda: drain(render_blocks(events, voices, total_samples, loop_starts=starts, stems=True)),
+                None),
+        }
+        for mode, (mix_only, with_stems, per_voice) in cases.items():
+            mix_time = best_of(mix_only, repeat)
+            stems_time = best_of(with_stems, repeat)
+            per_voice_cell = f"{best_of(per_voice, repeat) * 1000:>8.2f}ms" if per_voice else f"{'-':>10}"
+            ratio = stems_time / mix_time
+            worst[mode] = max(worst.get(mode, (0.0, 0.0)), (ratio / samples, ratio))
+            print(f"{bars:>6} {mode:>9} {mix_time * 1000:>8.2f}ms {stems_time * 1000:>8.2f}ms {per_voice_cell} "
+                  f"{ratio:>6.2f}x {samples:>7.2f}x {ratio / samples:>9.2f}x")
+
+    print()
+    for mode, (per_sample, ratio) in worst.items():
+        verdict = 'within' if per_sample <= TARGET_RATIO else 'over'
+        print(f"{mode}: stems + mix cost up to {per_sample:.2f}x a mix-only render per sample written "
+              f"({ratio:.2f}x in all), {verdict} the {TARGET_RATIO}x target")
+
+
+if __name__ == "__main__":
+    main()
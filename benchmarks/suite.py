@@ -0,0 +1,282 @@
+"""Reproducible benchmark suite for synthesis, rendering, effects, parsing and export.
+
+Every case runs with fixed seeds and reports its best wall time over a few
+runs, its throughput and the peak memory it allocated (traced in a
+separate run, so tracing doesn't slow the timed ones). Results are saved
+as JSON so a later run can be compared against them; ``compare`` flags
+any case that got slower or hungrier than the threshold allows and exits
+non-zero, which makes it usable in CI.
+
+Timings are machine-specific, so no baseline is checked in: record one
+on your own machine (``benchmarks/baseline.json`` is git-ignored) before
+making a change, then compare against it. Run from the repository root:
+
+    python -m benchmarks.suite run --output benchmarks/baseline.json
+    python -m benchmarks.suite compare benchmarks/baseline.json    # runs the suite now
+    python -m benchmarks.suite compare benchmarks/baseline.json after.json --threshold 0.3
+
+``--quick`` skips the longest bar counts, ``--only render,parse`` limits
+the stages.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+SEED = 0
+STAGES = ('synthesis', 'render', 'effects', 'parse', 'export')
+GENRES = ['trap', 'drill', 'boom bap', 'lo-fi']
+BAR_COUNTS = [1, 16, 64]
+QUICK_BAR_COUNTS = [1, 16]
+DEFAULT_THRESHOLD = 0.20
+
+# Peaks below this are allocator noise; don't flag them as regressions
+MIN_PEAK_MB = 1.0
+
+
+def _reseed():
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+
+def measure(func, units, unit, repeat=5):
+    """Best wall time of one ``func`` call, its throughput in ``unit`` and peak traced memory.
+
+    Each of the ``repeat`` timings loops ``func`` for at least 0.2 s, like
+    ``timeit``'s autorange, so sub-millisecond cases aren't lost in timer noise.
+    """
+    _reseed()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()  # also warms caches and lazy imports
+
+    timings = []
+    for _ in range(repeat):
+        _reseed()
+        timings.append(timer.timeit(number) / number)
+
+    _reseed()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    seconds = min(timings)
+    return {
+        'seconds': seconds,
+        'throughput': units / seconds if seconds else float('inf'),
+        'unit': unit,
+        'peak_mb': peak / 2 ** 20,
+    }
+
+
+def _machines():
+    from ai_beat_generator import SmartDrumMachine
+    from enhanced_ai_daw import EnhancedAIDaw
+    from voice_cache import VoiceCache
+
+    return (SmartDrumMachine(voice_cache=VoiceCache(), seed=SEED),
+            EnhancedAIDaw(voice_cache=VoiceCache(), seed=SEED))
+
+
+def _params(machine, genre, bars):
+    random.seed(SEED)
+    return machine.processor.parse_prompt(f"{genre} beat, {bars} bars")
+
+
+def synthesis_cases(bar_counts):
+    """Uncached one-shot voice synthesis, per voice and machine"""
+    smart, enhanced = _machines()
+    voices = {
+        'smart/kick': lambda: smart.generate_kick(0.5, 'heavy', bass_boost=1.8),
+        'smart/snare': lambda: smart.generate_snare(0.3, 'dark', distortion=0.8),
+        'smart/hihat': lambda: smart.generate_hihat(0.1, 'rapid'),
+        'enhanced/kick': lambda: enhanced.generate_professional_kick(0.5, 'heavy', bass_boost=1.8),
+        'enhanced/snare': lambda: enhanced.generate_professional_snare(0.3, 'dark'),
+        'enhanced/hihat': lambda: enhanced.generate_professional_hihat(0.1, 'rapid'),
+    }
+    for name, synthesize in voices.items():
+        yield f"synthesis/{name}", lambda synthesize=synthesize: measure(
+            synthesize, len(synthesize()), 'samples/s')
+
+
+def render_cases(bar_counts):
+    """Mixing a whole beat from warm voices, across genres and lengths"""
+    smart, _ = _machines()
+    for genre in GENRES:
+        for bars in bar_counts:
+            params = _params(smart, genre, bars)
+            samples = len(smart.create_parametric_beat(params))
+            yield f"render/{genre}/{bars} bars", lambda params=params, samples=samples: measure(
+                lambda: smart.create_parametric_beat(params), samples, 'samples/s')
+
+
+def effects_cases(bar_counts):
+    """Compression, low-pass and normalization on a rendered beat"""
+    _, enhanced = _machines()
+    for bars in bar_counts:
+        beat = enhanced.generate_enhanced_pattern(_params(enhanced, 'boom bap', bars))
+        yield f"effects/{bars} bars", lambda beat=beat: measure(
+            lambda: enhanced.add_audio_effects(beat, ['compression', 'eq', 'normalize']), len(beat), 'samples/s')
+
+
+def parse_cases(bar_counts):
+    """Prompt parsing throughput on fresh and repeated prompts"""
+    from benchmarks.prompts import prompt_corpus
+    from prompt_processor import PromptProcessor
+
+    corpus = prompt_corpus()
+    rng = random.Random(SEED)
+    workloads = {
+        'unique': [rng.choice(corpus) + f" #{i}" for i in range(5000)],
+        'repeated': [rng.choice(corpus) for _ in range(5000)],
+    }
+    for name, prompts in workloads.items():
+        # A fresh processor per run so the unique workload never hits the cache
+        yield f"parse/{name}", lambda prompts=prompts: measure(
+            lambda: PromptProcessor().parse_many(prompts), len(prompts), 'prompts/s')
+
+
+def export_cases(bar_counts):
+    """Writing the WAV and MIDI files for a beat"""
+    from audio_writer import write_wav
+
+    _, enhanced = _machines()
+    for bars in bar_counts:
+        params = _params(enhanced, 'trap', bars)
+        beat = enhanced.generate_enhanced_pattern(params)
+
+        def export_wav(beat=beat):
+            with tempfile.TemporaryDirectory() as tmp:
+                write_wav(os.path.join(tmp, 'beat.wav'), beat, enhanced.sample_rate)
+
+        def export_midi(params=params):
+            with tempfile.TemporaryDirectory() as tmp:
+                enhanced.export_to_midi(params, os.path.join(tmp, 'beat.mid'))
+
+        yield f"export/wav/{bars} bars", lambda export_wav=export_wav, beat=beat: measure(
+            export_wav, len(beat), 'samples/s')
+        yield f"export/midi/{bars} bars", lambda export_midi=export_midi, bars=bars: measure(
+            export_midi, bars, 'bars/s')
+
+
+CASES = {
+    'synthesis': synthesis_cases,
+    'render': render_cases,
+    'effects': effects_cases,
+    'parse': parse_cases,
+    'export': export_cases,
+}
+
+
+def run_suite(stages=STAGES, quick=False, log=print):
+    """Run the suite and return the JSON-ready report"""
+    bar_counts = QUICK_BAR_COUNTS if quick else BAR_COUNTS
+    results = {}
+    for stage in stages:
+        for name, run_case in CASES[stage](bar_counts):
+            results[name] = run_case()
+            if log:
+                log(format_result(name, results[name]))
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'seed': SEED,
+        'quick': quick,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        'results': results,
+    }
+
+
+def format_result(name, result):
+    return (f"{name:<28} {result['seconds'] * 1000:>10.3f}ms {result['throughput']:>14,.0f} "
+            f"{result['unit']:<10} {result['peak_mb']:>8.2f}MB")
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Rows of (name, time ratio, memory ratio, regressed) for cases in both reports"""
+    rows = []
+    for name, before in baseline['results'].items():
+        after = current['results'].get(name)
+        if after is None:
+            continue
+        time_ratio = after['seconds'] / before['seconds']
+        memory_ratio = after['peak_mb'] / before['peak_mb'] if before['peak_mb'] else 1.0
+        regressed = time_ratio > 1 + threshold or (
+            memory_ratio > 1 + threshold and after['peak_mb'] >= MIN_PEAK_MB)
+        rows.append((name, time_ratio, memory_ratio, regressed))
+    return rows
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the suite and optionally save the results')
+    run_parser.add_argument('--output', '-o', help='write the results to this JSON file')
+
+    compare_parser = commands.add_parser('compare', help='compare results against a baseline')
+    compare_parser.add_argument('baseline', help='baseline JSON file')
+    compare_parser.add_argument('current', nargs='?', help='results to check (default: run the suite now)')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help=f'allowed slowdown or memory growth, as a fraction (default {DEFAULT_THRESHOLD})')
+    compare_parser.add_argument('--output', '-o', help='also save the fresh results to this JSON file')
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument('--quick', action='store_true', help=f'only {QUICK_BAR_COUNTS} bars')
+        sub.add_argument('--only', help=f"comma-separated stages out of {', '.join(STAGES)}")
+
+    args = parser.parse_args(argv)
+    stages = args.only.split(',') if args.only else STAGES
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    if args.command == 'run' or args.current is None:
+        print(f"{'case':<28} {'best time':>12} {'throughput':>14} {'':<10} {'peak':>10}")
+        current = run_suite(stages, quick=args.quick)
+        if args.output:
+            save_report(current, args.output)
+            print(f"\n💾 Saved results to {args.output}")
+        if args.command == 'run':
+            return 0
+    else:
+        current = load_report(args.current)
+
+    rows = compare(load_report(args.baseline), current, args.threshold)
+    print(f"\n{'case':<28} {'time':>8} {'memory':>8}")
+    for name, time_ratio, memory_ratio, regressed in rows:
+        print(f"{name:<28} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x{'  ❌ regression' if regressed else ''}")
+
+    regressions = sum(regressed for *_, regressed in rows)
+    if regressions:
+        print(f"\n❌ {regressions} of {len(rows)} cases regressed by more than {args.threshold:.0%}")
+        return 1
+    print(f"\n✅ No regressions beyond {args.threshold:.0%} in {len(rows)} cases")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
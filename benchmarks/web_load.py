@@ -0,0 +1,148 @@
+"""Web-tier throughput and tail latency, with the fake generation backend.
+
+Starts the web app on a local port with ``GENERATION_BACKEND=fake``, so no
+model weights, GPU or network are needed, and drives it with concurrent
+clients. Each client submits a song, polls its job until it finishes and
+downloads the file. The report gives songs per second, submit and
+end-to-end latency percentiles, rejected (429) submissions and the time
+the server spent in each pipeline stage. Everything is written to a
+temporary directory that is removed afterwards.
+
+Run from the repository root:
+
+    python -m benchmarks.web_load
+    python -m benchmarks.web_load --requests 400 --concurrency 32 --latency 1.0 --workers 8
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL = 0.02
+
+
+def request_json(url, payload=None):
+    """(status, JSON body) for a GET, or a POST when ``payload`` is given"""
+    data = None if payload is None else json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+
+def run_client(base_url, prompt, duration, seed):
+    """Submit one song, wait for it and download it; returns timings in seconds"""
+    start = time.perf_counter()
+    rejected = 0
+    while True:
+        status, body = request_json(f"{base_url}/generate",
+                                    {'prompt': prompt, 'duration': duration, 'style': 'custom', 'seed': seed})
+        if status != 429:
+            break
+        rejected += 1
+        time.sleep(POLL_INTERVAL * 5)
+    submitted = time.perf_counter()
+    if status != 202:
+        return {'ok': False, 'rejected': rejected, 'error': body.get('error')}
+
+    job_url = f"{base_url}/jobs/{body['job_id']}"
+    while True:
+        _, job = request_json(job_url)
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(POLL_INTERVAL)
+    if job['status'] == 'failed':
+        return {'ok': False, 'rejected': rejected, 'error': job['error']}
+
+    with urllib.request.urlopen(f"{base_url}/download/{job['result']['basename']}") as response:
+        size = len(response.read())
+    return {'ok': True, 'rejected': rejected, 'submit': submitted - start,
+            'total': time.perf_counter() - start, 'bytes': size}
+
+
+def percentiles(values):
+    return np.percentile(values, [50, 95, 99]) * 1000 if values else [float('nan')] * 3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=100, help='songs to generate (default 100)')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients (default 16)')
+    parser.add_argument('--duration', type=int, default=5, help='seconds of audio per song (default 5)')
+    parser.add_argument('--latency', type=float, default=0.25,
+                        help='simulated model seconds per song (default 0.25)')
+    parser.add_argument('--workers', type=int, default=4, help='generation workers (default 4)')
+    parser.add_argument('--max-pending', type=int, default=16, help='queued jobs before 429s (default 16)')
+    parser.add_argument('--seeded', action='store_true',
+                        help='repeat ten seeded prompts so most songs come from the generation cache')
+    parser.add_argument('--verbose', action='store_true', help="show the server's request log and output")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, 'w')):
+        # The app reads its settings at import and writes songs relative to the working directory
+        os.environ.update(GENERATION_BACKEND='fake', FAKE_GENERATION_LATENCY=str(args.latency),
+                          GENERATION_WORKERS=str(args.workers), GENERATION_MAX_PENDING=str(args.max_pending))
+        os.chdir(workdir)
+        sys.path.insert(0, ROOT)
+        from werkzeug.serving import make_server
+        import metrics
+        import web_daw
+        from benchmarks.prompts import prompt_corpus
+
+        server = make_server('127.0.0.1', 0, web_daw.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        web_daw.start_generator()
+        while not request_json(f"{base_url}/status")[1]['ready']:
+            time.sleep(POLL_INTERVAL)
+
+        corpus = prompt_corpus()
+        if args.seeded:
+            jobs = [(corpus[i % 10], i % 10) for i in range(args.requests)]
+        else:
+            jobs = [(corpus[i % len(corpus)], None) for i in range(args.requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda job: run_client(base_url, job[0], args.duration, job[1]), jobs))
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        os.chdir(ROOT)
+
+    done = [result for result in results if result['ok']]
+    print(f"🌐 {args.requests} songs, {args.concurrency} clients, {args.workers} workers, "
+          f"{args.latency:.2f}s simulated model time, {args.duration}s of audio each")
+    print(f"   throughput: {len(done) / elapsed:.1f} songs/s ({elapsed:.1f}s total, "
+          f"{len(results) - len(done)} failed, {sum(result['rejected'] for result in results)} submissions got 429)")
+    print(f"{'latency':<12} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name in ('submit', 'total'):
+        p50, p95, p99 = percentiles([result[name] for result in done])
+        print(f"{name:<12} {p50:>7.1f}ms {p95:>7.1f}ms {p99:>7.1f}ms")
+
+    print(f"\n{'server stage':<20} {'calls':>7} {'total':>10} {'mean':>10}")
+    for stage in ('prompt_parse', 'voice_synthesis', 'pattern_mix', 'file_write'):
+        count = metrics.STAGE_SECONDS.count(stage)
+        if count:
+            total = metrics.STAGE_SECONDS.sum(stage)
+            print(f"{stage:<20} {count:>7} {total * 1000:>8.1f}ms {total / count * 1000:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
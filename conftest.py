@@ -0,0 +1,12 @@
+import pytest
+
+from song_index import SongIndex
+
+
+@pytest.fixture(autouse=True)
+def web_app_without_model(tmp_path_factory, monkeypatch):
+    """Keep web tests from loading MusicGen or indexing the real generated_songs"""
+    import web_daw
+
+    monkeypatch.setitem(web_daw.app.config, 'AUTOLOAD_MODEL', False)
+    monkeypatch.setattr(web_daw, '_song_index', SongIndex(str(tmp_path_factory.mktemp('song_index'))))
@@ -0,0 +1,122 @@
+"""Declarative drum patterns shared by every renderer and the MIDI export.
+
+Each genre is a step grid of voices x 16th-note steps for one bar of 4/4.
+A cell holds the hit's gain (0 means no hit). Renderers compile a grid into
+onset arrays once per (genre, hi-hat style, tempo) and reuse the result, so
+adding a genre only means adding an entry to ``GENRE_PATTERNS``.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from beat_renderer import make_events
+
+VOICES = ('kick', 'snare', 'hihat')
+KICK, SNARE, HIHAT = range(len(VOICES))
+
+# General MIDI drum notes for each voice
+GM_DRUM_NOTES = (36, 38, 42)
+
+STEPS_PER_BAR = 16
+STEPS_PER_BEAT = 4
+
+DEFAULT_GENRE = 'trap'
+
+
+def _row(hits, gain):
+    """Grid row with ``gain`` on every step in ``hits``"""
+    row = np.zeros(STEPS_PER_BAR)
+    row[list(hits)] = gain
+    return row
+
+
+GENRE_PATTERNS = {
+    'trap': {
+        'grid': np.array([
+            [1.0, 0, 0, 0, 0, 0, 0.8, 0, 0, 0, 0, 0, 1.0, 0, 0, 0],  # kick on 1, 2.5 and 4
+            _row([4, 12], 1.0),                                      # snare on 2 and 4
+            _row(range(0, 16, 2), 0.3),                              # 8th-note hi-hats
+        ]),
+        # Rapid trap hi-hats roll on every 16th note
+        'hihat_variants': {'rapid': _row(range(16), 0.4)},
+        'durations': (0.3, 0.2, 0.1),
+    },
+    'boom bap': {
+        'grid': np.array([
+            _row([0, 8], 1.0),                                       # kick on 1 and 3
+            _row([4, 12], 1.0),                                      # snare on 2 and 4 (the "bap")
+            _row([0, 4, 8, 12], 0.2),                                # quarter-note hi-hats
+        ]),
+        'durations': (0.4, 0.3, 0.2),
+    },
+    'drill': {
+        'grid': np.array([
+            [1.0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0.9, 0, 0, 0, 0],   # sparse kicks, second one off-beat
+            _row([4, 12], 1.0),                                      # snare on 2 and 4
+            _row([0, 6, 12], 0.3),                                   # every 3rd 8th-note hi-hat
+        ]),
+        'durations': (0.4, 0.25, 0.08),
+    },
+    'lo-fi': {
+        'grid': np.array([
+            [1.0, 0, 0, 0, 0, 0, 0, 0, 0.8, 0, 0, 0, 0, 0, 0, 0],   # laid back kicks on 1 and 3
+            _row([4, 12], 1.0),                                      # snare on 2 and 4
+            _row([0, 4, 8, 12], 0.25),                               # subtle vinyl hi-hats
+        ]),
+        'durations': (0.5, 0.4, 0.15),
+    },
+}
+
+
+def resolve_genre(genre):
+    """Fall back to the default genre for anything we have no pattern for"""
+    return genre if genre in GENRE_PATTERNS else DEFAULT_GENRE
+
+
+@lru_cache(maxsize=None)
+def step_grid(genre, hihat_style=None):
+    """Read-only voices x steps gain grid for a genre and hi-hat style"""
+    pattern = GENRE_PATTERNS[resolve_genre(genre)]
+    grid = pattern['grid'].copy()
+
+    variant = pattern.get('hihat_variants', {}).get(hihat_style)
+    if variant is not None:
+        grid[HIHAT] = variant
+
+    grid.setflags(write=False)
+    return grid
+
+
+def voice_durations(genre):
+    """One-shot length in seconds for each voice of a genre"""
+    return GENRE_PATTERNS[resolve_genre(genre)]['durations']
+
+
+@lru_cache(maxsize=256)
+def bar_events(genre, hihat_style, bpm, sample_rate):
+    """One bar of events (onsets relative to the bar start) for a genre.
+
+    Events are voice-major and in step order, matching the order the old
+    per-genre loops mixed their hits in.
+    """
+    grid = step_grid(genre, hihat_style)
+    voice_ids, steps = np.nonzero(grid)
+    beat_samples = int(60.0 / bpm * sample_rate)
+    onsets = (steps * beat_samples / STEPS_PER_BEAT).astype(np.int64)
+
+    events = make_events(onsets, voice_ids, grid[voice_ids, steps])
+    events.setflags(write=False)
+    return events
+
+
+@lru_cache(maxsize=256)
+def bar_notes(genre, hihat_style, bpm):
+    """One bar of (start seconds, voice id, velocity) arrays for MIDI export"""
+    grid = step_grid(genre, hihat_style)
+    voice_ids, steps = np.nonzero(grid)
+    starts = steps * (60.0 / bpm / STEPS_PER_BEAT)
+    velocities = np.clip(np.round(grid[voice_ids, steps] * 127), 1, 127).astype(np.int64)
+
+    for array in (starts, voice_ids, velocities):
+        array.setflags(write=False)
+    return starts, voice_ids, velocities
@@ -1,22 +1,31 @@
 import numpy as np
-import librosa
-import soundfile as sf
-import pretty_midi
-from pydub import AudioSegment
-from pydub.effects import normalize, compress_dynamic_range
 import tempfile
 import os
 from datetime import datetime
+from audio_effects import compress, lowpass, normalize, preemphasis
+from audio_writer import output_path, write_audio, write_stems
+from beat_renderer import DEFAULT_DTYPE, bar_starts, render_events
+from drum_patterns import GM_DRUM_NOTES, VOICES, bar_events, bar_notes
+from metrics import timed_calls
+from midi_renderer import render_midi
+from noise_bank import NoiseBank, get_default_noise_bank
 from prompt_processor import PromptProcessor
+from voice_cache import VoiceCache, get_default_cache
+
+# Note length in seconds for kick, snare and hi-hat in MIDI exports
+MIDI_NOTE_LENGTHS = (0.1, 0.1, 0.05)
 
 class EnhancedAIDaw:
-    def __init__(self, sample_rate=44100):
+    def __init__(self, sample_rate=44100, voice_cache=None, seed=None, dtype=DEFAULT_DTYPE):
         self.sample_rate = sample_rate
+        self.dtype = np.dtype(dtype)
         self.processor = PromptProcessor()
+        self.voice_cache = voice_cache if voice_cache is not None else get_default_cache()
+        self.noise = NoiseBank(seed) if seed is not None else get_default_noise_bank()
         
     def generate_professional_kick(self, duration=0.5, kick_type='heavy', bass_boost=1.0):
-        """Generate professional quality kick using librosa"""
-        t = np.linspace(0, duration, int(self.sample_rate * duration))
+        """Generate professional quality kick"""
+        t = np.linspace(0, duration, int(self.sample_rate * duration), dtype=self.dtype)
         
         if kick_type == 'heavy':
             # 808-style kick with sub frequencies
@@ -39,13 +48,13 @@ class EnhancedAIDaw:
     
     def generate_professional_snare(self, duration=0.3, mood='neutral'):
         """Generate professional snare with realistic character"""
-        t = np.linspace(0, duration, int(self.sample_rate * duration))
+        t = np.linspace(0, duration, int(self.sample_rate * duration), dtype=self.dtype)
         
         # Create realistic snare components
         # 1. Noise component (snare buzz)
-        noise = np.random.normal(0, 0.15, len(t))
+        noise = self.noise.normal(len(t), 0.15, key=('professional_snare', mood, len(t)), dtype=self.dtype)
         # Filter the noise to snare frequencies (200-400Hz emphasis)
-        noise = librosa.effects.preemphasis(noise)
+        noise = preemphasis(noise)
         
         # 2. Tonal component (drum shell resonance)
         tone1 = np.sin(2 * np.pi * 200 * t) * np.exp(-t * 12)
@@ -65,37 +74,66 @@ class EnhancedAIDaw:
             
         return snare
     
+    def generate_professional_hihat(self, duration=0.1, hihat_style='standard'):
+        """Generate crisp hi-hat from high-passed noise"""
+        t = np.linspace(0, duration, int(self.sample_rate * duration), dtype=self.dtype)
+        
+        # Pre-emphasis strips the low end so only the metallic sizzle is left
+        noise = self.noise.normal(len(t), 0.1, key=('professional_hihat', hihat_style, len(t)), dtype=self.dtype)
+        noise = preemphasis(noise, coef=0.95)
+        
+        if hihat_style == 'rapid':
+            # Tight closed hat for fast rolls
+            hihat = noise * np.exp(-t * 80)
+        elif hihat_style == 'vinyl':
+            # Duller, softer hat for lo-fi
+            hihat = noise * np.exp(-t * 30) * 0.5
+        else:
+            hihat = noise * np.exp(-t * 50)
+            
+        return hihat
+    
+    def get_voice(self, voice, style, duration, bass_boost=1.0):
+        """Return a cached professional one-shot, synthesizing it on first use"""
+        key = VoiceCache.make_key(f"professional_{voice}", style, duration, bass_boost, 0.0, self.sample_rate,
+                                  self.noise.seed, self.dtype)
+        
+        if voice == 'kick':
+            factory = lambda: self.generate_professional_kick(duration=duration, kick_type=style, bass_boost=bass_boost)
+        elif voice == 'snare':
+            factory = lambda: self.generate_professional_snare(duration=duration, mood=style)
+        else:
+            factory = lambda: self.generate_professional_hihat(duration=duration, hihat_style=style)
+        
+        return self.voice_cache.get(key, lambda: factory().astype(self.dtype, copy=False))
+    
+    @timed_calls('effects')
     def add_audio_effects(self, audio_data, effects=['compression', 'eq']):
-        """Add professional audio effects using pydub"""
-        # Convert numpy array to pydub AudioSegment
-        audio_int = (audio_data * 32767).astype(np.int16)
-        audio_segment = AudioSegment(
-            audio_int.tobytes(),
-            frame_rate=self.sample_rate,
-            sample_width=2,
-            channels=1
-        )
+        """Add professional audio effects, working on the float samples directly"""
+        # One working copy in our dtype; every effect after that runs in place
+        audio = np.array(audio_data, dtype=self.dtype)
         
         if 'compression' in effects:
             # Add dynamic range compression
-            audio_segment = compress_dynamic_range(audio_segment, threshold=-20, ratio=4)
+            compress(audio, self.sample_rate, threshold_db=-20, ratio=4, out=audio)
             
         if 'eq' in effects:
-            # Simple EQ boost for low end
-            audio_segment = audio_segment.low_pass_filter(8000)
+            # Gentle 6 dB/octave roll-off above 8 kHz
+            audio = lowpass(audio, self.sample_rate, 8000, order=1)
             
         if 'normalize' in effects:
             # Normalize audio levels
-            audio_segment = normalize(audio_segment)
+            normalize(audio, target_db=-0.1, out=audio)
             
-        # Convert back to numpy array
-        processed_audio = np.array(audio_segment.get_array_of_samples()).astype(np.float32) / 32767
-        return processed_audio
+        return audio
     
+    @timed_calls('midi_export')
     def export_to_midi(self, params, filename):
         """Export beat pattern as MIDI file for use in other DAWs"""
-        # Create a new MIDI file
-        midi = pretty_midi.PrettyMIDI()
+        import pretty_midi
+        
+        # Create a new MIDI file at the beat's tempo so steps land on the grid
+        midi = pretty_midi.PrettyMIDI(initial_tempo=params['bpm'])
         
         # Create drum track
         drum_program = pretty_midi.instrument_name_to_program('Acoustic Grand Piano')
@@ -103,52 +141,33 @@ class EnhancedAIDaw:
         
         bpm = params['bpm']
         bars = params['bars']
-        beat_duration = 60.0 / bpm
+        bar_duration = 60.0 / bpm * 4
         
-        # MIDI drum mapping (General MIDI)
-        kick_note = 36  # C2
-        snare_note = 38  # D2
-        hihat_note = 42  # F#2
+        # Compile the genre's step grid once and shift it into every bar
+        starts, voice_ids, velocities = bar_notes(params['genre'], params['hihat_style'], bpm)
+        bar_offsets = np.arange(bars)[:, None] * bar_duration
+        note_starts = (bar_offsets + starts[None, :]).ravel()
+        pitches = np.tile(np.take(GM_DRUM_NOTES, voice_ids), bars)
+        note_lengths = np.tile(np.take(MIDI_NOTE_LENGTHS, voice_ids), bars)
+        velocities = np.tile(velocities, bars)
         
-        for bar in range(bars):
-            bar_start = bar * 4 * beat_duration
-            
-            # Add kicks based on genre
-            if params['genre'] == 'trap':
-                # Trap pattern: 1, 2.5, 4
-                kick_times = [0, 1.5, 3]
-            else:  # boom bap, drill, etc.
-                # Standard pattern: 1, 3
-                kick_times = [0, 2]
-                
-            for kick_time in kick_times:
-                note_start = bar_start + kick_time * beat_duration
-                note = pretty_midi.Note(velocity=100, pitch=kick_note, 
-                                      start=note_start, end=note_start + 0.1)
-                drums.notes.append(note)
-            
-            # Add snares on 2 and 4
-            for snare_beat in [1, 3]:
-                note_start = bar_start + snare_beat * beat_duration
-                note = pretty_midi.Note(velocity=80, pitch=snare_note,
-                                      start=note_start, end=note_start + 0.1)
-                drums.notes.append(note)
-            
-            # Add hi-hats
-            hihat_pattern = 8 if params['hihat_style'] == 'rapid' else 4
-            for hihat in range(hihat_pattern):
-                note_start = bar_start + hihat * (beat_duration / (hihat_pattern / 4))
-                velocity = 60 if hihat % 2 == 0 else 40  # Accent pattern
-                note = pretty_midi.Note(velocity=velocity, pitch=hihat_note,
-                                      start=note_start, end=note_start + 0.05)
-                drums.notes.append(note)
+        for start, pitch, length, velocity in zip(note_starts.tolist(), pitches.tolist(),
+                                                  note_lengths.tolist(), velocities.tolist()):
+            drums.notes.append(pretty_midi.Note(velocity=velocity, pitch=pitch,
+                                                start=start, end=start + length))
         
         midi.instruments.append(drums)
         midi.write(filename)
         return filename
     
-    def create_enhanced_beat(self, prompt):
-        """Create professional quality beat with effects and MIDI export"""
+    def create_enhanced_beat(self, prompt, output_dir=None, basename=None, output_format='wav', stems=None):
+        """Create professional quality beat with effects and MIDI export; audio as wav, flac or opus.
+
+        ``stems`` ('multichannel' or 'files') also writes the dry kick,
+        snare and hi-hat stems, rendered in the same pass as the mix and
+        scaled together so their sum peaks where the normalized mix does.
+        The result is then ``(audio_file, midi_file, params, stem_files)``.
+        """
         print(f"🎵 Processing prompt: '{prompt}'")
         
         # Parse prompt
@@ -157,27 +176,60 @@ class EnhancedAIDaw:
         print(f"📝 {description}")
         
         # Generate enhanced beat
-        beat = self.generate_enhanced_pattern(params)
+        if stems is None:
+            beat = self.generate_enhanced_pattern(params)
+        else:
+            beat, stem_tracks = self.generate_enhanced_pattern(params, stems=True)
+            # Taken before the effects, which work on the mix in place
+            peak = np.abs(beat).max()
+            stem_scale = 32767 * 10 ** (-0.1 / 20) / peak if peak > 0 else 0.0
         
         # Add professional effects
         print("🎛️ Applying audio effects...")
         beat = self.add_audio_effects(beat, ['compression', 'eq', 'normalize'])
         
         # Export audio
-        audio_filename = f"enhanced_beat_{params['genre']}_{params['bpm']}bpm.wav"
-        sf.write(audio_filename, beat, self.sample_rate)
+        basename = basename or f"enhanced_beat_{params['genre']}_{params['bpm']}bpm"
+        audio_filename = output_path(os.path.join(output_dir or '', basename), output_format)
+        write_audio(audio_filename, beat, self.sample_rate, output_format)
+        if stems is not None:
+            stem_files = write_stems(os.path.join(output_dir or '', basename), stem_tracks, self.sample_rate,
+                                     VOICES, stems, output_format, scale=stem_scale)
         
         # Export MIDI
-        midi_filename = f"enhanced_beat_{params['genre']}_{params['bpm']}bpm.mid"
+        midi_filename = os.path.join(output_dir or '', f"{basename}.mid")
         self.export_to_midi(params, midi_filename)
         
         print(f"✅ Generated: {audio_filename}")
         print(f"🎹 MIDI file: {midi_filename}")
         
-        return audio_filename, midi_filename, params
+        if stems is None:
+            return audio_filename, midi_filename, params
+        print(f"🎚️ Stems: {', '.join(stem_files)}")
+        return audio_filename, midi_filename, params, stem_files
+    
+    def pattern_voices(self, params):
+        """Kick, snare and hi-hat one-shots for a parsed prompt, in voice id order"""
+        return [
+            self.get_voice('kick', params['kick_pattern'], 0.4, bass_boost=params['bass_boost']),
+            self.get_voice('snare', params['mood'], 0.3),
+            self.get_voice('hihat', params['hihat_style'], 0.1)
+        ]
     
-    def generate_enhanced_pattern(self, params):
-        """Generate enhanced beat pattern with professional drums"""
+    def render_midi(self, midi, params=None, total_samples=None, stems=False):
+        """Render a drum MIDI file (a path or PrettyMIDI) with this DAW's voices.
+
+        ``params`` picks the kit the way a parsed prompt does; by default it
+        is the one an empty prompt gives. See ``midi_renderer.render_midi``.
+        """
+        params = params if params is not None else self.processor.parse_prompt('')
+        return render_midi(midi, self.pattern_voices(params), self.sample_rate, total_samples, stems=stems)
+    
+    def generate_enhanced_pattern(self, params, stems=False):
+        """Generate enhanced beat pattern with professional drums.
+
+        With ``stems`` the result is ``(mix, stems)``, as from ``render_events``.
+        """
         bpm = params['bpm']
         bars = params['bars']
         
@@ -185,60 +237,14 @@ class EnhancedAIDaw:
         bar_duration = beat_duration * 4
         total_duration = bar_duration * bars
         total_samples = int(self.sample_rate * total_duration)
-        pattern = np.zeros(total_samples)
         
-        for bar in range(bars):
-            bar_start = int(bar * bar_duration * self.sample_rate)
-            beat_samples = int(beat_duration * self.sample_rate)
-            
-            # Generate professional sounds
-            kick = self.generate_professional_kick(duration=0.4, 
-                                                 kick_type=params['kick_pattern'], 
-                                                 bass_boost=params['bass_boost'])
-            snare = self.generate_professional_snare(duration=0.3, mood=params['mood'])
-            
-            # Add pattern based on genre
-            if params['genre'] == 'trap':
-                self.add_trap_pattern(pattern, bar_start, beat_samples, kick, snare, params)
-            elif params['genre'] == 'boom bap':
-                self.add_boom_bap_pattern(pattern, bar_start, beat_samples, kick, snare, params)
-            # Add other genres...
-                
-        return pattern
-    
-    def add_trap_pattern(self, pattern, bar_start, beat_samples, kick, snare, params):
-        """Add trap-specific pattern"""
-        # Trap kick pattern: 1, 2.5, 4
-        kick_positions = [0, int(beat_samples * 1.5), beat_samples * 3]
-        
-        for pos in kick_positions:
-            start_pos = bar_start + pos
-            if start_pos + len(kick) < len(pattern):
-                pattern[start_pos:start_pos + len(kick)] += kick
-        
-        # Snare on 2 and 4
-        snare_positions = [beat_samples, beat_samples * 3]
-        for pos in snare_positions:
-            start_pos = bar_start + pos
-            if start_pos + len(snare) < len(pattern):
-                pattern[start_pos:start_pos + len(snare)] += snare
-    
-    def add_boom_bap_pattern(self, pattern, bar_start, beat_samples, kick, snare, params):
-        """Add boom bap specific pattern"""
-        # Boom bap: kick on 1 and 3
-        kick_positions = [0, beat_samples * 2]
-        
-        for pos in kick_positions:
-            start_pos = bar_start + pos
-            if start_pos + len(kick) < len(pattern):
-                pattern[start_pos:start_pos + len(kick)] += kick
-        
-        # Snare on 2 and 4
-        snare_positions = [beat_samples, beat_samples * 3]
-        for pos in snare_positions:
-            start_pos = bar_start + pos
-            if start_pos + len(snare) < len(pattern):
-                pattern[start_pos:start_pos + len(snare)] += snare
+        # Generate professional sounds once and reuse them for every bar
+        voices = self.pattern_voices(params)
+        
+        # Same step grid the MIDI export uses, repeated at every bar start
+        events = bar_events(params['genre'], params['hihat_style'], bpm, self.sample_rate)
+        starts = bar_starts(bpm, bars, self.sample_rate)
+        return render_events(events, voices, total_samples, loop_starts=starts, stems=stems)
 
 # Test the enhanced DAW
 if __name__ == "__main__":
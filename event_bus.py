@@ -0,0 +1,69 @@
+import json
+import queue
+import threading
+
+
+class Subscription:
+    """One subscriber's queue of ``(event, data)`` pairs"""
+
+    def __init__(self, bus, max_queued):
+        self.bus = bus
+        self.dropped = False
+        self._queue = queue.Queue(maxsize=max_queued)
+
+    def get(self, timeout=None):
+        """Next ``(event, data)``, or None if nothing arrived within ``timeout`` seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def _put(self, event, data):
+        try:
+            self._queue.put_nowait((event, data))
+        except queue.Full:
+            # A subscriber that stopped reading is cut loose rather than
+            # buffered forever; it can reconnect and start from a snapshot
+            self.dropped = True
+            self.close()
+
+
+class EventBus:
+    """Fans published events out to every subscriber without blocking the publisher.
+
+    Each subscriber gets its own queue of up to ``max_queued`` events. One
+    that falls that far behind is dropped and its ``dropped`` flag set.
+    """
+
+    def __init__(self, max_queued=256):
+        self.max_queued = max_queued
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self, self.max_queued)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription._put(event, data)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event, data):
+    """One Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,21 +1,93 @@
-import torch
+import itertools
 import os
-from datetime import datetime
+import threading
+import time
 import traceback
+from audio_writer import SegmentStitcher, open_writer, output_path, write_audio
+from generation_backends import GenerationBackend
+from generation_batcher import GenerationBatcher
+import metrics
+from metrics import timed, timed_calls
 
-class FullSongGenerator:
-    def __init__(self):
+# Generation time over seconds of audio produced; below 1.0 is faster than real time
+REALTIME_FACTOR = metrics.REGISTRY.histogram(
+    'beatbox_musicgen_realtime_factor', 'MusicGen generation time per second of audio',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0))
+
+# Long-form songs are normalized from their first window to about the -14 dB audio_write targets
+LONG_FORM_TARGET_RMS = 10 ** (-14 / 20)
+
+def configure_cpu_threads(intra_op_threads=None, inter_op_threads=None):
+    """Size torch's intra-op (per operator) and inter-op (between operators) thread pools"""
+    import torch
+    
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Only allowed once per process, before any parallel work has run
+            print(f"⚠️ Keeping {torch.get_num_interop_threads()} inter-op threads: {e}")
+
+def quantize_linear_layers(module):
+    """Swap ``module``'s Linear layers for dynamic int8 ones: int8 weights, activations quantized on the fly"""
+    import torch
+    
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+class FullSongGenerator(GenerationBackend):
+    """MusicGen behind the ``GenerationBackend`` interface.
+    
+    On CPU, ``intra_op_threads`` and ``inter_op_threads`` size torch's thread
+    pools and ``quantize=True`` swaps the language model's Linear layers for
+    dynamic int8 ones, which cuts their weight memory by 4x and often speeds
+    them up. Generation runs under ``torch.inference_mode`` unless
+    ``inference_mode=False``. Pass a built ``model`` to skip loading
+    ``model_name`` from the hub, e.g. a tiny randomly initialized one.
+    
+    Songs longer than one window (the model's ``max_duration`` unless
+    ``window_seconds`` is set) are generated window by window, each
+    continuing the end of the last, and streamed to disk.
+    """
+    
+    window_seconds = None
+    continuation_seconds = 10.0
+    crossfade_seconds = 0.5
+    
+    def __init__(self, max_batch_size=4, max_batch_wait=0.5, model_name='facebook/musicgen-small',
+                 intra_op_threads=None, inter_op_threads=None, quantize=False, inference_mode=True, model=None,
+                 output_format='wav'):
         print("🎵 Initializing AI Music Generator...")
-        self.model = None
+        # torch takes seconds to import, so only pay for it once a generator is built
+        import torch
+        
+        # Creates the output directory and the generation cache
+        super().__init__('generated_songs', output_format)
+        self.model = model
+        self.model_name = model_name
+        self.quantize = quantize
+        self.inference_mode = inference_mode
+        self.generate_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.last_realtime_factor = None
+        # MusicGen keeps generation params on the model, so calls take turns
+        self._model_lock = threading.Lock()
+        # Concurrent requests with the same settings share one model.generate call
+        self.batcher = GenerationBatcher(self._generate_requests, max_batch_size, max_batch_wait)
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         print(f"🔧 Using device: {self.device}")
         
-        # Create output directory
-        os.makedirs('generated_songs', exist_ok=True)
+        if self.device == 'cpu':
+            configure_cpu_threads(intra_op_threads, inter_op_threads)
+            print(f"🧵 CPU threads: {torch.get_num_threads()} intra-op, {torch.get_num_interop_threads()} inter-op")
         
         # Load model
-        self.load_model()
+        if self.model is None:
+            self.load_model()
+        self._optimize_model()
     
+    @timed_calls('model_load')
     def load_model(self):
         """Load AudioCraft MusicGen model"""
         try:
@@ -24,7 +96,7 @@ class FullSongGenerator:
             from audiocraft.models import MusicGen
             
             # Use small model for faster loading and lower memory usage
-            self.model = MusicGen.get_pretrained('facebook/musicgen-small')
+            self.model = MusicGen.get_pretrained(self.model_name)
             
             # Set default generation parameters
             self.model.set_generation_params(
@@ -42,120 +114,208 @@ class FullSongGenerator:
             traceback.print_exc()
             raise e
     
-    def generate_song(self, prompt, duration=30, style_hint=None):
-        """Generate a song from text prompt"""
-        if self.model is None:
-            raise Exception("Model not loaded!")
+    def _optimize_model(self):
+        """Apply the CPU performance options to the loaded model"""
+        if not self.quantize:
+            return
+        if self.device != 'cpu':
+            # Dynamic quantized kernels only exist for CPU
+            print("⚠️ int8 quantization is CPU only, keeping full precision weights")
+            self.quantize = False
+            return
         
-        # Create safe filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_prompt = "".join(c for c in prompt[:30] if c.isalnum() or c in (' ', '-', '_')).strip()
-        safe_prompt = safe_prompt.replace(' ', '_')
+        # The language model does nearly all the work; the audio decoder is mostly convolutions
+        self.model.lm = quantize_linear_layers(self.model.lm)
+        print("🗜️ Quantized the language model's Linear layers to int8")
+    
+    def _generate_requests(self, settings, requests):
+        """Batcher entry point: ``requests`` are (prompt, progress callback or None) pairs"""
+        callbacks = [progress for _, progress in requests if progress is not None]
         
-        if style_hint:
-            output_filename = f"generated_songs/{style_hint}_{timestamp}"
-        else:
-            output_filename = f"generated_songs/song_{safe_prompt}_{timestamp}"
+        def progress(fraction):
+            for callback in callbacks:
+                callback(fraction)
         
-        print(f"🎵 Generating: '{prompt}'")
-        print(f"⏱️ Duration: {duration} seconds")
-        print(f"💾 Output: {output_filename}.wav")
+        return self._generate_batch(settings, [prompt for prompt, _ in requests],
+                                    progress=progress if callbacks else None)
+    
+    def _generate_batch(self, settings, descriptions, seed=None, prompt_audio=None, progress=None):
+        """Run one batched MusicGen call; ``settings`` is the batcher group key.
         
-        try:
-            # Set generation parameters for this request
+        With ``prompt_audio``, shape (batch, channels, frames), each clip
+        continues its prompt and ``settings``' duration includes it.
+        ``progress`` is called with the fraction of tokens generated.
+        """
+        import torch
+        
+        duration, top_k, top_p, temperature, cfg_coef = settings
+        print(f"🎛️ Generating batch of {len(descriptions)} ({duration}s)")
+        
+        with self._model_lock:
+            if seed is not None:
+                torch.manual_seed(seed)
             self.model.set_generation_params(
                 duration=duration,
-                top_k=250,
-                top_p=0.0,
-                temperature=1.0,
-                cfg_coef=3.0
+                top_k=top_k,
+                top_p=top_p,
+                temperature=temperature,
+                cfg_coef=cfg_coef
             )
+            self.model.set_custom_progress_callback(
+                None if progress is None else lambda generated, total: progress(generated / total))
+            start = time.perf_counter()
+            # inference_mode skips autograd bookkeeping on every tensor op
+            with timed('musicgen_generate'), torch.inference_mode(self.inference_mode):
+                if prompt_audio is None:
+                    wavs = self.model.generate(descriptions)
+                else:
+                    wavs = self.model.generate_continuation(prompt_audio, self.model.sample_rate, descriptions)
+            elapsed = time.perf_counter() - start
+            self.model.set_custom_progress_callback(None)
+        
+        prompt_seconds = 0 if prompt_audio is None else prompt_audio.shape[-1] / self.model.sample_rate
+        self._record_realtime_factor(elapsed, duration - prompt_seconds)
+        return [wav.cpu() for wav in wavs]
+    
+    def _record_realtime_factor(self, elapsed, duration):
+        """Track generation time per second of audio; a batch produces its clips side by side"""
+        self.generate_seconds += elapsed
+        self.audio_seconds += duration
+        self.last_realtime_factor = elapsed / duration if duration else None
+        if self.last_realtime_factor is not None:
+            print(f"⏱️ Real-time factor {self.last_realtime_factor:.2f} ({elapsed:.1f}s for {duration}s of audio)")
+            if metrics.is_enabled():
+                REALTIME_FACTOR.observe(self.last_realtime_factor)
+    
+    def performance_info(self):
+        """CPU mode and real-time factors so far"""
+        import torch
+        
+        return {
+            'inference_mode': self.inference_mode,
+            'quantized': self.quantize,
+            'intra_op_threads': torch.get_num_threads(),
+            'inter_op_threads': torch.get_num_interop_threads(),
+            'last_realtime_factor': self.last_realtime_factor,
+            'realtime_factor': self.generate_seconds / self.audio_seconds if self.audio_seconds else None
+        }
+    
+    @property
+    def sample_rate(self):
+        return self.model.sample_rate if self.model is not None else None
+    
+    def generate_song(self, prompt, duration=30, style_hint=None, seed=None, **settings):
+        """Generate a song from text prompt; see ``GenerationBackend.generate_song``"""
+        if self.model is None:
+            raise Exception("Model not loaded!")
+        return super().generate_song(prompt, duration, style_hint, seed, **settings)
+    
+    def _generate_uncached(self, prompt, settings, style_hint=None, seed=None, progress=None):
+        """Run MusicGen for one prompt and write the result to generated_songs/"""
+        duration = settings[0]
+        output_filename = self._output_path(prompt, style_hint)
+        filename = output_path(output_filename, self.output_format)
+        
+        print(f"🎵 Generating: '{prompt}'")
+        print(f"⏱️ Duration: {duration} seconds")
+        print(f"💾 Output: {filename}")
+        
+        if duration > self._window_seconds():
+            return self._generate_long(prompt, settings, output_filename, style_hint, seed, progress)
+        
+        try:
+            if seed is None:
+                # Generate the music, batched with other requests using the same settings
+                wav = self.batcher.generate(settings, (prompt, progress))
+            else:
+                # A seeded clip is only reproducible when generated on its own
+                wav = self._generate_batch(settings, [prompt], seed, progress=progress)[0]
             
-            # Generate the music
-            descriptions = [prompt]
-            wav = self.model.generate(descriptions)
-            
-            # Save the audio
-            from audiocraft.data.audio import audio_write
-            audio_write(output_filename, wav[0].cpu(), self.model.sample_rate,
-                       strategy="loudness", loudness_compressor=True)
-            
-            filename = f"{output_filename}.wav"
-            file_size = os.path.getsize(filename) if os.path.exists(filename) else 0
+            # The loudness normalization audio_write applies, then our writers, which save
+            # under a hidden temp name and rename into place so the download route never
+            # serves a half-written file, and which also encode FLAC and Opus
+            from audiocraft.data.audio_utils import normalize_audio
+            wav = normalize_audio(wav, strategy="loudness", loudness_compressor=True,
+                                  sample_rate=self.model.sample_rate)
+            write_audio(filename, wav.numpy().T, self.model.sample_rate, self.output_format)
+            song = self._song_info(filename, prompt, duration, style_hint, seed)
             
             print(f"✅ Generated successfully: {filename}")
-            print(f"📊 File size: {file_size/1024/1024:.1f} MB")
+            print(f"📊 File size: {song['file_size']/1024/1024:.1f} MB")
             
-            return {
-                'filename': filename,
-                'basename': os.path.basename(filename),
-                'duration': duration,
-                'prompt': prompt,
-                'sample_rate': self.model.sample_rate,
-                'file_size': file_size,
-                'style': style_hint or 'custom'
-            }
+            return song
             
         except Exception as e:
             print(f"❌ Generation failed: {e}")
             traceback.print_exc()
             raise e
     
-    def create_michael_jackson_style(self, duration=30):
-        """Generate Michael Jackson 'Beat It' style song"""
-        prompts = [
-            "upbeat pop rock song with funky bassline and electric guitar, 80s style, danceable rhythm, energetic drums, similar to Beat It by Michael Jackson",
-            "energetic pop rock with driving drums, funky bass guitar, electric guitar riffs, upbeat tempo, 1980s production style",
-            "pop rock anthem with strong backbeat, electric guitar solo, synth bass, dance pop, 80s style"
-        ]
-        
-        import random
-        prompt = random.choice(prompts)
-        
-        print("🕺 Creating Michael Jackson 'Beat It' style track...")
-        return self.generate_song(prompt, duration, "michael_jackson_beat_it")
+    def _window_seconds(self):
+        return self.window_seconds or self.model.max_duration
     
-    def create_sleepy_hallow_style(self, duration=30):
-        """Generate Sleepy Hallow style drill song"""
-        prompts = [
-            "dark drill beat with heavy 808s, Brooklyn drill style, aggressive trap drums, menacing piano melody, street vibe, NYC drill rap",
-            "UK drill instrumental with sliding 808s, dark piano chords, rapid hi-hats, aggressive drums, drill rap beat, street music",
-            "drill rap beat with heavy bass, dark atmosphere, ominous piano, trap drums, Brooklyn drill style, menacing melody"
-        ]
+    def _generate_long(self, prompt, settings, output_filename, style_hint=None, seed=None, progress=None):
+        """Build a song longer than one model window from overlapping continuations.
         
-        import random
-        prompt = random.choice(prompts)
+        Each window after the first continues the last ``continuation_seconds``
+        of the one before, and the seams are crossfaded. Finished segments are
+        appended to the WAV as they complete, so memory stays at one window
+        and a failed run leaves its audio so far in ``<name>.partial.<ext>``.
+        """
+        import numpy as np
         
-        print("🎤 Creating Sleepy Hallow style drill track...")
-        return self.generate_song(prompt, duration, "sleepy_hallow_drill")
-    
-    def create_drake_style(self, duration=30):
-        """Generate Drake style melodic hip-hop"""
-        prompts = [
-            "melodic hip hop with atmospheric production, soft piano, 808 drums, ambient pads, emotional and melodic, R&B influence",
-            "melodic rap beat with piano chords, atmospheric synths, trap drums, emotional melody, contemporary hip hop, Drake style",
-            "melodic hip hop instrumental with lush piano, strings, 808s, atmospheric production, emotional and introspective"
-        ]
+        duration, sampling = settings[0], settings[1:]
+        sample_rate = self.model.sample_rate
+        window = self._window_seconds()
+        context = int(self.continuation_seconds * sample_rate)
+        fade = int(self.crossfade_seconds * sample_rate)
+        if window <= self.continuation_seconds:
+            raise ValueError(f"Window of {window}s leaves no room after {self.continuation_seconds}s of context")
+        filename = output_path(output_filename, self.output_format)
+        print(f"🧩 Long-form: {window}s windows continuing the last {self.continuation_seconds}s")
         
-        import random
-        prompt = random.choice(prompts)
+        def window_progress(start, seconds):
+            """Map a window's token progress onto the whole song"""
+            if progress is None:
+                return None
+            return lambda fraction: progress(min(start + fraction * seconds, duration) / duration)
         
-        print("🎵 Creating Drake style melodic hip-hop...")
-        return self.generate_song(prompt, duration, "drake_melodic_hiphop")
-    
-    def create_travis_scott_style(self, duration=30):
-        """Generate Travis Scott style psychedelic trap"""
-        prompt = "psychedelic trap with autotune vocals, distorted 808s, atmospheric production, reverb-heavy drums, dark and trippy"
+        # Seeded windows are seeded in turn, so the song does not depend on what ran in between
+        window_seeds = itertools.count(seed) if seed is not None else itertools.repeat(None)
+        audio = self._generate_batch((window, *sampling), [prompt], next(window_seeds),
+                                     progress=window_progress(0, window))[0]
+        frames = audio.numpy().T
+        # audio_write would normalize the whole clip; a stream can only use the first window.
+        # Same loudness target, and tanh soft clipping like its compressor
+        gain = LONG_FORM_TARGET_RMS / max(float(np.sqrt(np.mean(frames ** 2))), 1e-4)
         
-        print("🔥 Creating Travis Scott style psychedelic trap...")
-        return self.generate_song(prompt, duration, "travis_scott_trap")
-    
-    def create_the_weeknd_style(self, duration=30):
-        """Generate The Weeknd style dark R&B"""
-        prompt = "dark R&B with atmospheric synths, moody production, electronic elements, sultry and mysterious"
+        writer = open_writer(filename, sample_rate, frames.shape[1], self.output_format)
+        stitcher = SegmentStitcher(writer, int(duration * sample_rate), fade,
+                                   transform=lambda block: np.tanh(gain * block))
+        try:
+            stitcher.add(frames)
+            while stitcher.remaining > 0:
+                new_seconds = min(window - self.continuation_seconds,
+                                  (stitcher.remaining + fade) / sample_rate)
+                prompt_audio = audio[None, :, -context:]
+                done = (stitcher.total_frames - stitcher.remaining) / sample_rate
+                audio = self._generate_batch((self.continuation_seconds + new_seconds, *sampling), [prompt],
+                                             next(window_seeds), prompt_audio, window_progress(done, new_seconds))[0]
+                # The output starts with the re-decoded prompt; the seam is where the old window ended
+                stitcher.add(audio.numpy().T[context - fade:])
+                print(f"🧩 {writer.frames_written / sample_rate:.0f}s of {duration}s written")
+            stitcher.finish()
+        except BaseException as e:
+            partial = output_path(f"{output_filename}.partial", self.output_format)
+            writer.close(partial)
+            print(f"❌ Long-form generation failed after {writer.frames_written / sample_rate:.0f}s, "
+                  f"kept {partial}: {e}")
+            raise
+        writer.close()
         
-        print("🌙 Creating The Weeknd style dark R&B...")
-        return self.generate_song(prompt, duration, "weeknd_dark_rnb")
+        song = self._song_info(filename, prompt, duration, style_hint, seed)
+        print(f"✅ Generated successfully: {filename}")
+        print(f"📊 File size: {song['file_size']/1024/1024:.1f} MB")
+        return song
     
     def get_model_info(self):
         """Get model information"""
@@ -166,7 +326,11 @@ class FullSongGenerator:
             "status": "Model loaded",
             "device": self.device,
             "sample_rate": self.model.sample_rate,
-            "model_name": "MusicGen-Small"
+            "model_name": "MusicGen-Small",
+            "output_format": self.output_format,
+            "batching": self.batcher.stats(),
+            "cache": self.cache.stats(),
+            "performance": self.performance_info()
         }
 
 # Test script
@@ -0,0 +1,246 @@
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from generation_cache import GenerationCache
+
+# Seed used by the artist presets so repeat clicks are served from the cache
+PRESET_SEED = 0
+
+BACKENDS = ('musicgen', 'fake')
+
+# The fake backend reports its simulated model time in this many steps
+FAKE_PROGRESS_STEPS = 10
+
+
+class GenerationBackend:
+    """What the web app needs from a song generator.
+
+    Subclasses set ``model_name`` and ``sample_rate``, implement
+    ``_generate_uncached`` to write one song into ``output_dir`` and
+    ``get_model_info`` to describe themselves. Songs are written as
+    ``output_format`` (wav, flac or opus). Seeded requests are
+    reproducible, so ``generate_song`` serves them from the generation
+    cache and identical in-flight requests share one run. The artist
+    presets are built on ``generate_song``.
+    """
+
+    model_name = None
+    sample_rate = None
+
+    def __init__(self, output_dir='generated_songs', output_format='wav'):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        os.makedirs(output_dir, exist_ok=True)
+        self.cache = GenerationCache(os.path.join(output_dir, '.cache'))
+
+    def generate_song(self, prompt, duration=30, style_hint=None, seed=None,
+                      top_k=250, top_p=0.0, temperature=1.0, cfg_coef=3.0, progress=None):
+        """Generate a song from text prompt.
+
+        Seeded requests are reproducible, so they are served from the
+        generation cache and identical in-flight requests share one run.
+        ``progress``, if given, is called with the fraction done (0 to 1)
+        while the song is generated, possibly from another thread.
+        """
+        settings = (duration, top_k, top_p, temperature, cfg_coef)
+        if seed is None:
+            return self._generate_uncached(prompt, settings, style_hint, progress=progress)
+
+        key = GenerationCache.make_key(prompt=prompt, duration=duration, top_k=top_k, top_p=top_p,
+                                       temperature=temperature, cfg_coef=cfg_coef, seed=seed,
+                                       model=self.model_name, output_format=self.output_format)
+        return self.cache.get_or_generate(
+            key, lambda: self._generate_uncached(prompt, settings, style_hint, seed, progress))
+
+    def _generate_uncached(self, prompt, settings, style_hint=None, seed=None, progress=None):
+        """Generate one song and return its description; see ``_song_info``"""
+        raise NotImplementedError
+
+    def get_model_info(self):
+        raise NotImplementedError
+
+    def _output_path(self, prompt, style_hint=None):
+        """Output path without extension; the suffix keeps same-second requests apart"""
+        timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        safe_prompt = "".join(c for c in prompt[:30] if c.isalnum() or c in (' ', '-', '_')).strip()
+        safe_prompt = safe_prompt.replace(' ', '_')
+
+        if style_hint:
+            return os.path.join(self.output_dir, f"{style_hint}_{timestamp}")
+        return os.path.join(self.output_dir, f"song_{safe_prompt}_{timestamp}")
+
+    def _song_info(self, filename, prompt, duration, style_hint=None, seed=None):
+        file_size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        return {
+            'filename': filename,
+            'basename': os.path.basename(filename),
+            'duration': duration,
+            'prompt': prompt,
+            'sample_rate': self.sample_rate,
+            'file_size': file_size,
+            'style': style_hint or 'custom',
+            'seed': seed
+        }
+
+    def create_michael_jackson_style(self, duration=30, seed=PRESET_SEED, progress=None):
+        """Generate Michael Jackson 'Beat It' style song"""
+        prompts = [
+            "upbeat pop rock song with funky bassline and electric guitar, 80s style, danceable rhythm, energetic drums, similar to Beat It by Michael Jackson",
+            "energetic pop rock with driving drums, funky bass guitar, electric guitar riffs, upbeat tempo, 1980s production style",
+            "pop rock anthem with strong backbeat, electric guitar solo, synth bass, dance pop, 80s style"
+        ]
+
+        prompt = random.choice(prompts)
+
+        print("🕺 Creating Michael Jackson 'Beat It' style track...")
+        return self.generate_song(prompt, duration, "michael_jackson_beat_it", seed=seed, progress=progress)
+
+    def create_sleepy_hallow_style(self, duration=30, seed=PRESET_SEED, progress=None):
+        """Generate Sleepy Hallow style drill song"""
+        prompts = [
+            "dark drill beat with heavy 808s, Brooklyn drill style, aggressive trap drums, menacing piano melody, street vibe, NYC drill rap",
+            "UK drill instrumental with sliding 808s, dark piano chords, rapid hi-hats, aggressive drums, drill rap beat, street music",
+            "drill rap beat with heavy bass, dark atmosphere, ominous piano, trap drums, Brooklyn drill style, menacing melody"
+        ]
+
+        prompt = random.choice(prompts)
+
+        print("🎤 Creating Sleepy Hallow style drill track...")
+        return self.generate_song(prompt, duration, "sleepy_hallow_drill", seed=seed, progress=progress)
+
+    def create_drake_style(self, duration=30, seed=PRESET_SEED, progress=None):
+        """Generate Drake style melodic hip-hop"""
+        prompts = [
+            "melodic hip hop with atmospheric production, soft piano, 808 drums, ambient pads, emotional and melodic, R&B influence",
+            "melodic rap beat with piano chords, atmospheric synths, trap drums, emotional melody, contemporary hip hop, Drake style",
+            "melodic hip hop instrumental with lush piano, strings, 808s, atmospheric production, emotional and introspective"
+        ]
+
+        prompt = random.choice(prompts)
+
+        print("🎵 Creating Drake style melodic hip-hop...")
+        return self.generate_song(prompt, duration, "drake_melodic_hiphop", seed=seed, progress=progress)
+
+    def create_travis_scott_style(self, duration=30, seed=PRESET_SEED, progress=None):
+        """Generate Travis Scott style psychedelic trap"""
+        prompt = "psychedelic trap with autotune vocals, distorted 808s, atmospheric production, reverb-heavy drums, dark and trippy"
+
+        print("🔥 Creating Travis Scott style psychedelic trap...")
+        return self.generate_song(prompt, duration, "travis_scott_trap", seed=seed, progress=progress)
+
+    def create_the_weeknd_style(self, duration=30, seed=PRESET_SEED, progress=None):
+        """Generate The Weeknd style dark R&B"""
+        prompt = "dark R&B with atmospheric synths, moody production, electronic elements, sultry and mysterious"
+
+        print("🌙 Creating The Weeknd style dark R&B...")
+        return self.generate_song(prompt, duration, "weeknd_dark_rnb", seed=seed, progress=progress)
+
+
+class FakeBackend(GenerationBackend):
+    """Stand-in for MusicGen that renders drum loops with ``SmartDrumMachine``.
+
+    It needs no model weights, GPU or network, so the web tier, job queue
+    and file serving can be load-tested anywhere. The audio depends only on
+    the prompt, duration and seed. Each call sleeps ``latency`` seconds
+    plus ``realtime_factor`` seconds per second of audio to stand in for
+    model time; rendering itself takes a few milliseconds.
+    """
+
+    model_name = 'fake'
+
+    def __init__(self, latency=0.0, realtime_factor=0.0, sample_rate=32000, output_dir='generated_songs',
+                 output_format='wav'):
+        super().__init__(output_dir, output_format)
+        self.latency = latency
+        self.realtime_factor = realtime_factor
+        self.sample_rate = sample_rate
+        self._machines = {}
+        self._machines_lock = threading.Lock()
+
+    def _generate_uncached(self, prompt, settings, style_hint=None, seed=None, progress=None):
+        from audio_writer import open_writer, output_path
+
+        duration = settings[0]
+        model_time = self.latency + self.realtime_factor * duration
+        if progress is None:
+            time.sleep(model_time)
+        else:
+            for step in range(1, FAKE_PROGRESS_STEPS + 1):
+                time.sleep(model_time / FAKE_PROGRESS_STEPS)
+                progress(step / FAKE_PROGRESS_STEPS)
+
+        machine = self._machine(0 if seed is None else seed)
+        params = machine.processor.parse_prompt(prompt, rng=random.Random(f"{seed}:{prompt}"))
+        bar_seconds = 60.0 / params['bpm'] * 4
+        params = params.replace(bars=max(1, math.ceil(duration / bar_seconds)))
+
+        filename = output_path(self._output_path(prompt, style_hint), self.output_format)
+        remaining = int(duration * self.sample_rate)
+        with open_writer(filename, self.sample_rate, output_format=self.output_format,
+                         scale=16383 * params['volume']) as wav:
+            for block in machine.stream_parametric_beat(params):
+                wav.write(block[:remaining])
+                remaining -= len(block)
+                if remaining <= 0:
+                    break
+
+        return self._song_info(filename, prompt, duration, style_hint, seed)
+
+    def _machine(self, seed):
+        """One drum machine per seed, since the seed picks the noise its voices use"""
+        from ai_beat_generator import SmartDrumMachine
+
+        with self._machines_lock:
+            machine = self._machines.get(seed)
+            if machine is None:
+                machine = self._machines[seed] = SmartDrumMachine(self.sample_rate, seed=seed)
+            return machine
+
+    def get_model_info(self):
+        return {
+            "status": "Model loaded",
+            "device": "cpu",
+            "sample_rate": self.sample_rate,
+            "model_name": "Fake (SmartDrumMachine)",
+            "latency": self.latency,
+            "realtime_factor": self.realtime_factor,
+            "output_format": self.output_format,
+            "cache": self.cache.stats()
+        }
+
+
+def create_backend(name=None):
+    """Build the generation backend named by ``name`` or ``$GENERATION_BACKEND``.
+
+    ``musicgen`` (the default) is ``FullSongGenerator``, batching up to
+    ``$GENERATION_MAX_BATCH`` requests for at most ``$GENERATION_MAX_WAIT``
+    seconds. On CPU, ``$MUSICGEN_THREADS`` and ``$MUSICGEN_INTEROP_THREADS``
+    size torch's thread pools and ``MUSICGEN_QUANTIZE=1`` runs the language
+    model with dynamic int8 Linear layers. ``fake`` is ``FakeBackend`` with
+    ``$FAKE_GENERATION_LATENCY`` seconds per song plus ``$FAKE_GENERATION_RTF``
+    seconds per second of audio. Either writes songs as ``$SONG_FORMAT``
+    (wav, the default, flac or opus).
+    """
+    name = name or os.environ.get('GENERATION_BACKEND', 'musicgen')
+    output_format = os.environ.get('SONG_FORMAT', 'wav')
+    if name == 'musicgen':
+        # Imported here so torch and audiocraft only load when MusicGen is used
+        from full_song_generator import FullSongGenerator
+        return FullSongGenerator(
+            max_batch_size=int(os.environ.get('GENERATION_MAX_BATCH', 4)),
+            max_batch_wait=float(os.environ.get('GENERATION_MAX_WAIT', 0.5)),
+            intra_op_threads=int(os.environ.get('MUSICGEN_THREADS', 0)) or None,
+            inter_op_threads=int(os.environ.get('MUSICGEN_INTEROP_THREADS', 0)) or None,
+            quantize=os.environ.get('MUSICGEN_QUANTIZE', '0') not in ('0', '', 'false'),
+            output_format=output_format
+        )
+    if name == 'fake':
+        return FakeBackend(latency=float(os.environ.get('FAKE_GENERATION_LATENCY', 0)),
+                           realtime_factor=float(os.environ.get('FAKE_GENERATION_RTF', 0)),
+                           output_format=output_format)
+    raise ValueError(f"Unknown generation backend {name!r}, expected one of {BACKENDS}")
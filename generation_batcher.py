@@ -0,0 +1,112 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class GenerationBatcher:
+    """Groups concurrent generation requests into batched model calls.
+
+    Requests are grouped by a key (duration and sampling parameters). A
+    group is dispatched once it holds ``max_batch_size`` requests or its
+    oldest request has waited ``max_wait`` seconds, whichever comes first.
+    ``generate_batch(key, items)`` runs on a single dispatcher thread and
+    must return one result per item, in order.
+    """
+
+    def __init__(self, generate_batch, max_batch_size=4, max_wait=0.5):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.batches_run = 0
+        self.items_run = 0
+        self._groups = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._dispatch_loop, name='generation-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, key, item):
+        """Queue ``item`` under ``key`` and return a Future for its result"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {'since': time.monotonic(), 'requests': []}
+            group['requests'].append((item, future))
+            self._cond.notify()
+        return future
+
+    def generate(self, key, item):
+        """Submit ``item`` and block until its batch has run"""
+        return self.submit(key, item).result()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': sum(len(group['requests']) for group in self._groups.values()),
+                'batches_run': self.batches_run,
+                'items_run': self.items_run,
+                'average_batch_size': self.items_run / self.batches_run if self.batches_run else 0.0
+            }
+
+    def close(self):
+        """Stop accepting requests; pending ones are still generated"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _next_batch(self):
+        """Wait for the oldest group to fill up or time out, then take a batch from it"""
+        with self._cond:
+            while True:
+                if not self._groups:
+                    if self._closed:
+                        return None, None
+                    self._cond.wait()
+                    continue
+
+                key, group = next(iter(self._groups.items()))
+                remaining = group['since'] + self.max_wait - time.monotonic()
+                if len(group['requests']) >= self.max_batch_size or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            batch = group['requests'][:self.max_batch_size]
+            del group['requests'][:self.max_batch_size]
+            if group['requests']:
+                # Leftovers start a fresh wait window at the back of the line
+                group['since'] = time.monotonic()
+                self._groups.move_to_end(key)
+            else:
+                del self._groups[key]
+            return key, batch
+
+    def _dispatch_loop(self):
+        while True:
+            key, batch = self._next_batch()
+            if batch is None:
+                return
+
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.generate_batch(key, items))
+                if len(results) != len(batch):
+                    # Results can't be matched to items, so none of them is trusted
+                    raise RuntimeError(f"generate_batch returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                traceback.print_exc()
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._cond:
+                self.batches_run += 1
+                self.items_run += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+
+
+class GenerationCache:
+    """Content-addressed cache of generated songs with in-flight coalescing.
+
+    Results are stored as small JSON records named after a hash of
+    everything that determines the audio (prompt, duration, sampling
+    parameters, seed and model). A record is only trusted while the audio
+    file it points to still exists. Identical requests that arrive while a
+    generation is running wait for that generation instead of starting
+    their own. Results that did not come from running ``generate`` this
+    call (cache hits and joined generations) are copies marked
+    ``'cached': True``, so callers can tell songs they already announced.
+    """
+
+    def __init__(self, cache_dir='generated_songs/.cache'):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.joins = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(**fields):
+        """Stable hash of the fields that determine a generation"""
+        payload = json.dumps(fields, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_or_generate(self, key, generate):
+        """Return the cached result for ``key`` or run ``generate()`` once for it"""
+        with self._lock:
+            result = self._load(key)
+            if result is not None:
+                self.hits += 1
+                return dict(result, cached=True)
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.joins += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+                owner = True
+
+        if not owner:
+            return dict(future.result(), cached=True)
+
+        try:
+            try:
+                result = generate()
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            # Waiters get the song before it is saved, so a failed save can't strand them
+            future.set_result(result)
+            try:
+                self._save(key, result)
+            except OSError as e:
+                # The song is fine; it just won't be served from the cache next time
+                print(f"⚠️ Could not cache generation {key[:12]}: {e}")
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'joins': self.joins,
+                'in_flight': len(self._in_flight)
+            }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # The song may have been deleted from disk since it was cached
+        if not os.path.exists(result.get('filename', '')):
+            return None
+        return result
+
+    def _save(self, key, result):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,149 @@
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting for a worker"""
+
+
+class JobManager:
+    """Runs long generation jobs on a bounded pool of background workers.
+
+    Jobs move through ``queued`` -> ``running`` -> ``done`` or ``failed``.
+    Finished jobs are kept (up to ``max_finished``) so clients can still
+    poll for their result after completion. Running jobs can report their
+    ``progress`` from 0 to 1. If ``listener`` is given it is called with a
+    job snapshot whenever a job's status, queue position or progress
+    changes.
+    """
+
+    def __init__(self, max_workers=1, max_pending=16, max_finished=200, listener=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.listener = listener
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='generation')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def submit(self, func, *args, metadata=None, **kwargs):
+        """Queue ``func(*args, **kwargs)`` and return a snapshot of the new job"""
+        with self._lock:
+            if self._count('queued') >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} jobs are already waiting")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'metadata': metadata or {},
+                'created': datetime.now().isoformat(),
+                'started': None,
+                'finished': None,
+                'progress': None,
+                'result': None,
+                'error': None
+            }
+            self._prune()
+
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        self._notify([job_id])
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Snapshot of a job including its queue position, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            snapshot = dict(job)
+            snapshot['queue_position'] = self._queue_position(job_id)
+            return snapshot
+
+    def stats(self):
+        """Job counts by status"""
+        with self._lock:
+            return {status: self._count(status) for status in ('queued', 'running', 'done', 'failed')}
+
+    def progress_callback(self):
+        """Callback taking the progress (0 to 1) of the job running on this thread.
+
+        The callback itself may be called from any thread, e.g. the one
+        that runs a batched model call. Outside a job this returns None.
+        """
+        job_id = getattr(self._local, 'job_id', None)
+        if job_id is None:
+            return None
+        return lambda fraction: self.set_progress(job_id, fraction)
+
+    def set_progress(self, job_id, fraction):
+        fraction = min(max(fraction, 0.0), 1.0)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != 'running':
+                return
+            # Model callbacks fire once per token; whole percents are plenty for listeners
+            if int(fraction * 100) <= int((job['progress'] or 0.0) * 100):
+                return
+            job['progress'] = fraction
+        self._notify([job_id])
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id, func, args, kwargs):
+        self._update(job_id, status='running', started=datetime.now().isoformat(), progress=0.0)
+        # Everything still queued moved up a place
+        with self._lock:
+            queued = [other_id for other_id, job in self._jobs.items() if job['status'] == 'queued']
+        self._notify([job_id] + queued)
+
+        self._local.job_id = job_id
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            traceback.print_exc()
+            self._update(job_id, status='failed', error=str(e), finished=datetime.now().isoformat())
+        else:
+            self._update(job_id, status='done', result=result, progress=1.0, finished=datetime.now().isoformat())
+        finally:
+            self._local.job_id = None
+        self._notify([job_id])
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _notify(self, job_ids):
+        if self.listener is None:
+            return
+        for job_id in job_ids:
+            snapshot = self.get(job_id)
+            if snapshot is not None:
+                self.listener(snapshot)
+
+    def _count(self, status):
+        return sum(1 for job in self._jobs.values() if job['status'] == status)
+
+    def _queue_position(self, job_id):
+        """1-based position among queued jobs, 0 once the job has started"""
+        position = 0
+        for other_id, job in self._jobs.items():
+            if job['status'] == 'queued':
+                position += 1
+            if other_id == job_id:
+                return position if job['status'] == 'queued' else 0
+        return 0
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``max_finished``"""
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
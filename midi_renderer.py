@@ -0,0 +1,76 @@
+"""Render drum MIDI files with the project's kick, snare and hi-hat voices.
+
+The inverse of ``EnhancedAIDaw.export_to_midi``. A file's drum notes are
+read into start/pitch/velocity arrays once, mapped onto voices through a
+128-entry lookup table and converted to an event array in bulk, then mixed
+by ``render_events`` in a single call. Velocity scales each hit's gain.
+"""
+import numpy as np
+
+from beat_renderer import make_events, render_events
+from drum_patterns import GM_DRUM_NOTES, HIHAT, KICK, SNARE
+from metrics import timed
+
+# General MIDI percussion notes and the voice that plays them; other notes are skipped
+NOTE_VOICES = {
+    **{note: voice_id for voice_id, note in enumerate(GM_DRUM_NOTES)},
+    35: KICK,    # acoustic bass drum
+    37: SNARE,   # side stick
+    39: SNARE,   # hand clap
+    40: SNARE,   # electric snare
+    44: HIHAT,   # pedal hi-hat
+    46: HIHAT,   # open hi-hat
+}
+
+
+def voice_table(note_voices=NOTE_VOICES):
+    """Voice id for each of the 128 MIDI notes, -1 for notes that have none"""
+    table = np.full(128, -1, dtype=np.int32)
+    for note, voice_id in note_voices.items():
+        table[note] = voice_id
+    return table
+
+
+def load_midi(midi):
+    """``midi`` as a ``PrettyMIDI``, loading it first if it is a path"""
+    import pretty_midi
+
+    return midi if isinstance(midi, pretty_midi.PrettyMIDI) else pretty_midi.PrettyMIDI(midi)
+
+
+def read_notes(midi):
+    """Start times (seconds), pitches and velocities of every drum note in ``midi``, by start time"""
+    notes = [(note.start, note.pitch, note.velocity)
+             for instrument in load_midi(midi).instruments if instrument.is_drum
+             for note in instrument.notes]
+    table = np.array(notes, dtype=np.float64).reshape(-1, 3)
+    order = np.argsort(table[:, 0], kind='stable')
+    table = table[order]
+    return table[:, 0], table[:, 1].astype(np.int64), table[:, 2].astype(np.int64)
+
+
+def midi_events(midi, sample_rate, note_voices=NOTE_VOICES):
+    """Event array for the drum notes of ``midi`` that map to a voice; gain is velocity / 127"""
+    starts, pitches, velocities = read_notes(midi)
+    voice_ids = voice_table(note_voices)[pitches]
+    mapped = voice_ids >= 0
+    onsets = np.rint(starts[mapped] * sample_rate).astype(np.int64)
+    return make_events(onsets, voice_ids[mapped], velocities[mapped] / 127.0)
+
+
+def render_midi(midi, voices, sample_rate, total_samples=None, note_voices=NOTE_VOICES, dtype=None, stems=False):
+    """Mix the drum notes of ``midi`` (a path or ``PrettyMIDI``) with ``voices``.
+
+    ``voices`` are the kick, snare and hi-hat one-shots, in voice id order.
+    By default the buffer runs until the last hit has rung out; pass
+    ``total_samples`` to match the length of another render, in which case
+    hits that would run past the end are skipped just as ``render_events``
+    skips them. ``dtype`` and ``stems`` are passed on to ``render_events``.
+    """
+    with timed('midi_parse'):
+        events = midi_events(midi, sample_rate, note_voices)
+    if total_samples is None:
+        lengths = np.array([len(voice) for voice in voices], dtype=np.int64)
+        # One past the last sample, since render_events drops hits that touch the end
+        total_samples = int((events['onset'] + lengths[events['voice']]).max()) + 1 if len(events) else 0
+    return render_events(events, voices, total_samples, dtype=dtype, stems=stems)
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+# 2**18 samples is ~6 seconds at 44.1 kHz, longer than any noise one-shot
+DEFAULT_BANK_SIZE = 1 << 18
+DEFAULT_SEED = 0
+
+
+class NoiseBank:
+    """Seeded Gaussian noise for percussion synthesis, read from precomputed banks.
+
+    Each ``key`` (the voice and whatever shapes it) has its own bank of
+    standard normal samples, drawn once from a child of ``seed`` derived
+    from a hash of the key. The same seed and key always give the same
+    noise, on any thread and in any order, and different keys never share
+    samples. Requests without a key read a window of one shared bank at a
+    random offset, picked by a per-thread ``np.random.Generator`` so
+    threads never share RNG state.
+    """
+
+    def __init__(self, seed=DEFAULT_SEED, bank_size=DEFAULT_BANK_SIZE):
+        self._seed_sequence = np.random.SeedSequence(seed)
+        # Keep the resolved entropy so an unseeded bank can still be reproduced
+        self.seed = self._seed_sequence.entropy
+        self.bank_size = bank_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Spawned first, so the shared bank is the same however many threads ask for noise
+        self._shared_seed, = self._seed_sequence.spawn(1)
+        self._shared_bank = None
+        self._key_banks = {}
+
+    def generator(self):
+        """This thread's own Generator, spawned from the bank's seed"""
+        rng = getattr(self._local, 'rng', None)
+        if rng is None:
+            with self._lock:
+                child, = self._seed_sequence.spawn(1)
+            rng = self._local.rng = np.random.default_rng(child)
+        return rng
+
+    def normal(self, size, scale=1.0, key=None, dtype=np.float64):
+        """``size`` samples of zero-mean Gaussian noise with standard deviation ``scale``.
+
+        Noise for the same ``key`` is identical every time. Without a key
+        the window is picked at random.
+        """
+        if key is not None:
+            return np.multiply(self._key_bank(key, size)[:size], scale, dtype=dtype)
+
+        if size > self.bank_size:
+            # Too long for the bank - draw it directly
+            noise = self.generator().standard_normal(size, dtype=dtype)
+            noise *= scale
+            return noise
+
+        offset = int(self.generator().integers(self.bank_size - size + 1))
+        return np.multiply(self.shared_bank()[offset:offset + size], scale, dtype=dtype)
+
+    def shared_bank(self):
+        """The bank unkeyed requests read from, drawn on first use"""
+        with self._lock:
+            if self._shared_bank is None:
+                self._shared_bank = self._draw(self._shared_seed, self.bank_size)
+            return self._shared_bank
+
+    def _key_bank(self, key, size):
+        """At least ``size`` samples of the bank for ``key``"""
+        with self._lock:
+            bank = self._key_banks.get(key)
+        if bank is not None and len(bank) >= size:
+            return bank
+
+        # A longer draw from the same seed starts with the shorter one, so growing keeps old windows
+        digest = hashlib.sha256(repr(key).encode('utf-8')).digest()
+        words = np.frombuffer(digest[:16], dtype='<u4').tolist()
+        bank = self._draw(np.random.SeedSequence(self.seed, spawn_key=words), size)
+        with self._lock:
+            current = self._key_banks.get(key)
+            if current is None or len(current) < size:
+                self._key_banks[key] = bank
+        return bank
+
+    @staticmethod
+    def _draw(seed_sequence, size):
+        bank = np.random.default_rng(seed_sequence).standard_normal(size)
+        bank.setflags(write=False)
+        return bank
+
+
+_default_bank = None
+_default_bank_lock = threading.Lock()
+
+
+def get_default_noise_bank():
+    """Process-wide noise bank shared by all drum machines.
+
+    The seed comes from ``BEATBOX_NOISE_SEED`` (default 0), so voices
+    persisted by the voice cache stay valid across restarts.
+    """
+    global _default_bank
+    with _default_bank_lock:
+        if _default_bank is None:
+            _default_bank = NoiseBank(int(os.environ.get('BEATBOX_NOISE_SEED', DEFAULT_SEED)))
+        return _default_bank
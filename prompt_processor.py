@@ -1,8 +1,118 @@
 import re
 import random
+from collections.abc import Mapping
+from functools import lru_cache
+
+from metrics import timed_calls
+
+DEFAULT_PARAMS = {
+    'genre': 'trap',  # default
+    'bpm': 140,
+    'bars': 4,
+    'mood': 'neutral',
+    'kick_pattern': 'standard',
+    'hihat_style': 'standard',
+    'bass_boost': 1.0,
+    'distortion': 0.3,
+    'volume': 1.0
+}
+
+# Only set by some mood keywords; absent from the params otherwise
+OPTIONAL_PARAMS = ('minor_key', 'melody', 'harmony')
+
+# Instrument phrase -> the parameter it sets and its value, applied in order
+INSTRUMENT_KEYWORDS = {
+    'heavy 808': ('bass_boost', 1.8),
+    'heavy bass': ('bass_boost', 1.8),
+    'fast hi-hat': ('hihat_style', 'rapid'),
+    'rapid hi-hat': ('hihat_style', 'rapid'),
+    'punchy kick': ('kick_pattern', 'punchy'),
+}
+
+
+FIELDS = tuple(DEFAULT_PARAMS) + OPTIONAL_PARAMS
+
+
+class BeatParams(Mapping):
+    """Immutable, hashable musical parameters parsed from a prompt.
+
+    Reads like the dict the parser used to return - ``params['bpm']``,
+    ``params.get('volume')``, ``dict(params)`` - and can be used directly
+    as a cache key. Optional parameters that were never set are left out.
+    """
+    __slots__ = ('_values',)
+
+    def __init__(self, **values):
+        unknown = values.keys() - set(FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown beat parameters: {', '.join(sorted(unknown))}")
+        values = {**DEFAULT_PARAMS, **values}
+        object.__setattr__(self, '_values', tuple(map(values.get, FIELDS)))
+
+    @classmethod
+    def _make(cls, values):
+        """Build from a tuple of values in ``FIELDS`` order, skipping validation"""
+        params = object.__new__(cls)
+        object.__setattr__(params, '_values', values)
+        return params
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BeatParams is immutable; use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError("BeatParams is immutable")
+
+    def __getitem__(self, key):
+        index = _FIELD_INDEX.get(key)
+        value = None if index is None else self._values[index]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (name for name, value in zip(FIELDS, self._values) if value is not None)
+
+    def __len__(self):
+        return sum(value is not None for value in self._values)
+
+    def __hash__(self):
+        return hash(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, BeatParams):
+            return self._values == other._values
+        return Mapping.__eq__(self, other)
+
+    def __reduce__(self):
+        return (BeatParams._make, (self._values,))
+
+    def __repr__(self):
+        return f"BeatParams({', '.join(f'{name}={value!r}' for name, value in self.items())})"
+
+    def replace(self, **changes):
+        """Copy with some parameters changed"""
+        return BeatParams(**{**self.to_dict(), **changes})
+
+    def to_dict(self):
+        """Plain dict, e.g. for JSON"""
+        return dict(self.items())
+
+
+_FIELD_INDEX = {name: index for index, name in enumerate(FIELDS)}
+
+
+def _field(index):
+    return property(lambda params: params._values[index])
+
+
+# params.bpm, params.genre, ... (None for optional parameters that weren't set)
+for _index, _name in enumerate(FIELDS):
+    setattr(BeatParams, _name, _field(_index))
+del _index, _name
+
 
 class PromptProcessor:
-    def __init__(self):
+    def __init__(self, scan_cache_size=4096):
         # Define genre keywords and their characteristics
         self.genre_patterns = {
             'trap': {
@@ -50,69 +160,121 @@ class PromptProcessor:
             'heavy': {'bass_boost': 1.5, 'distortion': 0.7},
             'melodic': {'melody': True, 'harmony': True}
         }
+        
+        self._compile()
+        # Scanning and the parameters it implies are deterministic, so
+        # repeated prompts reuse them; random tempos are still drawn fresh
+        # on every parse
+        self._scan = lru_cache(maxsize=scan_cache_size)(self._scan_uncached)
+        self._plan = lru_cache(maxsize=1024)(self._plan_uncached)
+
+    def _compile(self):
+        """Compile every keyword and the BPM/bar counts into one matcher.
 
-    def parse_prompt(self, prompt):
+        The matcher looks ahead at every position, so matches may overlap
+        and every keyword found with a substring test is found here too
+        ('softrap' holds both 'soft' and 'trap'). Where several keywords
+        start at the same position the longest wins and implies the ones
+        inside it ('heavy 808' implies 'heavy').
+        """
+        keywords = set(self.genre_patterns) | set(self.tempo_keywords) | set(self.mood_keywords)
+        keywords |= set(INSTRUMENT_KEYWORDS)
+        
+        ordered = sorted(keywords, key=len, reverse=True)
+        self._implied = {keyword: frozenset(other for other in keywords if other in keyword)
+                         for keyword in ordered}
+        
+        # Keywords first, then "<n> bpm" and "<n> bar"
+        alternatives = '|'.join(re.escape(keyword) for keyword in ordered) + r'|\d+\s*b(?:pm|ar)'
+        self._matcher = re.compile(f"(?=({alternatives}))")
+    
+    def _scan_uncached(self, prompt_lower):
+        """Keywords present in a lowercased prompt, plus its first BPM and bar counts"""
+        found = set()
+        bpm = bars = None
+        implied = self._implied
+        for token in self._matcher.findall(prompt_lower):
+            keywords = implied.get(token)
+            if keywords is not None:
+                found |= keywords
+            elif token.endswith('bpm'):
+                if bpm is None:
+                    bpm = int(token[:-3])
+            elif bars is None:
+                bars = int(token[:-3])
+        return frozenset(found), bpm, bars
+    
+    @timed_calls('prompt_parse')
+    def parse_prompt(self, prompt, rng=None):
         """
-        Parse a natural language prompt into musical parameters
+        Parse a natural language prompt into musical parameters.
+        
+        Tempos the prompt leaves open are drawn from ``rng`` (a
+        ``random.Random``), or from the ``random`` module by default.
         """
-        prompt_lower = prompt.lower()
+        rng = rng or random
+        found, bpm, bars = self._scan(prompt.lower())
+        values, genre_bpm_range, tempo_bpm_range = self._plan(found)
+        
+        # Random tempos are drawn in the same order as ever, so seeded runs reproduce
+        drawn_bpm = None
+        if genre_bpm_range:
+            drawn_bpm = rng.randint(*genre_bpm_range)
+        if bpm is None and tempo_bpm_range:
+            drawn_bpm = rng.randint(*tempo_bpm_range)
+        if bpm is None:
+            bpm = drawn_bpm
         
+        if bpm is not None or bars is not None:
+            values = list(values)
+            if bpm is not None:
+                values[_FIELD_INDEX['bpm']] = bpm
+            if bars is not None:
+                values[_FIELD_INDEX['bars']] = bars
+            values = tuple(values)
+        return BeatParams._make(values)
+    
+    def _plan_uncached(self, found):
+        """Parameter values for a set of keywords, plus the BPM ranges to draw from.
+        
+        Returns ``(values, genre_bpm_range, tempo_bpm_range)`` with the values
+        in ``FIELDS`` order; either range is None when no keyword asks for it.
+        """
         # Initialize default parameters
-        params = {
-            'genre': 'trap',  # default
-            'bpm': 140,
-            'bars': 4,
-            'mood': 'neutral',
-            'kick_pattern': 'standard',
-            'hihat_style': 'standard',
-            'bass_boost': 1.0,
-            'distortion': 0.3,
-            'volume': 1.0
-        }
+        params = dict(DEFAULT_PARAMS)
         
         # Extract genre
+        genre_bpm_range = None
         for genre, characteristics in self.genre_patterns.items():
-            if genre in prompt_lower:
+            if genre in found:
                 params['genre'] = genre
-                params['bpm'] = random.randint(*characteristics['bpm_range'])
+                genre_bpm_range = characteristics['bpm_range']
                 params['kick_pattern'] = characteristics['kick_pattern']
                 params['hihat_style'] = characteristics['hihat_style']
                 params['mood'] = characteristics['mood']
                 break
         
-        # Extract specific tempo mentions
-        bpm_match = re.search(r'(\d+)\s*bpm', prompt_lower)
-        if bpm_match:
-            params['bpm'] = int(bpm_match.group(1))
-        else:
-            # Check for tempo keywords
-            for tempo_word, (min_bpm, max_bpm) in self.tempo_keywords.items():
-                if tempo_word in prompt_lower:
-                    params['bpm'] = random.randint(min_bpm, max_bpm)
-                    break
+        # Tempo keywords, used when the prompt gives no explicit BPM
+        tempo_bpm_range = next((bpm_range for tempo_word, bpm_range in self.tempo_keywords.items()
+                                if tempo_word in found), None)
         
         # Extract mood characteristics
         for mood, characteristics in self.mood_keywords.items():
-            if mood in prompt_lower:
+            if mood in found:
                 params['mood'] = mood
                 params.update(characteristics)
         
         # Extract specific instrument mentions
-        if 'heavy 808' in prompt_lower or 'heavy bass' in prompt_lower:
-            params['bass_boost'] = 1.8
-        
-        if 'fast hi-hat' in prompt_lower or 'rapid hi-hat' in prompt_lower:
-            params['hihat_style'] = 'rapid'
-        
-        if 'punchy kick' in prompt_lower:
-            params['kick_pattern'] = 'punchy'
+        for keyword, (name, value) in INSTRUMENT_KEYWORDS.items():
+            if keyword in found:
+                params[name] = value
         
-        # Extract length
-        bars_match = re.search(r'(\d+)\s*bar', prompt_lower)
-        if bars_match:
-            params['bars'] = int(bars_match.group(1))
-        
-        return params
+        return tuple(map(params.get, FIELDS)), genre_bpm_range, tempo_bpm_range
+    
+    def parse_many(self, prompts, rng=None):
+        """Parse a batch of prompts; repeats only cost a cache lookup"""
+        parse = self.parse_prompt
+        return [parse(prompt, rng) for prompt in prompts]
 
     def generate_description(self, params):
         """
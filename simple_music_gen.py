@@ -1,7 +1,4 @@
-import torch 
 import numpy as np 
-from scipy.io import wavfile 
-import matplotlib.pyplot as plt 
  
 print("Creating simple beat generator...") 
  
@@ -0,0 +1,176 @@
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from audio_writer import OUTPUT_FORMATS
+
+COLUMNS = ('basename', 'filename', 'prompt', 'style', 'duration', 'file_size', 'timestamp')
+
+# Output names are "<style>_<date>_<time>[_<suffix>]" or "song_<prompt>_<date>_<time>[_<suffix>]"
+SONG_NAME = re.compile(r'^(?P<stem>.+?)_(?P<stamp>\d{8}_\d{6})(?:_[0-9a-f]{6})?\.\w+$')
+
+SONG_EXTENSIONS = tuple(extension for extension, *_ in OUTPUT_FORMATS.values())
+
+# Audio that isn't a finished song: what a failed long-form run kept, and writer temp files
+TEMPORARY_SUFFIXES = ('.partial', '.tmp')
+
+
+def is_song_file(basename):
+    """Whether ``basename`` names a finished song rather than a hidden or temporary file"""
+    stem, extension = os.path.splitext(basename)
+    return (not basename.startswith('.') and extension in SONG_EXTENSIONS
+            and not stem.endswith(TEMPORARY_SUFFIXES))
+
+
+class SongIndex:
+    """Generated songs, newest first, in a SQLite database next to them.
+
+    The index survives restarts and is shared by every worker process that
+    serves the same ``songs_dir``. ``rebuild`` reconciles it with the audio
+    files on disk, taking metadata from the generation cache where it can
+    and from the file name otherwise. Pages are keyed by a cursor (the id
+    of the last song on the previous page), so they stay stable while new
+    songs arrive.
+    """
+
+    def __init__(self, songs_dir='generated_songs', db_name='.songs.sqlite3'):
+        self.songs_dir = songs_dir
+        os.makedirs(songs_dir, exist_ok=True)
+        self.db_path = os.path.join(songs_dir, db_name)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            # WAL lets other processes read while one writes
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS songs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                basename TEXT UNIQUE NOT NULL,
+                filename TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                style TEXT NOT NULL,
+                duration REAL,
+                file_size INTEGER NOT NULL,
+                timestamp TEXT NOT NULL
+            )''')
+
+    def add(self, song):
+        """Record ``song`` and return it with its id.
+
+        A song already recorded under the same basename is updated in place
+        and keeps its id, so it keeps its position in the pages. Hidden and
+        temporary files (see ``is_song_file``) are not recorded, and give None.
+        """
+        if not is_song_file(song['basename']):
+            return None
+        values = tuple(song.get(column) for column in COLUMNS)
+        updates = ', '.join(f"{column} = excluded.{column}" for column in COLUMNS[1:])
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT INTO songs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+                f"ON CONFLICT(basename) DO UPDATE SET {updates}", values)
+            song_id = self._db.execute('SELECT id FROM songs WHERE basename = ?', (values[0],)).fetchone()[0]
+        return dict(zip(COLUMNS, values), id=song_id)
+
+    def page(self, limit=50, cursor=None):
+        """Up to ``limit`` songs older than ``cursor``, newest first, and the cursor for the next page"""
+        with self._lock:
+            if cursor is None:
+                rows = self._db.execute('SELECT * FROM songs ORDER BY id DESC LIMIT ?', (limit + 1,)).fetchall()
+            else:
+                rows = self._db.execute('SELECT * FROM songs WHERE id < ? ORDER BY id DESC LIMIT ?',
+                                        (cursor, limit + 1)).fetchall()
+        songs = [dict(row) for row in rows[:limit]]
+        return songs, (songs[-1]['id'] if len(rows) > limit else None)
+
+    def version(self):
+        """Changes whenever a song is added or removed, or re-added with a newer timestamp"""
+        with self._lock:
+            newest, count, latest = self._db.execute(
+                'SELECT MAX(id), COUNT(*), MAX(timestamp) FROM songs').fetchone()
+        return f"{newest or 0}-{count}-{latest or ''}"
+
+    def count(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM songs').fetchone()[0]
+
+    def rebuild(self):
+        """Index audio files missing from the index and drop entries whose file is gone.
+
+        Partial and temporary files are left out, and dropped if an older
+        version indexed them.
+        """
+        on_disk = {os.path.basename(path): path
+                   for extension in SONG_EXTENSIONS
+                   for path in glob.glob(os.path.join(self.songs_dir, f'*{extension}'))
+                   if is_song_file(os.path.basename(path))}
+        with self._lock:
+            indexed = {row[0] for row in self._db.execute('SELECT basename FROM songs')}
+
+        gone = indexed - set(on_disk)
+        if gone:
+            with self._lock, self._db:
+                self._db.executemany('DELETE FROM songs WHERE basename = ?', [(name,) for name in gone])
+
+        cached = self._cached_metadata()
+        missing = [name for name in on_disk if name not in indexed]
+        # Oldest first, so ids follow creation order like songs added live
+        missing.sort(key=lambda name: os.path.getmtime(on_disk[name]))
+        for name in missing:
+            self.add(self._describe(on_disk[name], cached.get(name, {})))
+        return len(missing), len(gone)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _cached_metadata(self):
+        """Song descriptions from the generation cache, by basename"""
+        songs = {}
+        for path in glob.glob(os.path.join(self.songs_dir, '.cache', '*.json')):
+            try:
+                with open(path) as f:
+                    song = json.load(f)
+                songs[song['basename']] = song
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        return songs
+
+    def _describe(self, path, cached):
+        """Index entry for a file on disk"""
+        basename = os.path.basename(path)
+        stat = os.stat(path)
+        timestamp = datetime.fromtimestamp(stat.st_mtime)
+        style, prompt = 'custom', ''
+
+        match = SONG_NAME.match(basename)
+        if match:
+            timestamp = datetime.strptime(match['stamp'], '%Y%m%d_%H%M%S')
+            stem = match['stem']
+            if stem.startswith('song_'):
+                prompt = stem[len('song_'):].replace('_', ' ')
+            else:
+                style = stem
+
+        return {
+            'basename': basename,
+            'filename': path,
+            'prompt': cached.get('prompt', prompt),
+            'style': cached.get('style', style),
+            'duration': cached.get('duration', self._duration(path)),
+            'file_size': stat.st_size,
+            'timestamp': timestamp.isoformat()
+        }
+
+    @staticmethod
+    def _duration(path):
+        import soundfile as sf
+
+        try:
+            return round(sf.info(path).duration, 2)
+        except (RuntimeError, OSError):
+            return None
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from ai_beat_generator import SmartDrumMachine
+from audio_effects import compress, lowpass, normalize, preemphasis
+from voice_cache import VoiceCache
+
+SAMPLE_RATE = 22050
+
+PARAMS = {
+    'genre': 'boom bap', 'bpm': 90, 'bars': 2, 'mood': 'neutral', 'kick_pattern': 'punchy',
+    'hihat_style': 'simple', 'bass_boost': 1.0, 'distortion': 0.3, 'volume': 1.0
+}
+
+
+def beat():
+    """A rendered beat in float64 and the float32 copy the effects chain sees"""
+    machine = SmartDrumMachine(sample_rate=SAMPLE_RATE, voice_cache=VoiceCache(), seed=5, dtype=np.float64)
+    audio = machine.create_parametric_beat(PARAMS)
+    return audio, audio.astype(np.float32)
+
+
+def reference_compress(samples, sample_rate, threshold_db=-20.0, ratio=4.0, attack_ms=5.0, release_ms=50.0,
+                       block_size=64):
+    """The compressor written out block by block, in float64"""
+    window = max(1, int(sample_rate * attack_ms / 1000))
+    block_seconds = block_size / sample_rate
+    attack = 1 - np.exp(-block_seconds / (attack_ms / 1000))
+    release = 1 - np.exp(-block_seconds / (release_ms / 1000))
+
+    ends, gains, current = [], [], 0.0
+    for end in range(block_size, len(samples) + block_size, block_size):
+        end = min(end, len(samples))
+        level = np.sqrt(np.mean(samples[max(end - window, 0):end] ** 2))
+        over_db = 20 * np.log10(max(level, 1e-12) / 10 ** (threshold_db / 20))
+        target = (1 - 1 / ratio) * max(over_db, 0.0)
+        current += (target - current) * (attack if target > current else release)
+        ends.append(end - 1)
+        gains.append(10 ** (-current / 20))
+
+    return samples * np.interp(np.arange(len(samples)), ends, gains)
+
+
+def test_preemphasis_matches_librosa():
+    librosa = pytest.importorskip('librosa')
+    audio, audio32 = beat()
+    np.testing.assert_allclose(preemphasis(audio32), librosa.effects.preemphasis(audio), rtol=1e-4, atol=1e-5)
+    assert np.array_equal(preemphasis(audio), librosa.effects.preemphasis(audio))
+
+
+def test_compress_matches_the_float64_reference():
+    audio, audio32 = beat()
+    expected = reference_compress(audio, SAMPLE_RATE)
+    assert np.abs(expected).max() < 0.75 * np.abs(audio).max()  # the beat is loud enough to compress
+
+    compressed = compress(audio32, SAMPLE_RATE)
+    assert compressed.dtype == np.float32
+    np.testing.assert_allclose(compressed, expected, rtol=1e-4, atol=1e-5)
+
+    in_place = audio32.copy()
+    assert compress(in_place, SAMPLE_RATE, out=in_place) is in_place
+    assert np.array_equal(in_place, compressed)
+
+
+def test_lowpass_matches_the_float64_transfer_function():
+    from scipy.signal import butter, lfilter
+
+    audio, audio32 = beat()
+    for order in (1, 2, 4):
+        b, a = butter(order, 8000, btype='lowpass', fs=SAMPLE_RATE)
+        filtered = lowpass(audio32, SAMPLE_RATE, 8000, order=order)
+        assert filtered.dtype == np.float32
+        np.testing.assert_allclose(filtered, lfilter(b, a, audio), rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize('mode', ['peak', 'rms'])
+def test_normalize_matches_float64_scaling(mode):
+    audio, audio32 = beat()
+    level = np.abs(audio).max() if mode == 'peak' else np.sqrt(np.mean(audio ** 2))
+    expected = audio * 10 ** (-3.0 / 20) / level
+
+    normalized = normalize(audio32, -3.0, mode=mode)
+    assert normalized.dtype == np.float32
+    np.testing.assert_allclose(normalized, expected, rtol=1e-4, atol=1e-5)
+    assert np.array_equal(normalize(np.zeros(8, np.float32)), np.zeros(8))
+    with pytest.raises(ValueError):
+        normalize(audio32, mode='lufs')
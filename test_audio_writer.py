@@ -0,0 +1,101 @@
+import struct
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_writer import MAX_RIFF_SIZE, WAVE_FORMAT_EXTENSIBLE, WavWriter, write_wav
+
+
+def chunks(path):
+    """{chunk id: payload} of a RIFF/WAVE file, checking the RIFF size on the way"""
+    data = open(path, 'rb').read()
+    riff, size, wave = struct.unpack('<4sI4s', data[:12])
+    assert (riff, wave) == (b'RIFF', b'WAVE') and size == len(data) - 8
+    found, position = {}, 12
+    while position < len(data):
+        chunk_id, chunk_size = struct.unpack('<4sI', data[position:position + 8])
+        found[chunk_id] = data[position + 8:position + 8 + chunk_size]
+        position += 8 + chunk_size + chunk_size % 2
+    return found
+
+
+SIGNAL = np.sin(np.linspace(0, 20, 1001)) * 0.5
+
+
+@pytest.mark.parametrize('sample_format, subtype, tag, tolerance', [
+    ('int16', 'PCM_16', 1, 2 / 32767),
+    ('int24', 'PCM_24', WAVE_FORMAT_EXTENSIBLE, 2 / 8388607),
+    ('float32', 'FLOAT', 3, 1e-7),
+])
+def test_sample_formats_read_back_with_the_right_header(tmp_path, sample_format, subtype, tag, tolerance):
+    path = str(tmp_path / 'out.wav')
+    write_wav(path, SIGNAL, 8000, sample_format=sample_format)
+
+    fmt = chunks(path)[b'fmt ']
+    assert struct.unpack('<H', fmt[:2])[0] == tag
+    assert len(chunks(path)[b'data']) == len(SIGNAL) * {'int16': 2, 'int24': 3, 'float32': 4}[sample_format]
+
+    info = sf.info(path)
+    assert (info.samplerate, info.channels, info.frames, info.subtype) == (8000, 1, len(SIGNAL), subtype)
+    # Samples are truncated to the grid, and readers divide by 2**(bits - 1) rather than the full-scale value
+    np.testing.assert_allclose(sf.read(path)[0], SIGNAL, rtol=1e-4, atol=tolerance)
+
+
+def test_multichannel_files_use_the_extensible_fmt_chunk(tmp_path):
+    path = str(tmp_path / 'stems.wav')
+    stems = np.stack([SIGNAL, -SIGNAL, SIGNAL * 0.25], axis=1)
+    write_wav(path, stems, 8000)
+
+    fmt = chunks(path)[b'fmt ']
+    tag, channels = struct.unpack('<HH', fmt[:4])
+    cb_size, valid_bits, mask, subformat = struct.unpack('<HHII', fmt[16:28])
+    assert (tag, channels, cb_size, valid_bits, mask, subformat) == (WAVE_FORMAT_EXTENSIBLE, 3, 22, 16, 0, 1)
+    np.testing.assert_allclose(sf.read(path)[0], stems, rtol=1e-4, atol=2 / 32767)
+
+
+def test_file_only_appears_when_closed_and_abort_leaves_nothing(tmp_path):
+    path = tmp_path / 'song.wav'
+    with WavWriter(str(path), 8000) as wav:
+        wav.write(SIGNAL[:500])
+        wav.flush()
+        assert not path.exists()
+        wav.write(SIGNAL[500:])
+    assert sf.info(str(path)).frames == len(SIGNAL)
+
+    with pytest.raises(RuntimeError):
+        with WavWriter(str(tmp_path / 'broken.wav'), 8000) as wav:
+            wav.write(SIGNAL)
+            raise RuntimeError("render failed")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['song.wav']
+
+
+def test_presized_memmap_file_and_close_to_another_path(tmp_path):
+    wav = WavWriter(str(tmp_path / 'song.partial.wav'), 8000, channels=2, frames=1000)
+    assert wav.data.shape == (1000, 2)
+    wav.data[:] = 1000
+    wav.frames_written = 600  # filled by hand and cut short
+    wav.close(str(tmp_path / 'song.wav'))
+
+    assert not (tmp_path / 'song.partial.wav').exists()
+    samples, rate = sf.read(str(tmp_path / 'song.wav'), dtype='int16')
+    assert rate == 8000 and samples.shape == (600, 2) and np.all(samples == 1000)
+    assert len(chunks(str(tmp_path / 'song.wav'))[b'data']) == 600 * 4
+
+    with WavWriter(str(tmp_path / 'short.wav'), 8000, frames=10) as wav:
+        with pytest.raises(ValueError, match="pre-sized"):
+            wav.write(np.zeros(11))
+
+
+def test_writes_past_the_riff_limit_raise(tmp_path):
+    with pytest.raises(ValueError, match="4 GiB"):
+        WavWriter(str(tmp_path / 'huge.wav'), 48000, channels=2, frames=MAX_RIFF_SIZE // 4)
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(ValueError, match="4 GiB"):
+        with WavWriter(str(tmp_path / 'long.wav'), 48000, channels=2) as wav:
+            wav.write(np.zeros((10, 2)))
+            # Pretend the song has already run for hours
+            wav.frames_written = MAX_RIFF_SIZE // 4 - 5
+            wav.write(np.zeros((10, 2)))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,30 @@
+import json
+
+import soundfile as sf
+
+import batch_render
+
+
+def test_batch_writes_every_beat_and_a_manifest_line_for_each(tmp_path):
+    prompts = tmp_path / 'prompts.txt'
+    prompts.write_text("# demo batch\ntrap beat at 140 BPM, 2 bars\n\nlo-fi beat at 80 BPM, 1 bar\n")
+    out_dir = tmp_path / 'renders'
+
+    assert batch_render.main([str(prompts), '--out-dir', str(out_dir), '--workers', '2',
+                              '--sample-rate', '8000', '--seed', '1', '--format', 'flac']) == 0
+
+    entries = [json.loads(line) for line in (out_dir / 'manifest.jsonl').read_text().splitlines()]
+    entries.sort(key=lambda entry: entry['index'])
+    assert [entry['prompt'] for entry in entries] == ["trap beat at 140 BPM, 2 bars", "lo-fi beat at 80 BPM, 1 bar"]
+    assert all(entry['status'] == 'done' for entry in entries)
+    assert [entry['params']['bpm'] for entry in entries] == [140, 80]
+    assert [entry['files'] for entry in entries] == [[str(out_dir / 'beat_00000.flac')],
+                                                     [str(out_dir / 'beat_00001.flac')]]
+
+    for entry in entries:
+        info = sf.info(entry['files'][0])
+        bars = entry['params']['bars']
+        assert info.samplerate == 8000
+        assert info.frames == int(8000 * 60.0 / entry['params']['bpm'] * 4 * bars)
+    assert sorted(path.name for path in out_dir.iterdir()) == ['beat_00000.flac', 'beat_00001.flac',
+                                                               'manifest.jsonl']
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from ai_beat_generator import SmartDrumMachine
+from beat_renderer import float_to_int16, make_events, render_blocks, render_events, tile_events
+from voice_cache import VoiceCache
+
+PARAMS = {
+    'genre': 'trap', 'bpm': 140, 'bars': 8, 'mood': 'aggressive', 'kick_pattern': 'heavy',
+    'hihat_style': 'rapid', 'bass_boost': 1.2, 'distortion': 0.3, 'volume': 1.0
+}
+
+
+def per_hit_render(events, voices, total_samples):
+    """The old create_parametric_beat mixing: one bounds check and slice add per hit"""
+    pattern = np.zeros(total_samples)
+    for onset, voice_id, gain in events.tolist():
+        voice = voices[voice_id]
+        if onset + len(voice) < total_samples:
+            pattern[onset:onset + len(voice)] += voice * gain
+    return pattern
+
+
+def beat_plan(**changes):
+    machine = SmartDrumMachine(sample_rate=8000, voice_cache=VoiceCache(), seed=3, dtype=np.float64)
+    return machine._beat_plan(dict(PARAMS, **changes))
+
+
+def loop_overhang(events, voices, starts):
+    """Samples by which a bar's hits ring past the start of the next bar"""
+    lengths = np.array([len(voice) for voice in voices])
+    return int((events['onset'] + lengths[events['voice']]).max() - (starts[1] - starts[0]))
+
+
+@pytest.mark.parametrize('changes', [{}, {'genre': 'lo-fi', 'bpm': 200}])
+def test_looped_render_matches_the_per_hit_loop_on_a_real_beat(changes):
+    events, voices, total_samples, starts = beat_plan(**changes)
+    reference = per_hit_render(tile_events(events, starts), voices, total_samples)
+    # At 200 BPM the lo-fi kick rings into the next bar, where the sums overlap
+    assert (loop_overhang(events, voices, starts) > 0) == bool(changes)
+
+    looped = render_events(events, voices, total_samples, loop_starts=starts)
+    assert np.array_equal(looped, reference)
+    assert np.array_equal(float_to_int16(looped, 32767), float_to_int16(reference, 32767))
+    assert np.array_equal(render_events(tile_events(events, starts), voices, total_samples), reference)
+
+
+def test_hits_running_past_the_end_are_dropped():
+    voices = [np.ones(10), np.full(4, 2.0)]
+    events = make_events([0, 5, 14, 16, 20], [0, 1, 0, 1, 1], [1.0, 1.0, 1.0, 0.5, 1.0])
+
+    mixed = render_events(events, voices, 20)
+    reference = per_hit_render(events, voices, 20)
+    assert np.array_equal(mixed, reference)
+    # The kick at 14 would end at 24 and the hit at 16 ends exactly on the end, so both are skipped
+    assert mixed[14:].sum() == 0
+
+    # A loop whose last repeat overruns drops only the overrunning hits
+    loop = make_events([0, 2], [0, 1], [1.0, 1.0])
+    looped = render_events(loop, voices, 20, loop_starts=[0, 12])
+    assert np.array_equal(looped, per_hit_render(tile_events(loop, [0, 12]), voices, 20))
+    assert np.all(looped[14:18] == 2.0) and looped[12:14].sum() == 0 and looped[18:].sum() == 0
+
+
+@pytest.mark.parametrize('changes', [{}, {'genre': 'lo-fi', 'bpm': 200}])
+@pytest.mark.parametrize('block_size', [13, 100, 1000, 32768])
+def test_concatenated_blocks_equal_the_whole_render(block_size, changes):
+    events, voices, total_samples, starts = beat_plan(**changes)
+    # The shortest voice is longer than the small block sizes, so tails cross many boundaries
+    assert min(len(voice) for voice in voices) > 100
+
+    whole = render_events(events, voices, total_samples, loop_starts=starts)
+    blocks = list(render_blocks(events, voices, total_samples, loop_starts=starts, block_size=block_size))
+    assert all(len(block) == block_size for block in blocks[:-1])
+    assert np.array_equal(np.concatenate(blocks), whole)
+
+    flat = tile_events(events, starts)
+    blocks = render_blocks(flat, voices, total_samples, block_size=block_size)
+    assert np.array_equal(np.concatenate(list(blocks)), render_events(flat, voices, total_samples))
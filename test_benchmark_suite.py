@@ -0,0 +1,36 @@
+import json
+
+from benchmarks import suite
+
+
+def report(**cases):
+    return {'results': {name: {'seconds': seconds, 'throughput': 1 / seconds, 'unit': 'runs/s', 'peak_mb': peak_mb}
+                        for name, (seconds, peak_mb) in cases.items()}}
+
+
+def test_compare_flags_slowdowns_and_memory_growth_beyond_threshold():
+    baseline = report(render=(1.0, 10.0), effects=(1.0, 10.0), parse=(1.0, 0.1), export=(1.0, 5.0))
+    current = report(render=(1.3, 10.0), effects=(1.1, 14.0), parse=(1.0, 0.5), new=(1.0, 1.0))
+
+    rows = {name: regressed for name, _, _, regressed in suite.compare(baseline, current, threshold=0.2)}
+    # Cases missing from either report are skipped; tiny peaks are ignored
+    assert rows == {'render': True, 'effects': True, 'parse': False}
+
+
+def test_compare_command_exits_non_zero_on_regression(tmp_path):
+    baseline, current = tmp_path / 'baseline.json', tmp_path / 'current.json'
+    baseline.write_text(json.dumps(report(render=(1.0, 10.0))))
+
+    current.write_text(json.dumps(report(render=(1.1, 10.0))))
+    assert suite.main(['compare', str(baseline), str(current)]) == 0
+
+    current.write_text(json.dumps(report(render=(2.0, 10.0))))
+    assert suite.main(['compare', str(baseline), str(current), '--threshold', '0.5']) == 1
+
+
+def test_parse_stage_runs_and_saves_results(tmp_path):
+    output = tmp_path / 'results.json'
+    assert suite.main(['run', '--only', 'parse', '--output', str(output)]) == 0
+    results = json.loads(output.read_text())['results']
+    assert set(results) == {'parse/unique', 'parse/repeated'}
+    assert all(result['throughput'] > 0 for result in results.values())
@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.import_time import (IMPORT_BUDGETS_MS, WEB_FIRST_RESPONSE_BUDGET_MS, heavy_imports,
+                                    import_profile, import_time_ms, web_first_response_ms)
+
+
+@pytest.mark.parametrize('module', sorted(IMPORT_BUDGETS_MS))
+def test_entry_point_defers_heavy_imports(module):
+    assert heavy_imports(import_profile(module)) == []
+
+
+@pytest.mark.parametrize('module', sorted(IMPORT_BUDGETS_MS))
+def test_entry_point_imports_within_budget(module):
+    assert import_time_ms(module) < IMPORT_BUDGETS_MS[module]
+
+
+def test_web_server_answers_quickly_from_cold():
+    assert web_first_response_ms() < WEB_FIRST_RESPONSE_BUDGET_MS
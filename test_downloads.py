@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from scipy.signal import resample_poly
+
+from audio_writer import StreamingResampler, write_audio, write_wav
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    import web_daw
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'generated_songs').mkdir()
+    write_wav(str(tmp_path / 'generated_songs' / 'song.wav'), [0.5, -0.5] * 4000, 8000)
+    return web_daw.app.test_client()
+
+
+def test_range_requests_return_only_the_requested_bytes(client, tmp_path):
+    data = (tmp_path / 'generated_songs' / 'song.wav').read_bytes()
+    response = client.get('/download/song.wav?inline=1', headers={'Range': 'bytes=100-199'})
+
+    assert response.status_code == 206
+    assert response.data == data[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(data)}'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Disposition'].startswith('inline')
+
+
+def test_replays_revalidate_with_304(client):
+    first = client.get('/download/song.wav')
+    assert first.status_code == 200 and first.headers['Content-Disposition'].startswith('attachment')
+    assert 'max-age' in first.headers['Cache-Control']
+
+    assert client.get('/download/song.wav', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert client.get('/download/song.wav',
+                      headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+
+
+def test_hidden_and_outside_files_are_not_served(client, tmp_path):
+    write_wav(str(tmp_path / 'generated_songs' / '.writing.wav'), [0.0] * 10, 8000)
+    assert client.get('/download/.writing.wav').status_code == 404
+    assert client.get('/download/..%2Fsecret.wav').status_code == 404
+
+
+def test_other_formats_are_transcoded_once(client, tmp_path, monkeypatch):
+    import metrics
+    import web_daw
+
+    monkeypatch.setattr(metrics, '_enabled', True)
+    misses = web_daw.TRANSCODES.value('miss')
+    first = client.get('/download/song.wav?format=opus')
+    assert first.status_code == 200 and first.mimetype == 'audio/ogg'
+    assert 'song.opus' in first.headers['Content-Disposition']
+    cached = tmp_path / 'generated_songs' / '.transcodes' / 'song.wav.opus'
+    assert sf.info(str(cached)).subtype == 'OPUS'
+
+    again = client.get('/download/song.wav?format=opus')
+    assert again.data == first.data and web_daw.TRANSCODES.value('miss') == misses + 1
+    assert client.get('/download/song.wav?format=flac').data[:4] == b'fLaC'
+    assert client.get('/download/song.wav?format=mp3').status_code == 400
+
+    # A song of the same name in another format gets its own transcode
+    write_audio(str(tmp_path / 'generated_songs' / 'song.flac'), np.zeros(800, np.float32), 8000, 'flac')
+    other = client.get('/download/song.flac?format=opus')
+    assert other.status_code == 200 and other.data != first.data
+    assert web_daw.TRANSCODES.value('miss') == misses + 3
+
+
+def test_opus_at_an_unsupported_rate_is_resampled_in_chunks(tmp_path):
+    signal = np.random.default_rng(0).uniform(-0.5, 0.5, (32000, 2)).astype(np.float32)
+    resampler = StreamingResampler(32000, 48000)
+    chunks = [resampler.process(signal[i:i + 1000]) for i in range(0, len(signal), 1000)] + [resampler.flush()]
+    np.testing.assert_allclose(np.concatenate(chunks), resample_poly(signal, 3, 2, axis=0), atol=1e-6)
+
+    write_audio(str(tmp_path / 'beat.opus'), signal, 32000, 'opus')
+    info = sf.info(str(tmp_path / 'beat.opus'))
+    assert (info.samplerate, info.frames, info.channels) == (48000, 48000, 2)
@@ -0,0 +1,81 @@
+import json
+
+from event_bus import EventBus, format_sse
+from generation_backends import FakeBackend
+from song_index import SongIndex
+
+
+def test_slow_subscribers_are_dropped():
+    bus = EventBus(max_queued=2)
+    fast, slow = bus.subscribe(), bus.subscribe()
+    for n in range(3):
+        bus.publish('tick', n)
+        assert fast.get(timeout=0) == ('tick', n)
+
+    assert slow.dropped and not fast.dropped
+    assert bus.subscriber_count() == 1
+    assert format_sse('tick', {'n': 1}) == 'event: tick\ndata: {"n": 1}\n\n'
+
+
+def test_jobs_push_progress_and_songs(tmp_path, monkeypatch):
+    import web_daw
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(web_daw, 'song_generator', FakeBackend(latency=0.1))
+    monkeypatch.setattr(web_daw, 'generator_ready', True)
+    monkeypatch.setattr(web_daw, '_song_index', SongIndex(str(tmp_path / 'generated_songs')))
+    subscription = web_daw.events.subscribe()
+    try:
+        response = web_daw.app.test_client().post('/generate', json={'prompt': 'boom bap beat', 'duration': 1})
+        job_id = response.get_json()['job_id']
+
+        received = []
+        while not received or received[-1][0] != 'job' or received[-1][1]['status'] not in ('done', 'failed'):
+            event, data = subscription.get(timeout=5)
+            if event == 'song' or data.get('id') == job_id:
+                received.append((event, data))
+    finally:
+        subscription.close()
+
+    statuses = [data['status'] for event, data in received if event == 'job']
+    assert statuses[-1] == 'done' and 'running' in statuses
+    progress = [data['progress'] for event, data in received if event == 'job' and data['status'] == 'running']
+    assert any(0 < fraction < 1 for fraction in progress) and progress == sorted(progress)
+    assert [data['basename'] for event, data in received if event == 'song'] == [received[-1][1]['result']['basename']]
+
+
+def test_event_stream_starts_with_a_snapshot(tmp_path, monkeypatch):
+    import web_daw
+
+    index = SongIndex(str(tmp_path))
+    index.add({'basename': 'a.wav', 'filename': 'a.wav', 'prompt': 'a', 'style': 'custom',
+               'duration': 1, 'file_size': 44, 'timestamp': '2025-01-01T00:00:00'})
+    monkeypatch.setattr(web_daw, '_song_index', index)
+    response = web_daw.app.test_client().get('/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    status, songs = next(chunks), next(chunks)
+    response.close()
+
+    assert status.startswith(b'retry: ') and b'event: status\n' in status
+    assert json.loads(songs.split(b'data: ')[1]) == {'songs': index.page()[0], 'next_cursor': None}
+
+
+def test_cached_songs_are_not_announced_again(tmp_path, monkeypatch):
+    import web_daw
+
+    output_dir = str(tmp_path / 'generated_songs')
+    index = SongIndex(output_dir)
+    monkeypatch.setattr(web_daw, 'song_generator', FakeBackend(latency=0, output_dir=output_dir))
+    monkeypatch.setattr(web_daw, '_song_index', index)
+    subscription = web_daw.events.subscribe()
+    try:
+        first = web_daw.run_generation('boom bap beat', 1, 'custom', seed=4)
+        again = web_daw.run_generation('boom bap beat', 1, 'custom', seed=4)
+        assert subscription.get(timeout=0) == ('song', first)
+        assert subscription.get(timeout=0) is None
+    finally:
+        subscription.close()
+
+    assert again['basename'] == first['basename'] and again['id'] == first['id']
+    assert index.count() == 1
@@ -0,0 +1,79 @@
+import time
+import wave
+
+import pytest
+
+from generation_backends import FakeBackend, create_backend
+from song_index import SongIndex
+
+
+def read_frames(filename):
+    with wave.open(filename) as wav:
+        return wav.getframerate(), wav.readframes(wav.getnframes())
+
+
+def test_fake_backend_is_deterministic(tmp_path):
+    backend = FakeBackend(output_dir=str(tmp_path))
+    first = backend._generate_uncached("dark trap beat", (2, 250, 0.0, 1.0, 3.0), seed=7)
+    again = backend._generate_uncached("dark trap beat", (2, 250, 0.0, 1.0, 3.0), seed=7)
+    other = backend._generate_uncached("dark trap beat", (2, 250, 0.0, 1.0, 3.0), seed=8)
+
+    sample_rate, frames = read_frames(first['filename'])
+    assert first['filename'] != again['filename']
+    assert frames == read_frames(again['filename'])[1]
+    assert frames != read_frames(other['filename'])[1]
+    assert len(frames) == 2 * sample_rate * 2  # two seconds of 16-bit mono
+
+
+def test_seeded_songs_come_from_the_cache(tmp_path):
+    backend = FakeBackend(latency=0.2, output_dir=str(tmp_path))
+    first = backend.generate_song("chill lo-fi beat", duration=1, seed=3)
+
+    start = time.perf_counter()
+    assert backend.generate_song("chill lo-fi beat", duration=1, seed=3) == dict(first, cached=True)
+    assert time.perf_counter() - start < 0.2
+    assert backend.cache.stats()['hits'] == 1
+
+
+def test_create_backend_reads_the_environment(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('GENERATION_BACKEND', 'fake')
+    monkeypatch.setenv('FAKE_GENERATION_LATENCY', '0.5')
+    backend = create_backend()
+    assert isinstance(backend, FakeBackend) and backend.latency == 0.5
+
+    with pytest.raises(ValueError):
+        create_backend('nope')
+
+
+def test_web_app_serves_songs_from_the_fake_backend(tmp_path, monkeypatch):
+    import web_daw
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(web_daw, 'song_generator', FakeBackend())
+    monkeypatch.setattr(web_daw, 'generator_ready', True)
+    monkeypatch.setattr(web_daw, '_song_index', SongIndex(str(tmp_path / 'generated_songs')))
+    client = web_daw.app.test_client()
+
+    response = client.post('/generate', json={'prompt': 'boom bap beat', 'duration': 1, 'style': 'drake'})
+    assert response.status_code == 202
+    job_url = f"/jobs/{response.get_json()['job_id']}"
+    while (job := client.get(job_url).get_json())['status'] not in ('done', 'failed'):
+        time.sleep(0.01)
+
+    assert job['status'] == 'done', job['error']
+    assert job['result']['style'] == 'drake_melodic_hiphop'
+    download = client.get(f"/download/{job['result']['basename']}")
+    assert download.status_code == 200 and download.data[:4] == b'RIFF'
+
+
+def test_first_request_loads_the_model_only_when_autoload_is_on(monkeypatch):
+    import web_daw
+
+    started = []
+    monkeypatch.setattr(web_daw, 'start_generator', lambda: started.append(1))
+    client = web_daw.app.test_client()
+    assert client.get('/status').status_code == 200 and started == []
+
+    monkeypatch.setitem(web_daw.app.config, 'AUTOLOAD_MODEL', True)
+    assert client.get('/status').status_code == 200 and started == [1]
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from generation_batcher import GenerationBatcher
+
+
+class RecordingBatch:
+    """Fake generate_batch that records every call and echoes its items"""
+
+    def __init__(self, results=None):
+        self.calls = []
+        self.results = results
+
+    def __call__(self, key, items):
+        self.calls.append((key, list(items)))
+        if self.results is not None:
+            return self.results(items)
+        return [(key, item) for item in items]
+
+
+def test_requests_are_grouped_by_key():
+    generate = RecordingBatch()
+    batcher = GenerationBatcher(generate, max_batch_size=4, max_wait=0.5)
+    futures = [batcher.submit(key, item) for key, item in [('a', 1), ('b', 2), ('a', 3), ('b', 4)]]
+    assert [future.result(timeout=5) for future in futures] == [('a', 1), ('b', 2), ('a', 3), ('b', 4)]
+    batcher.close()
+
+    assert sorted(generate.calls) == [('a', [1, 3]), ('b', [2, 4])]
+    assert batcher.stats()['batches_run'] == 2 and batcher.stats()['items_run'] == 4
+
+
+def test_full_batch_is_dispatched_without_waiting():
+    generate = RecordingBatch()
+    batcher = GenerationBatcher(generate, max_batch_size=2, max_wait=30)
+    start = time.monotonic()
+    futures = [batcher.submit('k', item) for item in range(3)]
+    assert [future.result(timeout=5) for future in futures[:2]] == [('k', 0), ('k', 1)]
+    assert time.monotonic() - start < 5
+    assert not futures[2].done()
+
+    batcher.close()  # the leftover is flushed on close
+    assert futures[2].result(timeout=5) == ('k', 2)
+    assert generate.calls == [('k', [0, 1]), ('k', [2])]
+
+
+def test_partial_batch_is_dispatched_after_max_wait():
+    generate = RecordingBatch()
+    batcher = GenerationBatcher(generate, max_batch_size=8, max_wait=0.2)
+    start = time.monotonic()
+    assert batcher.generate('k', 'only') == ('k', 'only')
+    assert 0.15 <= time.monotonic() - start < 5
+    batcher.close()
+
+
+def test_an_exception_reaches_every_future_in_the_batch():
+    def explode(items):
+        raise ValueError("model crashed")
+
+    batcher = GenerationBatcher(RecordingBatch(explode), max_batch_size=3, max_wait=0.1)
+    futures = [batcher.submit('k', item) for item in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="model crashed"):
+            future.result(timeout=5)
+    batcher.close()
+
+
+def test_too_few_results_fail_every_future_instead_of_hanging():
+    batcher = GenerationBatcher(RecordingBatch(lambda items: items[:1]), max_batch_size=2, max_wait=0.1)
+    futures = [batcher.submit('k', item) for item in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="1 results for 2 items"):
+            future.result(timeout=5)
+    batcher.close()
+
+
+def test_closed_batcher_rejects_new_requests():
+    batcher = GenerationBatcher(RecordingBatch())
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit('k', 1)
+    assert not batcher._thread.is_alive()
@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from generation_cache import GenerationCache
+
+
+def song(tmp_path, name='song.wav'):
+    path = tmp_path / name
+    path.write_bytes(b'RIFF')
+    return {'filename': str(path), 'basename': name}
+
+
+def wait_for_join(cache, timeout=5):
+    deadline = time.monotonic() + timeout
+    while cache.stats()['joins'] == 0:
+        assert time.monotonic() < deadline, "second request never joined"
+        time.sleep(0.005)
+
+
+def test_identical_request_joins_the_in_flight_generation(tmp_path):
+    cache = GenerationCache(str(tmp_path / '.cache'))
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return song(tmp_path)
+
+    with ThreadPoolExecutor(2) as pool:
+        owner = pool.submit(cache.get_or_generate, 'key', generate)
+        started.wait(5)
+        joiner = pool.submit(cache.get_or_generate, 'key', generate)
+        wait_for_join(cache)
+        release.set()
+        assert joiner.result(5) == dict(owner.result(5), cached=True)
+        assert 'cached' not in owner.result(5)
+
+    assert len(calls) == 1
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'joins': 1, 'in_flight': 0}
+    # Later requests are served from disk
+    cached = cache.get_or_generate('key', lambda: pytest.fail("should be cached"))
+    assert cached == dict(song(tmp_path), cached=True)
+    assert cache.stats()['hits'] == 1
+
+
+def test_failures_reach_every_caller_and_are_not_cached(tmp_path):
+    cache = GenerationCache(str(tmp_path / '.cache'))
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("out of memory")
+
+    with ThreadPoolExecutor(2) as pool:
+        owner = pool.submit(cache.get_or_generate, 'key', fail)
+        started.wait(5)
+        joiner = pool.submit(cache.get_or_generate, 'key', fail)
+        wait_for_join(cache)
+        release.set()
+        for future in (owner, joiner):
+            with pytest.raises(RuntimeError, match="out of memory"):
+                future.result(5)
+
+    assert list((tmp_path / '.cache').iterdir()) == []
+    assert cache.get_or_generate('key', lambda: song(tmp_path)) == song(tmp_path)
+    assert cache.stats()['misses'] == 2
+
+
+def test_hit_is_ignored_once_the_audio_file_is_gone(tmp_path):
+    cache = GenerationCache(str(tmp_path / '.cache'))
+    first = cache.get_or_generate('key', lambda: song(tmp_path, 'first.wav'))
+    (tmp_path / 'first.wav').unlink()
+
+    second = cache.get_or_generate('key', lambda: song(tmp_path, 'second.wav'))
+    assert second != first and second['basename'] == 'second.wav'
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 2
+
+
+def test_a_failed_save_still_answers_every_caller(tmp_path, monkeypatch):
+    cache = GenerationCache(str(tmp_path / '.cache'))
+    started, release = threading.Event(), threading.Event()
+
+    def generate():
+        started.set()
+        release.wait(5)
+        return song(tmp_path)
+
+    def disk_full(key, result):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(cache, '_save', disk_full)
+    with ThreadPoolExecutor(2) as pool:
+        owner = pool.submit(cache.get_or_generate, 'key', generate)
+        started.wait(5)
+        joiner = pool.submit(cache.get_or_generate, 'key', generate)
+        wait_for_join(cache)
+        release.set()
+        assert owner.result(5) == song(tmp_path)
+        assert joiner.result(5) == dict(song(tmp_path), cached=True)
+
+    # Nothing was cached, so the next request generates again
+    assert cache.stats()['in_flight'] == 0
+    monkeypatch.undo()
+    assert cache.get_or_generate('key', lambda: song(tmp_path)) == song(tmp_path)
+    assert cache.stats()['misses'] == 2
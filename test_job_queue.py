@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from job_queue import JobManager, JobQueueFull
+
+
+def wait_for(manager, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job never reached {status!r}: {manager.get(job_id)}")
+
+
+def test_jobs_move_from_queued_to_running_to_done_or_failed():
+    seen = []
+    manager = JobManager(max_workers=1, listener=lambda job: seen.append((job['id'], job['status'])))
+    gate = threading.Event()
+    try:
+        first = manager.submit(gate.wait, 5)
+        running = wait_for(manager, first['id'], 'running')
+        assert running['started'] is not None and running['queue_position'] == 0
+
+        second = manager.submit(lambda: 1 / 0)
+        assert second['status'] == 'queued' and second['queue_position'] == 1
+
+        gate.set()
+        done = wait_for(manager, first['id'], 'done')
+        assert done['result'] is True and done['progress'] == 1.0 and done['finished']
+        failed = wait_for(manager, second['id'], 'failed')
+        assert 'division by zero' in failed['error']
+    finally:
+        manager.shutdown()
+
+    statuses = [status for job_id, status in seen if job_id == second['id']]
+    assert statuses[0] == 'queued' and statuses[-1] == 'failed' and 'running' in statuses
+
+
+def test_submit_raises_once_max_pending_jobs_are_waiting():
+    manager = JobManager(max_workers=1, max_pending=2)
+    gate = threading.Event()
+    try:
+        running = manager.submit(gate.wait, 5)
+        wait_for(manager, running['id'], 'running')
+        manager.submit(lambda: None)
+        manager.submit(lambda: None)
+        with pytest.raises(JobQueueFull):
+            manager.submit(lambda: None)
+        assert manager.stats() == {'queued': 2, 'running': 1, 'done': 0, 'failed': 0}
+    finally:
+        gate.set()
+        manager.shutdown()
+
+
+def test_generate_answers_429_when_the_queue_is_full(monkeypatch):
+    import web_daw
+
+    manager = JobManager(max_workers=1, max_pending=0)
+    monkeypatch.setattr(web_daw, 'job_manager', manager)
+    monkeypatch.setattr(web_daw, 'generator_ready', True)
+    try:
+        response = web_daw.app.test_client().post('/generate', json={'prompt': 'trap beat'})
+    finally:
+        manager.shutdown()
+    assert response.status_code == 429
+    assert 'queue' in response.get_json()['error']
+
+
+def test_generate_rejects_durations_out_of_range_or_not_whole(monkeypatch):
+    import web_daw
+
+    submitted = []
+
+    def submit(*args, **kwargs):
+        submitted.append(args)
+        return {'id': 'job', 'status': 'queued', 'queue_position': 0}
+
+    monkeypatch.setattr(web_daw.job_manager, 'submit', submit)
+    monkeypatch.setattr(web_daw, 'generator_ready', True)
+    client = web_daw.app.test_client()
+
+    for duration in [0, -5, web_daw.MAX_DURATION + 1, 12.5, 'soon', None, True, [30]]:
+        response = client.post('/generate', json={'prompt': 'trap beat', 'duration': duration})
+        assert response.status_code == 400, duration
+        assert 'Duration' in response.get_json()['error']
+    assert submitted == []
+
+    for duration in [1, '45', web_daw.MAX_DURATION]:
+        assert client.post('/generate', json={'prompt': 'trap beat', 'duration': duration}).status_code == 202
+    assert [args[2] for args in submitted] == [1, 45, web_daw.MAX_DURATION]
+    assert f'max="{web_daw.MAX_DURATION}"' in client.get('/').get_data(as_text=True)
+
+
+def test_prune_keeps_at_most_max_finished_jobs():
+    manager = JobManager(max_workers=1, max_pending=10, max_finished=2)
+    try:
+        ids = []
+        for value in range(4):
+            ids.append(manager.submit(lambda value=value: value)['id'])
+            wait_for(manager, ids[-1], 'done')
+        # Pruning happens on submit, so the next job drops all but the newest two finished ones
+        last = manager.submit(lambda: None)['id']
+        wait_for(manager, last, 'done')
+    finally:
+        manager.shutdown()
+
+    assert [manager.get(job_id) for job_id in ids[:2]] == [None, None]
+    assert all(manager.get(job_id) is not None for job_id in ids[2:] + [last])
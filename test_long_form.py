@@ -0,0 +1,67 @@
+import wave
+
+import numpy as np
+import pytest
+
+from audio_writer import SegmentStitcher, WavWriter
+
+SAMPLE_RATE = 1000
+
+
+def read_samples(filename):
+    with wave.open(str(filename)) as wav:
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2') / 32767
+
+
+def windows(song, window, context, fade):
+    """Overlapping windows of ``song`` laid out like MusicGen continuations, seam fades included"""
+    yield song[:window]
+    start = window
+    while start < len(song):
+        yield song[start - fade:start - context + window]
+        start += window - context
+
+
+def test_matching_windows_stitch_back_into_the_song(tmp_path):
+    song = np.sin(np.arange(3500) / 7.0).astype(np.float32)[:, None] * 0.5
+    writer = WavWriter(str(tmp_path / 'long.wav'), SAMPLE_RATE)
+    stitcher = SegmentStitcher(writer, total_frames=3200, fade_frames=50)
+
+    for segment in windows(song, window=1000, context=400, fade=50):
+        stitcher.add(segment)
+        if stitcher.remaining <= 0:
+            break
+        # Everything but the held seam is already on disk and readable
+        assert len(read_samples(writer.tmp_path)) == 3200 - stitcher.remaining - 50
+    stitcher.finish()
+    writer.close()
+
+    np.testing.assert_allclose(read_samples(tmp_path / 'long.wav'), song[:3200, 0], atol=1e-4)
+
+
+def test_seams_crossfade_between_windows(tmp_path):
+    writer = WavWriter(str(tmp_path / 'seam.wav'), SAMPLE_RATE, sample_format='float32')
+    stitcher = SegmentStitcher(writer, total_frames=300, fade_frames=100)
+    stitcher.add(np.zeros((200, 1)))
+    stitcher.add(np.ones((200, 1)))
+    writer.close()
+
+    assert writer.frames_written == 300
+    samples = np.frombuffer((tmp_path / 'seam.wav').read_bytes()[-1200:], dtype='<f4')
+    assert np.all(samples[:100] == 0) and np.all(samples[200:] == 1)
+    assert np.all(np.diff(samples[100:200]) > 0)
+
+
+def test_failed_run_keeps_its_partial_file(tmp_path):
+    writer = WavWriter(str(tmp_path / 'song.wav'), SAMPLE_RATE)
+    stitcher = SegmentStitcher(writer, total_frames=5000, fade_frames=10)
+    with pytest.raises(RuntimeError):
+        try:
+            stitcher.add(np.full((1000, 1), 0.25))
+            raise RuntimeError("model crashed")
+        except RuntimeError:
+            writer.close(str(tmp_path / 'song.partial.wav'))
+            raise
+
+    assert not (tmp_path / 'song.wav').exists()
+    assert len(read_samples(tmp_path / 'song.partial.wav')) == 990
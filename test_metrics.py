@@ -0,0 +1,76 @@
+import metrics
+from enhanced_ai_daw import EnhancedAIDaw
+from voice_cache import VoiceCache
+
+STAGES = ('prompt_parse', 'voice_synthesis', 'pattern_mix', 'effects', 'midi_export', 'file_write')
+
+
+def stage_counts():
+    return {stage: metrics.STAGE_SECONDS.count(stage) for stage in STAGES}
+
+
+def create_beat(tmp_path):
+    daw = EnhancedAIDaw(voice_cache=VoiceCache(), seed=0)
+    daw.create_enhanced_beat("dark trap beat, 2 bars", output_dir=str(tmp_path), basename='beat')
+
+
+def test_disabled_metrics_record_nothing(tmp_path):
+    metrics.disable()
+    before = stage_counts()
+    create_beat(tmp_path)
+    assert stage_counts() == before
+
+
+def test_enabled_metrics_time_every_stage(tmp_path):
+    metrics.enable()
+    try:
+        before = stage_counts()
+        written = metrics.BYTES_WRITTEN.value()
+        create_beat(tmp_path)
+    finally:
+        metrics.disable()
+
+    after = stage_counts()
+    assert all(after[stage] > before[stage] for stage in STAGES), (before, after)
+    assert metrics.BYTES_WRITTEN.value() - written == (tmp_path / 'beat.wav').stat().st_size - 44
+
+
+def test_prometheus_text_format():
+    registry = metrics.Registry()
+    latency = registry.histogram('test_seconds', 'Test latency', ('stage',), buckets=(0.1, 1.0))
+    latency.observe(0.05, 'mix')
+    latency.observe(0.5, 'mix')
+    latency.observe(5.0, 'mix')
+    registry.counter('test_total', 'Things "counted"').inc(3)
+    registry.gauge('test_jobs', 'Jobs by status', lambda: {'queued': 2}, ('status',))
+
+    assert registry.render().splitlines() == [
+        '# HELP test_seconds Test latency',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{stage="mix",le="0.1"} 1',
+        'test_seconds_bucket{stage="mix",le="1.0"} 2',
+        'test_seconds_bucket{stage="mix",le="+Inf"} 3',
+        'test_seconds_sum{stage="mix"} 5.55',
+        'test_seconds_count{stage="mix"} 3',
+        '# HELP test_total Things "counted"',
+        '# TYPE test_total counter',
+        'test_total 3',
+        '# HELP test_jobs Jobs by status',
+        '# TYPE test_jobs gauge',
+        'test_jobs{status="queued"} 2',
+    ]
+
+
+def test_web_metrics_endpoint(monkeypatch):
+    import web_daw
+
+    # Other tests may have switched metrics off after the app turned them on
+    monkeypatch.setattr(metrics, '_enabled', True)
+    client = web_daw.app.test_client()
+    assert client.get('/status').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    body = response.get_data(as_text=True)
+    assert 'beatbox_http_request_seconds_count{method="GET",endpoint="status",status="200"}' in body
+    assert '# TYPE beatbox_jobs gauge' in body
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+pretty_midi = pytest.importorskip('pretty_midi')
+
+from beat_renderer import make_events, render_events, tile_events  # noqa: E402
+from drum_patterns import bar_events  # noqa: E402
+from enhanced_ai_daw import EnhancedAIDaw  # noqa: E402
+from midi_renderer import midi_events, render_midi  # noqa: E402
+from prompt_processor import BeatParams  # noqa: E402
+from voice_cache import VoiceCache  # noqa: E402
+
+# 120 BPM at 8 kHz puts every 16th note on a whole sample
+PARAMS = BeatParams(genre='trap', bpm=120, bars=4, mood='neutral', kick_pattern='heavy', hihat_style='rapid',
+                    bass_boost=1.0, distortion=0.3, volume=1.0)
+
+
+def by_time(events):
+    return events[np.lexsort((events['voice'], events['onset']))]
+
+
+def test_exported_midi_renders_back_to_the_direct_audio(tmp_path):
+    daw = EnhancedAIDaw(sample_rate=8000, voice_cache=VoiceCache(), seed=1)
+    path = daw.export_to_midi(PARAMS, str(tmp_path / 'beat.mid'))
+    direct = daw.generate_enhanced_pattern(PARAMS)
+
+    # Same hits on the same samples; only velocity rounding separates the gains
+    bar_samples = int(60.0 / PARAMS['bpm'] * 4 * daw.sample_rate)
+    expected = by_time(tile_events(bar_events('trap', 'rapid', PARAMS['bpm'], daw.sample_rate),
+                                   np.arange(PARAMS['bars']) * bar_samples))
+    events = by_time(midi_events(path, daw.sample_rate))
+    assert np.array_equal(events['onset'], expected['onset'])
+    assert np.array_equal(events['voice'], expected['voice'])
+    assert np.abs(events['gain'] - expected['gain']).max() <= 0.5 / 127
+
+    rendered = daw.render_midi(path, PARAMS, total_samples=len(direct))
+    assert rendered.shape == direct.shape and rendered.dtype == direct.dtype
+    np.testing.assert_allclose(rendered, direct, atol=0.02 * np.abs(direct).max())
+    assert np.corrcoef(rendered, direct)[0, 1] > 0.9999
+
+
+def test_notes_map_to_voices_with_velocity_gain(tmp_path):
+    midi = pretty_midi.PrettyMIDI(initial_tempo=120)
+    drums = pretty_midi.Instrument(program=0, is_drum=True)
+    # Bass drum 1, open hi-hat, side stick and a cowbell nothing plays
+    for start, pitch, velocity in [(0.0, 36, 127), (0.25, 46, 64), (0.5, 37, 100), (0.75, 56, 127)]:
+        drums.notes.append(pretty_midi.Note(velocity=velocity, pitch=pitch, start=start, end=start + 0.1))
+    piano = pretty_midi.Instrument(program=0)
+    piano.notes.append(pretty_midi.Note(velocity=127, pitch=36, start=0.1, end=0.2))
+    midi.instruments.extend([drums, piano])
+    path = str(tmp_path / 'kit.mid')
+    midi.write(path)
+
+    voices = [np.full(100, 1.0), np.full(50, 0.5), np.full(10, 0.25)]
+    rendered = render_midi(path, voices, 1000)
+
+    expected = make_events([0, 250, 500], [0, 2, 1], [1.0, 64 / 127, 100 / 127])
+    assert len(rendered) == 551
+    np.testing.assert_array_equal(rendered, render_events(expected, voices, 551))
@@ -0,0 +1,42 @@
+import wave
+
+import pytest
+
+pytest.importorskip('audiocraft')
+torch = pytest.importorskip('torch')
+
+from benchmarks.musicgen_cpu import tiny_musicgen  # noqa: E402
+from full_song_generator import FullSongGenerator  # noqa: E402
+
+
+def test_cpu_fast_path_quantizes_and_reports_realtime_factor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator = FullSongGenerator(max_batch_size=1, model_name='tiny', model=tiny_musicgen(),
+                                  intra_op_threads=1, quantize=True)
+    try:
+        if generator.device == 'cpu':
+            linear_types = {type(m) for m in generator.model.lm.modules() if 'Linear' in type(m).__name__}
+            assert torch.nn.Linear not in linear_types
+            assert any(t.__module__.startswith('torch.ao.nn.quantized.dynamic') for t in linear_types)
+            assert torch.get_num_threads() == 1
+
+        audio = generator._generate_batch((0.1, 250, 0.0, 1.0, 3.0), ['test'], seed=0)
+        assert len(audio) == 1 and audio[0].shape[-1] > 0
+        assert generator.last_realtime_factor > 0
+        assert generator.performance_info()['quantized'] == (generator.device == 'cpu')
+    finally:
+        generator.batcher.close()
+
+
+def test_long_songs_are_stitched_from_continuations(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator = FullSongGenerator(max_batch_size=1, model_name='tiny', model=tiny_musicgen())
+    generator.window_seconds, generator.continuation_seconds, generator.crossfade_seconds = 1.0, 0.4, 0.1
+    try:
+        song = generator.generate_song("test", duration=2.5, seed=0)
+    finally:
+        generator.batcher.close()
+
+    with wave.open(song['filename']) as wav:
+        assert wav.getnframes() == int(2.5 * generator.sample_rate)
+    assert generator.batcher.stats()['batches_run'] == 0
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from noise_bank import NoiseBank
+
+
+def test_same_seed_and_key_give_identical_noise_on_every_thread():
+    key = ('snare', 'dark', 6000)
+    expected = NoiseBank(7).normal(6000, 0.1, key=key)
+    bank = NoiseBank(7)
+    with ThreadPoolExecutor(8) as pool:
+        draws = list(pool.map(lambda _: bank.normal(6000, 0.1, key=key), range(32)))
+    assert all(np.array_equal(draw, expected) for draw in draws)
+
+    single = bank.normal(6000, 0.1, key=key, dtype=np.float32)
+    assert single.dtype == np.float32 and abs(single.std() - 0.1) < 0.01
+
+
+def test_different_keys_and_seeds_give_independent_noise():
+    bank = NoiseBank(7)
+    snare = bank.normal(20000, 1.0, key=('snare', 'dark', 20000))
+    hihat = bank.normal(20000, 1.0, key=('hihat', 'dark', 20000))
+    other_seed = NoiseBank(8).normal(20000, 1.0, key=('snare', 'dark', 20000))
+
+    for noise in (hihat, other_seed):
+        assert not np.array_equal(noise, snare)
+        # Uncorrelated at every small lag, so no key reads a shifted copy of another's noise
+        for lag in range(0, 64):
+            assert abs(np.corrcoef(snare[lag:], noise[:len(noise) - lag])[0, 1]) < 0.05
+            assert abs(np.corrcoef(noise[lag:], snare[:len(snare) - lag])[0, 1]) < 0.05
+
+
+def test_keyed_noise_is_read_from_a_bank_drawn_once_per_key():
+    bank = NoiseBank(7)
+    short = bank.normal(1000, 0.5, key=('hihat', 'rapid', 1000))
+    assert np.array_equal(bank.normal(1000, 0.5, key=('hihat', 'rapid', 1000)), short)
+    stored = bank._key_banks[('hihat', 'rapid', 1000)]
+    bank.normal(1000, 0.5, key=('hihat', 'rapid', 1000))
+    assert bank._key_banks[('hihat', 'rapid', 1000)] is stored
+
+    # A longer request grows the bank without changing the samples already handed out
+    longer = bank.normal(5000, 0.5, key=('hihat', 'rapid', 1000))
+    assert np.array_equal(longer[:1000], short)
+
+
+def test_unkeyed_noise_is_a_random_window_of_the_shared_bank():
+    bank = NoiseBank(7, bank_size=4096)
+    shared = NoiseBank(7, bank_size=4096).shared_bank()
+    assert np.array_equal(bank.shared_bank(), shared)
+
+    with ThreadPoolExecutor(4) as pool:
+        windows = list(pool.map(lambda _: bank.normal(256), range(64)))
+    offsets = set()
+    for window in windows:
+        starts = [i for i in range(len(shared) - 255) if shared[i] == window[0]]
+        assert len(starts) == 1 and np.array_equal(shared[starts[0]:starts[0] + 256], window)
+        offsets.add(starts[0])
+    assert len(offsets) > 32
+
+    # Longer than the bank is drawn directly
+    assert len(bank.normal(5000, 0.1)) == 5000
@@ -0,0 +1,61 @@
+import pickle
+import random
+
+from benchmarks.prompts import prompt_corpus, reference_parse
+from prompt_processor import BeatParams, PromptProcessor
+
+
+def test_parses_like_the_substring_scans():
+    processor = PromptProcessor()
+    for prompt in prompt_corpus() + ["trapid heavy 808 bpm", "HEAVY BASS, 120bpm, 2 bars of slow drill"]:
+        random.seed(prompt)
+        expected = reference_parse(processor, prompt)
+        random.seed(prompt)
+        assert processor.parse_prompt(prompt).to_dict() == expected, prompt
+
+
+def test_overlapping_and_embedded_keywords_parse_like_the_substring_scans():
+    processor = PromptProcessor()
+    prompts = ["softrap beat", "trapid beat", "a darkheavy808 drill", "slowfast boom bap", "upbeatrap",
+               "heavy bassoft trap, 3bars", "drillo-fi at 95bpm", "rapid hi-hat heavy 808"]
+    for prompt in prompts:
+        random.seed(prompt)
+        expected = reference_parse(processor, prompt)
+        random.seed(prompt)
+        assert processor.parse_prompt(prompt).to_dict() == expected, prompt
+
+    found, _, _ = processor._scan("softrap")
+    assert {'soft', 'trap'} <= found
+    found, _, _ = processor._scan("trapid")
+    assert {'trap', 'rapid'} <= found
+
+
+def test_parse_many_matches_parse_prompt():
+    processor = PromptProcessor()
+    prompts = ["dark trap beat at 140 BPM", "chill lo-fi, 8 bars"] * 3
+    random.seed(0)
+    batch = processor.parse_many(prompts)
+    random.seed(0)
+    assert batch == [processor.parse_prompt(prompt) for prompt in prompts]
+
+
+def test_params_are_hashable_and_immutable():
+    params = PromptProcessor().parse_prompt("melodic boom bap beat at 90 BPM")
+    assert params == pickle.loads(pickle.dumps(params))
+    assert {params: 'cached'}[params.replace()] == 'cached'
+    assert params.replace(bars=8)['bars'] == 8 and params.bars == 4
+    assert dict(params, bpm=100)['bpm'] == 100
+
+    try:
+        params.bpm = 100
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("BeatParams should be immutable")
+    assert not hasattr(params, '__dict__')
+
+
+def test_unset_optional_params_are_left_out():
+    params = BeatParams(genre='drill')
+    assert 'minor_key' not in params and params.minor_key is None
+    assert params.get('minor_key', False) is False
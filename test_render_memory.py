@@ -0,0 +1,52 @@
+import tracemalloc
+
+import numpy as np
+
+from ai_beat_generator import SmartDrumMachine
+from voice_cache import VoiceCache
+
+PARAMS = {
+    'genre': 'trap', 'bpm': 140, 'bars': 64, 'mood': 'neutral', 'kick_pattern': 'heavy',
+    'hihat_style': 'rapid', 'bass_boost': 1.0, 'distortion': 0.3, 'volume': 1.0
+}
+
+
+def peak_bytes(func):
+    """Peak traced allocation while running ``func``"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def warm_machine(dtype):
+    machine = SmartDrumMachine(voice_cache=VoiceCache(), seed=1, dtype=dtype)
+    # Synthesize the voices up front so only the mix itself is measured
+    machine.create_parametric_beat(dict(PARAMS, bars=1))
+    return machine
+
+
+def test_float32_render_allocates_little_beyond_its_output():
+    machine = warm_machine(np.float32)
+    beat = machine.create_parametric_beat(PARAMS)
+    assert beat.dtype == np.float32
+
+    peak = peak_bytes(lambda: machine.create_parametric_beat(PARAMS))
+    assert peak < beat.nbytes * 1.1 + 512 * 1024
+
+
+def test_float32_render_uses_half_the_memory_of_float64():
+    peak32 = peak_bytes(lambda: warm_machine(np.float32).create_parametric_beat(PARAMS))
+    peak64 = peak_bytes(lambda: warm_machine(np.float64).create_parametric_beat(PARAMS))
+    assert peak32 < peak64 * 0.6
+
+
+def test_streamed_export_memory_does_not_grow_with_length(tmp_path):
+    machine = warm_machine(np.float32)
+    prompt = "trap beat at 140 BPM, 256 bars"
+    peak = peak_bytes(lambda: machine.create_beat_from_prompt(prompt, output_dir=str(tmp_path)))
+
+    # 256 bars would be ~77 MB as one float32 buffer
+    assert peak < 2 * 1024 * 1024
@@ -0,0 +1,98 @@
+import json
+
+from audio_writer import write_wav
+from song_index import SongIndex
+
+
+def song(n):
+    return {'basename': f'song_{n}.wav', 'filename': f'generated_songs/song_{n}.wav', 'prompt': f'prompt {n}',
+            'style': 'custom', 'duration': 30, 'file_size': 100, 'timestamp': f'2025-01-01T00:00:{n:02d}'}
+
+
+def test_pages_run_newest_first_from_a_cursor(tmp_path):
+    index = SongIndex(str(tmp_path))
+    for n in range(5):
+        index.add(song(n))
+
+    first, cursor = index.page(limit=2)
+    second, cursor = index.page(limit=2, cursor=cursor)
+    index.add(song(5))
+    third, cursor = index.page(limit=2, cursor=cursor)
+
+    # A song arriving mid-listing does not shift the pages after the cursor
+    assert [s['prompt'] for s in first + second + third] == [f'prompt {n}' for n in (4, 3, 2, 1, 0)]
+    assert cursor is None
+
+
+def test_re_adding_a_song_keeps_its_id_and_place(tmp_path):
+    index = SongIndex(str(tmp_path))
+    ids = [index.add(song(n))['id'] for n in range(3)]
+    (before, _), version = index.page(), index.version()
+
+    again = index.add(dict(song(1), file_size=200, timestamp='2025-01-02T00:00:00'))
+    assert again['id'] == ids[1]
+    after, _ = index.page()
+    assert [s['id'] for s in after] == [s['id'] for s in before]
+    assert after[1]['file_size'] == 200 and index.count() == 3
+    assert index.version() != version
+
+
+def test_rebuild_reconciles_the_index_with_the_disk(tmp_path):
+    songs_dir = tmp_path / 'generated_songs'
+    (songs_dir / '.cache').mkdir(parents=True)
+    write_wav(str(songs_dir / 'drake_melodic_hiphop_20250101_120000.wav'), [0.0] * 16000, 8000)
+    write_wav(str(songs_dir / 'song_dark_trap_20250101_120500_a1b2c3.wav'), [0.0] * 8000, 8000)
+    with open(songs_dir / '.cache' / 'key.json', 'w') as f:
+        json.dump({'basename': 'song_dark_trap_20250101_120500_a1b2c3.wav', 'prompt': 'dark trap, heavy 808s',
+                   'duration': 1, 'style': 'custom'}, f)
+
+    index = SongIndex(str(songs_dir))
+    index.add(dict(song(0), filename=str(songs_dir / 'song_0.wav')))
+    assert index.rebuild() == (2, 1)
+    assert index.rebuild() == (0, 0)
+
+    songs = {s['basename']: s for s in SongIndex(str(songs_dir)).page()[0]}
+    assert songs['drake_melodic_hiphop_20250101_120000.wav']['style'] == 'drake_melodic_hiphop'
+    assert songs['drake_melodic_hiphop_20250101_120000.wav']['duration'] == 2.0
+    assert songs['drake_melodic_hiphop_20250101_120000.wav']['timestamp'] == '2025-01-01T12:00:00'
+    assert songs['song_dark_trap_20250101_120500_a1b2c3.wav']['prompt'] == 'dark trap, heavy 808s'
+
+
+def test_partial_and_temporary_files_are_not_indexed(tmp_path):
+    songs_dir = tmp_path / 'generated_songs'
+    songs_dir.mkdir()
+    write_wav(str(songs_dir / 'song_long_20250101_120000.wav'), [0.0] * 800, 8000)
+    write_wav(str(songs_dir / 'song_long_20250101_130000_a1b2c3.partial.wav'), [0.0] * 800, 8000)
+    write_wav(str(songs_dir / 'song_x_20250101_140000.tmp.flac'), [0.0] * 800, 8000)
+    write_wav(str(songs_dir / '.song.wav.abc123.tmp.wav'), [0.0] * 800, 8000)
+
+    index = SongIndex(str(songs_dir))
+    # An entry an older version indexed is dropped on the next rebuild
+    index._db.execute("INSERT INTO songs (basename, filename, prompt, style, duration, file_size, timestamp) "
+                      "VALUES ('old.partial.wav', 'old.partial.wav', '', 'custom', 1, 44, '2024-01-01')")
+    assert index.rebuild() == (1, 1)
+    assert [s['basename'] for s in index.page()[0]] == ['song_long_20250101_120000.wav']
+
+    assert index.add(dict(song(1), basename='song_1.partial.wav')) is None
+    assert index.count() == 1
+
+
+def test_songs_endpoint_answers_unchanged_polls_with_304(tmp_path, monkeypatch):
+    import web_daw
+
+    index = SongIndex(str(tmp_path))
+    for n in range(3):
+        index.add(song(n))
+    monkeypatch.setattr(web_daw, '_song_index', index)
+    client = web_daw.app.test_client()
+
+    response = client.get('/songs?limit=2')
+    page = response.get_json()
+    assert [s['prompt'] for s in page['songs']] == ['prompt 2', 'prompt 1']
+    assert client.get(f"/songs?limit=2&cursor={page['next_cursor']}").get_json()['songs'][0]['prompt'] == 'prompt 0'
+
+    etag = response.headers['ETag']
+    assert client.get('/songs?limit=2', headers={'If-None-Match': etag}).status_code == 304
+    index.add(song(3))
+    assert client.get('/songs?limit=2', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/songs?limit=x').status_code == 400
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from ai_beat_generator import SmartDrumMachine
+from beat_renderer import render_blocks, render_events, tile_events
+from enhanced_ai_daw import EnhancedAIDaw
+from voice_cache import VoiceCache
+
+PARAMS = {
+    'genre': 'trap', 'bpm': 140, 'bars': 4, 'mood': 'neutral', 'kick_pattern': 'heavy',
+    'hihat_style': 'rapid', 'bass_boost': 1.0, 'distortion': 0.3, 'volume': 1.0
+}
+
+
+# At 200 BPM the lo-fi loop rings into the next bar, so its first hits land on a tail
+@pytest.mark.parametrize('changes', [{}, {'genre': 'lo-fi', 'bpm': 200}])
+def test_stems_match_rendering_each_voice_alone_and_leave_the_mix_unchanged(changes):
+    machine = SmartDrumMachine(sample_rate=8000, voice_cache=VoiceCache(), seed=1)
+    params = dict(PARAMS, **changes)
+    events, voices, total_samples, starts = machine._beat_plan(params)
+
+    mix, stems = machine.create_parametric_beat(params, stems=True)
+    assert stems.shape == (len(voices), total_samples)
+    assert np.array_equal(mix, machine.create_parametric_beat(params))
+    for voice_id, stem in enumerate(stems):
+        alone = render_events(events[events['voice'] == voice_id], voices, total_samples, loop_starts=starts)
+        assert np.array_equal(stem, alone)
+    np.testing.assert_allclose(stems.sum(axis=0), mix, atol=1e-5)
+
+    blocks = list(render_blocks(events, voices, total_samples, loop_starts=starts, block_size=3000, stems=True))
+    assert np.array_equal(np.concatenate([block for block, _ in blocks]), mix)
+    assert np.array_equal(np.concatenate([stem for _, stem in blocks], axis=1), stems)
+
+
+def test_hit_by_hit_stems_match_the_loop_render():
+    machine = SmartDrumMachine(sample_rate=8000, voice_cache=VoiceCache(), seed=1)
+    events, voices, total_samples, starts = machine._beat_plan(PARAMS)
+    looped = render_events(events, voices, total_samples, loop_starts=starts, stems=True)
+
+    by_hit = render_events(tile_events(events, starts), voices, total_samples, stems=True)
+    np.testing.assert_allclose(by_hit[0], looped[0], atol=1e-6)
+    np.testing.assert_allclose(by_hit[1], looped[1], atol=1e-6)
+
+
+def test_beat_export_writes_multichannel_stems_alongside_the_mix(tmp_path):
+    machine = SmartDrumMachine(sample_rate=8000, voice_cache=VoiceCache(), seed=1)
+    filename, params, stem_files = machine.create_beat_from_prompt(
+        "trap beat at 140 BPM, 2 bars", output_dir=str(tmp_path), basename='beat', stems='multichannel')
+
+    assert stem_files == [str(tmp_path / 'beat_stems.wav')]
+    mix, _ = sf.read(filename, dtype='int16')
+    stems, _ = sf.read(stem_files[0], dtype='int16')
+    assert stems.shape == (len(mix), 3)
+    # Same scale as the mix, so the stems add back up to it wherever the mix didn't clip
+    unclipped = np.abs(mix.astype(np.int32)) < 32767
+    assert unclipped.mean() > 0.9
+    assert np.abs(stems.astype(np.int32).sum(axis=1) - mix)[unclipped].max() <= 3
+
+
+def test_enhanced_export_writes_one_file_per_stem(tmp_path, monkeypatch):
+    daw = EnhancedAIDaw(sample_rate=22050, voice_cache=VoiceCache(), seed=1)
+    monkeypatch.setattr(daw, 'export_to_midi', lambda params, filename: filename)
+    audio_file, _, _, stem_files = daw.create_enhanced_beat(
+        "boom bap beat at 90 BPM, 2 bars", output_dir=str(tmp_path), basename='beat', output_format='flac',
+        stems='files')
+
+    assert [path.rsplit('/', 1)[1] for path in stem_files] == ['beat_kick.flac', 'beat_snare.flac',
+                                                               'beat_hihat.flac']
+    frames = sf.info(audio_file).frames
+    peaks = []
+    for path in stem_files:
+        stem, _ = sf.read(path)
+        assert len(stem) == frames
+        peaks.append(np.abs(stem).max())
+    assert 0 < max(peaks) <= 1.0
@@ -0,0 +1,59 @@
+import numpy as np
+
+from ai_beat_generator import SmartDrumMachine
+from voice_cache import VoiceCache
+
+
+def voice(n, value=1.0):
+    return np.full(n, value, dtype=np.float32)
+
+
+def test_least_recently_used_voice_is_evicted_first():
+    cache = VoiceCache(max_bytes=3 * 400)
+    for name in 'abc':
+        cache.get(name, lambda: voice(100))
+    cache.get('a', lambda: voice(100))  # hit: 'b' is now the oldest
+    cache.get('d', lambda: voice(100))
+
+    assert 'b' not in cache
+    assert all(name in cache for name in 'acd')
+    assert cache.stats()['bytes'] == 3 * 400 and cache.stats()['hits'] == 1
+
+
+def test_byte_budget_holds_and_oversized_voices_are_not_kept():
+    cache = VoiceCache(max_bytes=1000)
+    for i in range(5):
+        cache.get(i, lambda: voice(100))
+    assert cache.stats()['bytes'] <= 1000 and len(cache) == 2
+
+    big = cache.get('big', lambda: voice(1000))
+    assert len(big) == 1000
+    assert 'big' not in cache and len(cache) == 2
+
+
+def test_voices_persist_as_npy_and_reload_without_synthesis(tmp_path):
+    key = VoiceCache.make_key('kick', 'heavy', 0.3, seed=1, dtype=np.float32)
+    first = VoiceCache(cache_dir=str(tmp_path)).get(key, lambda: voice(50, 0.5))
+    assert len(list(tmp_path.glob('kick_*.npy'))) == 1
+
+    def fail():
+        raise AssertionError("voice should come from disk")
+
+    reloaded = VoiceCache(cache_dir=str(tmp_path)).get(key, fail)
+    assert np.array_equal(reloaded, first) and reloaded.dtype == np.float32
+    assert not reloaded.flags.writeable
+
+
+def test_keys_differing_by_seed_or_dtype_do_not_collide(tmp_path):
+    keys = {VoiceCache.make_key('snare', 'dark', 0.2, seed=seed, dtype=dtype)
+            for seed in (None, 1, 2) for dtype in (np.float32, np.float64)}
+    assert len(keys) == 6
+
+    cache = VoiceCache(cache_dir=str(tmp_path))
+    for value, key in enumerate(sorted(keys, key=repr)):
+        cache.get(key, lambda value=value: voice(10, value))
+    assert len(cache) == 6 and len(list(tmp_path.glob('*.npy'))) == 6
+
+    shared = VoiceCache()
+    one, two = (SmartDrumMachine(sample_rate=8000, voice_cache=shared, seed=seed) for seed in (1, 2))
+    assert not np.array_equal(one.get_voice('snare', 'dark', 0.2), two.get_voice('snare', 'dark', 0.2))
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import timed
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class VoiceCache:
+    """LRU cache of synthesized one-shot drum voices with a byte budget.
+
+    Voices are keyed by (voice, style, duration, bass_boost, distortion,
+    sample_rate, noise seed, dtype). When ``cache_dir`` is set every voice is also persisted as
+    a ``.npy`` file so a restarted process starts warm.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._voices = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(voice, style, duration, bass_boost=1.0, distortion=0.0, sample_rate=44100, seed=None,
+                 dtype=np.float64):
+        """Build a normalized cache key for a one-shot voice"""
+        return (voice, style, float(duration), float(bass_boost), float(distortion), int(sample_rate), seed,
+                np.dtype(dtype).name)
+
+    def get(self, key, factory):
+        """Return the voice for ``key``, calling ``factory()`` on a miss"""
+        with self._lock:
+            voice = self._voices.get(key)
+            if voice is not None:
+                self._voices.move_to_end(key)
+                self.hits += 1
+                return voice
+            self.misses += 1
+
+        voice = self._load(key)
+        if voice is None:
+            with timed('voice_synthesis'):
+                voice = np.array(factory())
+            self._save(key, voice)
+
+        # Cached voices are shared between renders, so make them read-only
+        voice.setflags(write=False)
+        self._store(key, voice)
+        return voice
+
+    def clear(self, disk=False):
+        """Drop every in-memory voice (and the on-disk copies if ``disk``)"""
+        with self._lock:
+            self._voices.clear()
+            self._bytes = 0
+
+        if disk and self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.npy'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        """Cache statistics for debugging and monitoring"""
+        with self._lock:
+            return {
+                'voices': len(self._voices),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._voices)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._voices
+
+    def _store(self, key, voice):
+        if voice.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._voices.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+
+            self._voices[key] = voice
+            self._bytes += voice.nbytes
+
+            # Evict least recently used voices until we fit the budget
+            while self._bytes > self.max_bytes:
+                _, evicted = self._voices.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key[0]}_{digest[:20]}.npy")
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            # Corrupt or truncated file - resynthesize and overwrite it
+            return None
+
+    def _save(self, key, voice):
+        if not self.cache_dir:
+            return
+
+        # Write to a temp file first so readers never see a partial voice
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, voice)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Process-wide voice cache shared by all drum machines.
+
+    Set ``BEATBOX_VOICE_CACHE_DIR`` to persist voices between runs.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = VoiceCache(cache_dir=os.environ.get('BEATBOX_VOICE_CACHE_DIR'))
+        return _default_cache
@@ -1,4 +1,4 @@
-from flask import Flask, render_template_string, request, jsonify, send_file
+from flask import Flask, Response, render_template_string, request, jsonify, send_file, g
 import os
 import json
 from datetime import datetime
@@ -6,28 +6,134 @@ import traceback
 import threading
 import time
 
-# Import the song generator
-from full_song_generator import FullSongGenerator
+from werkzeug.security import safe_join
+
+import metrics
+from audio_writer import OUTPUT_FORMATS, output_path, transcode
+from event_bus import EventBus, format_sse
+from job_queue import JobManager, JobQueueFull
+from metrics import timed
+from song_index import SongIndex
 
 app = Flask(__name__)
+# Behind nginx or Apache, USE_X_SENDFILE=1 hands downloads to the proxy instead of
+# streaming them through Python; otherwise the WSGI server's file_wrapper (sendfile
+# on gunicorn) is used
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+# Output names are unique and files are renamed into place complete, so they never change
+SONG_MAX_AGE = 24 * 3600
+# Songs asked for in another format are encoded once into here and served from disk after that
+TRANSCODE_DIR = os.path.join('generated_songs', '.transcodes')
+# Encodes of the same target serialize on one of these; a fixed set, so nothing accumulates
+_transcode_locks = [threading.Lock() for _ in range(32)]
+# mimetypes does not know .opus everywhere
+MIME_TYPES = {extension: mime_type for extension, _, _, mime_type in OUTPUT_FORMATS.values()}
 song_generator = None
-generated_songs = []
 generator_ready = False
+# starting -> loading -> ready, or failed
+generator_stage = 'starting'
+
+# Pushed to browsers over /events: generator status, job updates and finished songs
+events = EventBus()
+# Comment lines keep idle /events connections from being timed out by proxies
+EVENTS_KEEPALIVE_SECONDS = 15
+
+# Generations run on a small worker pool so HTTP workers stay free; with
+# several workers, concurrent requests get batched into one MusicGen call
+job_manager = JobManager(max_workers=int(os.environ.get('GENERATION_WORKERS', 4)),
+                         max_pending=int(os.environ.get('GENERATION_MAX_PENDING', 16)),
+                         listener=lambda job: events.publish('job', job))
+
+# Longest song /generate accepts, in seconds; past 30 s songs are built from continuations
+MAX_DURATION = 300
+
+# Songs live in a SQLite index shared by every worker and kept across restarts
+SONGS_PAGE_SIZE = 50
+SONGS_PAGE_MAX = 200
+_song_index = None
+_song_index_lock = threading.Lock()
+
+def get_song_index():
+    """The index of generated_songs/, opened on first use"""
+    global _song_index
+    with _song_index_lock:
+        if _song_index is None:
+            _song_index = SongIndex('generated_songs')
+        return _song_index
+
+def generator_status():
+    return {'ready': generator_ready, 'stage': generator_stage}
+
+def set_generator_stage(stage):
+    global generator_stage
+    generator_stage = stage
+    events.publish('status', generator_status())
 
 def initialize_generator():
     """Initialize the generator in a background thread"""
     global song_generator, generator_ready
     try:
         print("🎵 Initializing AI Music Generator in background...")
-        song_generator = FullSongGenerator()
+        # Pick up songs written before a restart or by other workers
+        added, removed = get_song_index().rebuild()
+        print(f"📚 Song index: {get_song_index().count()} songs ({added} added, {removed} removed)")
+        set_generator_stage('loading')
+        # GENERATION_BACKEND picks MusicGen (the default) or the fake used for load
+        # testing; torch and audiocraft only load once MusicGen is built
+        from generation_backends import create_backend
+        song_generator = create_backend()
         generator_ready = True
+        set_generator_stage('ready')
         print("✅ AI Music Generator ready!")
     except Exception as e:
         print(f"❌ Failed to initialize generator: {e}")
         traceback.print_exc()
+        set_generator_stage('failed')
+
+_init_started = False
+_init_lock = threading.Lock()
+
+def start_generator():
+    """Start loading the generator in the background, once per process"""
+    global _init_started
+    with _init_lock:
+        if _init_started:
+            return
+        _init_started = True
+    threading.Thread(target=initialize_generator, daemon=True).start()
 
-# Start generator initialization in background
-threading.Thread(target=initialize_generator, daemon=True).start()
+# Servers that import the app without running __main__ start loading on the first
+# request; AUTOLOAD_MODEL=False (or the env var set to 0) leaves that to the caller
+app.config['AUTOLOAD_MODEL'] = os.environ.get('AUTOLOAD_MODEL') != '0'
+
+@app.before_request
+def autoload_generator():
+    if app.config['AUTOLOAD_MODEL']:
+        start_generator()
+
+# The server records stage timings for /metrics unless BEATBOX_METRICS=0
+if os.environ.get('BEATBOX_METRICS') != '0':
+    metrics.enable()
+
+HTTP_SECONDS = metrics.REGISTRY.histogram('beatbox_http_request_seconds', 'Time to answer HTTP requests',
+                                          ('method', 'endpoint', 'status'))
+metrics.REGISTRY.gauge('beatbox_generator_ready', 'Whether the MusicGen model has loaded',
+                       lambda: int(generator_ready))
+metrics.REGISTRY.gauge('beatbox_jobs', 'Generation jobs by status', job_manager.stats, ('status',))
+metrics.REGISTRY.gauge('beatbox_event_subscribers', 'Open /events connections', events.subscriber_count)
+TRANSCODES = metrics.REGISTRY.counter('beatbox_transcodes_total', 'Downloads in another format, by cache result',
+                                      ('result',))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    if metrics.is_enabled() and 'request_start' in g:
+        HTTP_SECONDS.observe(time.perf_counter() - g.request_start, request.method,
+                             request.endpoint or 'unknown', str(response.status_code))
+    return response
 
 # HTML Template with enhanced UI
 HTML_TEMPLATE = '''
@@ -228,8 +334,13 @@ HTML_TEMPLATE = '''
             </div>
             
             <div class="form-group">
-                <label for="duration">Duration (seconds):</label>
-                <input type="number" id="duration" value="30" min="10" max="60">
+                <label for="duration">Duration (seconds, over 30 is built from continuations and takes longer):</label>
+                <input type="number" id="duration" value="30" min="10" max="{{ max_duration }}">
+            </div>
+            
+            <div class="form-group">
+                <label for="seed">Seed (optional, same seed + prompt = same song, served instantly):</label>
+                <input type="number" id="seed" placeholder="random">
             </div>
             
             <button class="btn" onclick="generateCustom()">🎵 Generate Custom Song</button>
@@ -252,32 +363,60 @@ HTML_TEMPLATE = '''
                     No songs generated yet. Create your first masterpiece above! 🎼
                 </p>
             </div>
+            <button id="loadOlder" class="btn" style="display: none;" onclick="loadOlderSongs()">Load older songs</button>
         </div>
     </div>
 
     <script>
         let generatorReady = false;
+        // Jobs this page submitted (id -> label) and the latest update seen for any job
+        const trackedJobs = new Map();
+        const latestJobs = new Map();
+        // Newest first; older pages are fetched on demand from nextCursor
+        let songs = [];
+        let nextCursor = null;
         
-        function checkGeneratorStatus() {
-            fetch('/status')
-                .then(response => response.json())
-                .then(data => {
-                    generatorReady = data.ready;
-                    const indicator = document.getElementById('readyIndicator');
-                    const text = document.getElementById('readyText');
-                    
-                    if (generatorReady) {
-                        indicator.className = 'ready-indicator ready';
-                        text.textContent = 'AI Model Ready!';
-                    } else {
-                        indicator.className = 'ready-indicator not-ready';
-                        text.textContent = 'Loading AI Model...';
-                        setTimeout(checkGeneratorStatus, 3000);
-                    }
-                })
-                .catch(() => {
-                    setTimeout(checkGeneratorStatus, 5000);
-                });
+        function showGeneratorStatus(status) {
+            generatorReady = status.ready;
+            const indicator = document.getElementById('readyIndicator');
+            const text = document.getElementById('readyText');
+            
+            if (generatorReady) {
+                indicator.className = 'ready-indicator ready';
+                text.textContent = 'AI Model Ready!';
+            } else {
+                indicator.className = 'ready-indicator not-ready';
+                text.textContent = status.stage === 'failed' ? 'AI Model failed to load' : 'Loading AI Model...';
+            }
+        }
+        
+        function connectEvents() {
+            // One long-lived connection replaces polling; the server pushes
+            // a snapshot first and then every change as it happens
+            const source = new EventSource('/events');
+            source.addEventListener('status', e => showGeneratorStatus(JSON.parse(e.data)));
+            source.addEventListener('songs', e => {
+                const page = JSON.parse(e.data);
+                songs = page.songs;
+                nextCursor = page.next_cursor;
+                renderSongs();
+            });
+            source.addEventListener('song', e => {
+                // A song already in the list (e.g. after a reconnect) is updated in place
+                const song = JSON.parse(e.data);
+                const index = songs.findIndex(s => s.basename === song.basename);
+                if (index >= 0) {
+                    songs[index] = song;
+                } else {
+                    songs.unshift(song);
+                }
+                renderSongs();
+            });
+            source.addEventListener('job', e => {
+                const job = JSON.parse(e.data);
+                latestJobs.set(job.id, job);
+                showJob(job);
+            });
         }
         
         function showStatus(message, type) {
@@ -299,35 +438,7 @@ HTML_TEMPLATE = '''
             }
             
             const duration = document.getElementById('duration').value;
-            
-            showStatus(`🎵 Generating ${style} song... This may take 2-5 minutes...`, 'loading');
-            
-            // Disable all buttons during generation
-            const buttons = document.querySelectorAll('.btn, .btn-style');
-            buttons.forEach(btn => btn.disabled = true);
-            
-            fetch('/generate', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({prompt: prompt, duration: parseInt(duration), style: style})
-            })
-            .then(response => response.json())
-            .then(data => {
-                // Re-enable buttons
-                buttons.forEach(btn => btn.disabled = false);
-                
-                if (data.success) {
-                    showStatus(`✅ ${data.message}`, 'success');
-                    loadSongs();
-                } else {
-                    showStatus(`❌ Error: ${data.error}`, 'error');
-                }
-            })
-            .catch(error => {
-                // Re-enable buttons on error
-                buttons.forEach(btn => btn.disabled = false);
-                showStatus(`❌ Error: ${error}`, 'error');
-            });
+            submitGeneration(prompt, parseInt(duration), style, `${style} song`);
         }
         
         function generateCustom() {
@@ -343,40 +454,64 @@ HTML_TEMPLATE = '''
             }
             
             const duration = document.getElementById('duration').value;
+            submitGeneration(prompt, parseInt(duration), 'custom', 'custom song')
+                .then(queued => {
+                    // Clear the input once the job is queued
+                    if (queued) document.getElementById('promptInput').value = '';
+                });
+        }
+        
+        function submitGeneration(prompt, duration, style, label) {
+            // The server answers immediately with a job id; the song is
+            // generated in the background and its progress arrives over /events
+            const seed = document.getElementById('seed').value;
             
-            showStatus(`🎵 Generating custom song... This may take 2-5 minutes...`, 'loading');
-            
-            // Disable all buttons during generation
-            const buttons = document.querySelectorAll('.btn, .btn-style');
-            buttons.forEach(btn => btn.disabled = true);
-            
-            fetch('/generate', {
+            return fetch('/generate', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({prompt: prompt, duration: parseInt(duration), style: 'custom'})
+                body: JSON.stringify({prompt: prompt, duration: duration, style: style,
+                                      seed: seed === '' ? null : parseInt(seed)})
             })
             .then(response => response.json())
             .then(data => {
-                // Re-enable buttons
-                buttons.forEach(btn => btn.disabled = false);
-                
                 if (data.success) {
-                    showStatus(`✅ ${data.message}`, 'success');
-                    loadSongs();
-                    // Clear the input after successful generation
-                    document.getElementById('promptInput').value = '';
-                } else {
-                    showStatus(`❌ Error: ${data.error}`, 'error');
+                    trackJob(data.job_id, label);
+                    return true;
                 }
+                showStatus(`❌ Error: ${data.error}`, 'error');
+                return false;
             })
             .catch(error => {
-                // Re-enable buttons on error
-                buttons.forEach(btn => btn.disabled = false);
                 showStatus(`❌ Error: ${error}`, 'error');
                 console.error('Generation error:', error);
+                return false;
             });
         }
         
+        function trackJob(jobId, label) {
+            trackedJobs.set(jobId, label);
+            // The job may have moved on before the submit response arrived
+            showJob(latestJobs.get(jobId) || {id: jobId, status: 'queued', queue_position: '?'});
+        }
+        
+        function showJob(job) {
+            const label = trackedJobs.get(job.id);
+            if (label === undefined) return;
+            
+            if (job.status === 'queued') {
+                showStatus(`⏳ ${label} queued (position ${job.queue_position})...`, 'loading');
+            } else if (job.status === 'running') {
+                const percent = Math.round((job.progress || 0) * 100);
+                showStatus(`🎵 Generating ${label}... ${percent}%`, 'loading');
+            } else if (job.status === 'done') {
+                trackedJobs.delete(job.id);
+                showStatus(`✅ Generated ${job.result.basename} successfully!`, 'success');
+            } else {
+                trackedJobs.delete(job.id);
+                showStatus(`❌ Error: ${job.error}`, 'error');
+            }
+        }
+        
         function generateMJ() {
             generateSong('upbeat pop rock like Beat It by Michael Jackson with funky bassline and electric guitar', 'michael_jackson');
         }
@@ -397,44 +532,52 @@ HTML_TEMPLATE = '''
             generateSong('dark R&B like The Weeknd with atmospheric synths and moody production', 'weeknd');
         }
         
-        function loadSongs() {
-            fetch('/songs')
-                .then(response => response.json())
-                .then(data => {
-                    const list = document.getElementById('songsList');
-                    if (data.songs.length === 0) {
-                        list.innerHTML = '<p style="opacity: 0.6; text-align: center; padding: 40px;">No songs generated yet. Create your first masterpiece above! 🎼</p>';
-                    } else {
-                        list.innerHTML = data.songs.map(song => `
-                            <div class="song-item">
-                                <div class="song-header">
-                                    <div>
-                                        <div class="song-title">"${song.prompt}"</div>
-                                        <div class="song-meta">
-                                            Style: ${song.style} | 
-                                            Duration: ${song.duration}s | 
-                                            Size: ${(song.file_size/1024/1024).toFixed(1)}MB |
-                                            Created: ${new Date(song.timestamp).toLocaleString()}
-                                        </div>
-                                    </div>
-                                    <button class="download-btn" onclick="downloadSong('${song.basename}')">
-                                        ⬇️ Download
-                                    </button>
+        function renderSongs() {
+            const list = document.getElementById('songsList');
+            if (songs.length === 0) {
+                list.innerHTML = '<p style="opacity: 0.6; text-align: center; padding: 40px;">No songs generated yet. Create your first masterpiece above! 🎼</p>';
+            } else {
+                list.innerHTML = songs.map(song => `
+                    <div class="song-item">
+                        <div class="song-header">
+                            <div>
+                                <div class="song-title">"${song.prompt}"</div>
+                                <div class="song-meta">
+                                    Style: ${song.style} | 
+                                    Duration: ${song.duration}s | 
+                                    Size: ${(song.file_size/1024/1024).toFixed(1)}MB |
+                                    Created: ${new Date(song.timestamp).toLocaleString()}
                                 </div>
                             </div>
-                        `).reverse().join('');
-                    }
+                            <audio controls preload="none" src="/download/${encodeURIComponent(song.basename)}?inline=1"></audio>
+                            <div>
+                                <button class="download-btn" onclick="downloadSong('${song.basename}', 'wav')">⬇️ WAV</button>
+                                <button class="download-btn" onclick="downloadSong('${song.basename}', 'flac')">FLAC</button>
+                                <button class="download-btn" onclick="downloadSong('${song.basename}', 'opus')">Opus</button>
+                            </div>
+                        </div>
+                    </div>
+                `).join('');
+            }
+            document.getElementById('loadOlder').style.display = nextCursor === null ? 'none' : 'block';
+        }
+        
+        function loadOlderSongs() {
+            fetch('/songs?cursor=' + nextCursor)
+                .then(response => response.json())
+                .then(page => {
+                    songs = songs.concat(page.songs);
+                    nextCursor = page.next_cursor;
+                    renderSongs();
                 });
         }
         
-        function downloadSong(filename) {
-            window.location.href = '/download/' + filename;
+        function downloadSong(filename, format) {
+            window.location.href = '/download/' + encodeURIComponent(filename) + '?format=' + format;
         }
         
         // Initialize
-        checkGeneratorStatus();
-        loadSongs();
-        setInterval(loadSongs, 10000); // Refresh songs list every 10 seconds
+        connectEvents();
     </script>
 </body>
 </html>
@@ -442,13 +585,15 @@ HTML_TEMPLATE = '''
 
 @app.route('/')
 def home():
-    return render_template_string(HTML_TEMPLATE)
+    return render_template_string(HTML_TEMPLATE, max_duration=MAX_DURATION)
 
 @app.route('/status')
 def status():
     return jsonify({
         'ready': generator_ready,
-        'model_info': song_generator.get_model_info() if song_generator else None
+        'stage': generator_stage,
+        'model_info': song_generator.get_model_info() if song_generator else None,
+        'jobs': job_manager.stats()
     })
 
 @app.route('/generate', methods=['POST'])
@@ -459,63 +604,180 @@ def generate_song():
         
         data = request.get_json()
         prompt = data.get('prompt', '').strip()
-        duration = int(data.get('duration', 30))
+        duration = data.get('duration', 30)
+        # bool is an int too, and int('12.5') or int(None) would be a 500
+        if isinstance(duration, str) and duration.strip().lstrip('-').isdigit():
+            duration = int(duration)
+        if isinstance(duration, bool) or not isinstance(duration, int) or not 1 <= duration <= MAX_DURATION:
+            return jsonify({'error': f'Duration must be a whole number of seconds from 1 to {MAX_DURATION}'}), 400
         style = data.get('style', 'custom')
+        seed = data.get('seed')
+        seed = int(seed) if seed not in (None, '') else None
         
         if not prompt:
             return jsonify({'error': 'Please enter a prompt!'}), 400
         
         print(f"🎵 Generation request: '{prompt}' ({duration}s, {style} style)")
         
-        # Generate based on style
-        if style == 'michael_jackson':
-            result = song_generator.create_michael_jackson_style(duration)
-        elif style == 'sleepy_hallow':
-            result = song_generator.create_sleepy_hallow_style(duration)
-        elif style == 'drake':
-            result = song_generator.create_drake_style(duration)
-        elif style == 'travis_scott':
-            result = song_generator.create_travis_scott_style(duration)
-        elif style == 'weeknd':
-            result = song_generator.create_the_weeknd_style(duration)
-        else:
-            result = song_generator.generate_song(prompt, duration)
-        
-        # Store song info
-        song_info = {
-            'prompt': prompt,
-            'filename': result['filename'],
-            'basename': result['basename'],
-            'duration': duration,
-            'style': result['style'],
-            'file_size': result['file_size'],
-            'timestamp': datetime.now().isoformat()
-        }
-        generated_songs.append(song_info)
+        # Hand the generation to a background worker and answer right away
+        job = job_manager.submit(run_generation, prompt, duration, style, seed,
+                                 metadata={'prompt': prompt, 'duration': duration, 'style': style, 'seed': seed})
         
         return jsonify({
             'success': True,
-            'song': song_info,
-            'message': f'Generated {result["basename"]} successfully!'
-        })
+            'job_id': job['id'],
+            'status': job['status'],
+            'queue_position': job['queue_position']
+        }), 202
         
+    except JobQueueFull as e:
+        return jsonify({'error': f'Too many songs in the queue, try again shortly ({e})'}), 429
     except Exception as e:
         print(f"❌ Generation error: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def run_generation(prompt, duration, style, seed=None):
+    """Generate one song on a worker thread and record it in the song list"""
+    # Presets fall back to their fixed seed so repeat clicks hit the cache
+    preset_kwargs = {} if seed is None else {'seed': seed}
+    # Token progress goes to the job, and from there to /events
+    progress = job_manager.progress_callback()
+    
+    # Generate based on style
+    if style == 'michael_jackson':
+        result = song_generator.create_michael_jackson_style(duration, progress=progress, **preset_kwargs)
+    elif style == 'sleepy_hallow':
+        result = song_generator.create_sleepy_hallow_style(duration, progress=progress, **preset_kwargs)
+    elif style == 'drake':
+        result = song_generator.create_drake_style(duration, progress=progress, **preset_kwargs)
+    elif style == 'travis_scott':
+        result = song_generator.create_travis_scott_style(duration, progress=progress, **preset_kwargs)
+    elif style == 'weeknd':
+        result = song_generator.create_the_weeknd_style(duration, progress=progress, **preset_kwargs)
+    else:
+        result = song_generator.generate_song(prompt, duration, seed=seed, progress=progress)
+    
+    # Store song info
+    song_info = {
+        'prompt': prompt,
+        'filename': result['filename'],
+        'basename': result['basename'],
+        'duration': duration,
+        'style': result['style'],
+        'file_size': result['file_size'],
+        'timestamp': datetime.now().isoformat()
+    }
+    song_info = get_song_index().add(song_info)
+    # Cached songs were announced when they were first generated
+    if not result.get('cached'):
+        events.publish('song', song_info)
+    return song_info
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return metrics.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+@app.route('/events')
+def event_stream():
+    """Server-Sent Events: a status and song list snapshot, then live updates"""
+    subscription = events.subscribe()
+    
+    def stream():
+        try:
+            # Browsers reconnect on their own; the snapshot brings them back up to date
+            yield f"retry: 3000\n{format_sse('status', generator_status())}"
+            songs, next_cursor = get_song_index().page(SONGS_PAGE_SIZE)
+            yield format_sse('songs', {'songs': songs, 'next_cursor': next_cursor})
+            while not subscription.dropped:
+                event = subscription.get(timeout=EVENTS_KEEPALIVE_SECONDS)
+                yield ': keepalive\n\n' if event is None else format_sse(*event)
+        finally:
+            subscription.close()
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/songs')
 def list_songs():
-    return jsonify({'songs': generated_songs})
+    """One page of songs, newest first; pass ``next_cursor`` back as ``cursor`` for the next"""
+    try:
+        limit = min(max(int(request.args.get('limit', SONGS_PAGE_SIZE)), 1), SONGS_PAGE_MAX)
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    
+    index = get_song_index()
+    # The ETag comes from the index version alone, so an unchanged poll never reads a page
+    etag = f"{index.version()}:{limit}:{cursor or ''}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        songs, next_cursor = index.page(limit, cursor)
+        response = jsonify({'songs': songs, 'next_cursor': next_cursor})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def transcoded_song(filename, output_format):
+    """Path of song ``filename`` in ``output_format``, encoding it on the first request"""
+    source = os.path.join('generated_songs', filename)
+    extension = os.path.splitext(filename)[1]
+    if extension == OUTPUT_FORMATS[output_format][0]:
+        return source
+    
+    # Keep the source extension, so x.wav and x.flac don't share a transcode
+    target = output_path(os.path.join(TRANSCODE_DIR, filename), output_format)
+    # Concurrent requests for the same transcode wait for one encode
+    with _transcode_locks[hash(target) % len(_transcode_locks)]:
+        cached = os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source)
+        if not cached:
+            os.makedirs(TRANSCODE_DIR, exist_ok=True)
+            with timed('transcode'):
+                transcode(source, target, output_format)
+    if metrics.is_enabled():
+        TRANSCODES.inc(1, 'hit' if cached else 'miss')
+    return target
 
 @app.route('/download/<filename>')
 def download_file(filename):
+    """Serve a song, as an attachment or with ``?inline=1`` for the page's audio players.
+    
+    ``?format=flac`` (or ``opus``, ``wav``) serves the song in that format,
+    transcoded once and cached under generated_songs/.transcodes. Responses
+    carry an ETag and Last-Modified and honour If-None-Match,
+    If-Modified-Since and Range, so seeking fetches only the bytes needed
+    and replays are answered with 304s or straight from the browser cache.
+    """
     try:
-        filepath = os.path.join('generated_songs', filename)
-        if os.path.exists(filepath):
-            return send_file(filepath, as_attachment=True)
-        else:
+        output_format = request.args.get('format')
+        if output_format is not None and output_format not in OUTPUT_FORMATS:
+            return jsonify({'error': f"Unknown format, expected one of {', '.join(OUTPUT_FORMATS)}"}), 400
+        
+        # safe_join rejects paths outside the directory
+        filepath = safe_join('generated_songs', filename)
+        # Hidden files are exports still being written
+        if filepath is None or not os.path.isfile(filepath) or filename.startswith('.'):
             return jsonify({'error': 'File not found'}), 404
+        
+        download_name = filename
+        if output_format is not None:
+            filepath = transcoded_song(filename, output_format)
+            download_name = output_path(os.path.splitext(filename)[0], output_format)
+        
+        # send_file resolves relative paths against the app, not the working directory
+        return send_file(os.path.abspath(filepath), download_name=download_name,
+                         mimetype=MIME_TYPES.get(os.path.splitext(download_name)[1]),
+                         as_attachment=request.args.get('inline') != '1',
+                         conditional=True, etag=True, max_age=SONG_MAX_AGE)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -525,4 +787,5 @@ if __name__ == '__main__':
     print("⏳ AI model will load in background...")
     print("🔄 Docker container will handle all dependencies!")
     
+    start_generator()
     app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file